@@ -0,0 +1,7 @@
+from enum import StrEnum
+
+
+class CassetteMode(StrEnum):
+    OFF = 'off'
+    RECORD = 'record'
+    REPLAY = 'replay'
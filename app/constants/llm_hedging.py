@@ -0,0 +1,7 @@
+from enum import StrEnum
+
+
+class HedgeOutcome(StrEnum):
+    PRIMARY_WON = 'primary_won'
+    HEDGE_WON = 'hedge_won'
+    OVER_BUDGET = 'over_budget'
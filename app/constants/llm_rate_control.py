@@ -0,0 +1,7 @@
+from enum import StrEnum
+
+
+class ShedReason(StrEnum):
+    BUDGET_EXHAUSTED = 'budget_exhausted'
+    CONCURRENCY_SATURATED = 'concurrency_saturated'
+    THROTTLED = 'throttled'
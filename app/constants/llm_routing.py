@@ -0,0 +1,26 @@
+from enum import StrEnum
+
+
+class RoutingMode(StrEnum):
+    SONNET = 'sonnet'
+    HAIKU = 'haiku'
+    CASCADE = 'cascade'
+
+
+class RoutingDecision(StrEnum):
+    SONNET = 'sonnet'
+    HAIKU = 'haiku'
+    ESCALATED = 'escalated'
+
+
+class EscalationReason(StrEnum):
+    VALIDATION_FAILURE = 'validation_failure'
+    LOW_CONFIDENCE = 'low_confidence'
+    MISSING_FOLLOW_UP = 'missing_follow_up'
+
+
+# USD per million tokens: input, output, cache read, cache write
+MODEL_PRICES = {
+    RoutingMode.SONNET: (3.00, 15.00, 0.30, 3.75),
+    RoutingMode.HAIKU: (0.80, 4.00, 0.08, 1.00),
+}
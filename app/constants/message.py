@@ -5,9 +5,16 @@ class MessageEvent(StrEnum):
     INIT_PROFILE = 'INIT_PROFILE'
     USER_ANSWER = 'USER_ANSWER'
     ASSISTANT_QUESTION = 'ASSISTANT_QUESTION'
+    ASSISTANT_QUESTION_DELTA = 'ASSISTANT_QUESTION_DELTA'
     PROFILE_COMPLETE = 'PROFILE_COMPLETE'
+    PROFILE_DELTA = 'PROFILE_DELTA'
     MAX_REPLIES_REACHED = 'MAX_REPLIES_REACHED'
     PENDING_GENERATION = 'PENDING_GENERATION'
+    SERVICE_BUSY = 'SERVICE_BUSY'
+    RESYNC_REQUIRED = 'RESYNC_REQUIRED'
+    INVALID_FRAME = 'INVALID_FRAME'
+    PING = 'PING'
+    PONG = 'PONG'
 
 
 class MessageStatus(StrEnum):
@@ -0,0 +1,7 @@
+from enum import StrEnum
+
+
+class OverflowPolicy(StrEnum):
+    DROP_OLDEST = 'drop_oldest'
+    COALESCE = 'coalesce'
+    DISCONNECT = 'disconnect'
@@ -20,3 +20,11 @@ class WellnessProfileQuestions:
     USER_ANSWER_FAILED = """
         User Response Failed
     """
+
+    SERVICE_BUSY = """
+        We are experiencing high demand right now. Please send your answer again in a moment.
+    """
+
+    RESYNC_REQUIRED = """
+        Some messages could not be replayed. Please reload the conversation.
+    """
@@ -0,0 +1,9 @@
+from enum import StrEnum
+
+
+class JournalOp(StrEnum):
+    APPEND_MESSAGE = 'm'
+    CLEAR_MESSAGES = 'c'
+    SAVE_STATE = 's'
+    SEQUENCE = 'q'
+    DELETE = 'd'
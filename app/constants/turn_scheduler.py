@@ -0,0 +1,7 @@
+from enum import StrEnum
+
+
+class TurnAdmission(StrEnum):
+    ACCEPTED = 'accepted'
+    QUEUE_FULL = 'queue_full'
+    SHUTTING_DOWN = 'shutting_down'
@@ -0,0 +1,7 @@
+from enum import StrEnum
+
+
+class WorkerMessage(StrEnum):
+    TURN = 'T'
+    REPLAY_REQUEST = 'R'
+    REPLAY = 'F'
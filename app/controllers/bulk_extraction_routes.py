@@ -0,0 +1,37 @@
+from typing import AsyncIterator
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+from app.controllers.dependencies import get_bulk_extraction_usecase
+from app.models.bulk_extraction import BulkExtractionInput
+from app.usecases.bulk_extraction_usecase import BulkExtractionUsecase
+
+bulk_extraction = APIRouter()
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+
+@bulk_extraction.post(
+    '/bulkExtraction',
+    response_class=StreamingResponse,
+    description=(
+        'Extract wellness profiles from many transcripts, streaming one NDJSON line per '
+        'transcript as it finishes. Send the cursor of the last line received to resume.'
+    ),
+    summary='Extract wellness profiles from transcripts in bulk',
+    tags=['Wellness Profile'],
+)
+async def bulk_extract(
+    request: BulkExtractionInput,
+    bulk_extraction_usecase: BulkExtractionUsecase = Depends(get_bulk_extraction_usecase),
+) -> StreamingResponse:
+    concurrency = bulk_extraction_usecase.get_concurrency(request.concurrency)
+
+    async def lines() -> AsyncIterator[str]:
+        async for result in bulk_extraction_usecase.extract(
+            request.transcripts, concurrency, request.cursor
+        ):
+            yield result.model_dump_json(exclude_none=True) + '\n'
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
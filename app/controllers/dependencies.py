@@ -0,0 +1,30 @@
+from starlette.requests import HTTPConnection
+
+from app.usecases.bulk_extraction_usecase import BulkExtractionUsecase
+from app.usecases.llm_usecase import LLMUsecase
+from app.usecases.wellness_assistant_usecase import WellnessUsecase
+
+
+class AppContainer:
+    """Usecases shared by every request, built once by the app lifespan
+
+    The usecases hold no per-request state, building them once parses their configuration
+    once instead of on every request.
+    """
+
+    __slots__ = ('llm_usecase', 'wellness_usecase', 'bulk_extraction_usecase')
+
+    def __init__(self):
+        self.llm_usecase = LLMUsecase()
+        self.wellness_usecase = WellnessUsecase(self.llm_usecase)
+        self.bulk_extraction_usecase = BulkExtractionUsecase(self.llm_usecase)
+
+
+def get_container(connection: HTTPConnection) -> AppContainer:
+    """Get the container built by the app lifespan"""
+    return connection.app.state.container
+
+
+def get_bulk_extraction_usecase(connection: HTTPConnection) -> BulkExtractionUsecase:
+    """Get the shared BulkExtractionUsecase instance"""
+    return get_container(connection).bulk_extraction_usecase
@@ -1,13 +1,26 @@
-import asyncio
+from fastapi import APIRouter, Depends, Response, status
 
-from fastapi import APIRouter, Depends
-
-from app.constants.message import MessageStatus
-from app.models.message import TransationResponse, UserAnswerInput
-from app.usecases.wellness_assistant_usecase import WellnessUsecase
+from app.constants.message import MessageEvent, MessageStatus
+from app.constants.turn_scheduler import TurnAdmission
+from app.models.message import Message, TransationResponse, UserAnswerInput
+from app.repositories.shared_state import get_connection_manager
+from app.usecases.session_manager_usecase import ConnectionManager
 
 wellness_profile = APIRouter()
 
+REFUSED_TURNS = {
+    TurnAdmission.QUEUE_FULL: (status.HTTP_429_TOO_MANY_REQUESTS, 'Too many requests, retry later'),
+    TurnAdmission.SHUTTING_DOWN: (status.HTTP_503_SERVICE_UNAVAILABLE, 'Service shutting down'),
+}
+RETRY_AFTER_SECONDS = '1'
+
+
+def refuse_turn(admission: TurnAdmission, response: Response) -> TransationResponse:
+    status_code, message = REFUSED_TURNS[admission]
+    response.status_code = status_code
+    response.headers['Retry-After'] = RETRY_AFTER_SECONDS
+    return TransationResponse(status=MessageStatus.ERROR, message=message)
+
 
 @wellness_profile.post(
     '/initialize/{session_id}',
@@ -20,9 +33,12 @@ wellness_profile = APIRouter()
 )
 async def initialize(
     session_id: str,
-    wellness_usecase: WellnessUsecase = Depends(WellnessUsecase),
+    response: Response,
+    manager: ConnectionManager = Depends(get_connection_manager),
 ) -> TransationResponse:
-    asyncio.create_task(wellness_usecase.initialize_session(session_id))
+    admission = await manager.submit_turn(session_id, Message(event=MessageEvent.INIT_PROFILE))
+    if admission != TurnAdmission.ACCEPTED:
+        return refuse_turn(admission, response)
     return TransationResponse(status=MessageStatus.SUCCESS, message='Wellness Profile Initialized')
 
 
@@ -38,7 +54,13 @@ async def initialize(
 async def user_answer(
     session_id: str,
     message: UserAnswerInput,
-    wellness_usecase: WellnessUsecase = Depends(WellnessUsecase),
+    response: Response,
+    manager: ConnectionManager = Depends(get_connection_manager),
 ) -> TransationResponse:
-    asyncio.create_task(wellness_usecase.send_message_to_assistant(session_id, message))
+    # Runs on the worker holding the session's state, whichever worker the request landed on
+    admission = await manager.submit_turn(
+        session_id, Message(event=MessageEvent.USER_ANSWER, message=message.message)
+    )
+    if admission != TurnAdmission.ACCEPTED:
+        return refuse_turn(admission, response)
     return TransationResponse(status=MessageStatus.SUCCESS, message='User Answer Sent')
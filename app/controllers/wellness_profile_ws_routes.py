@@ -1,31 +1,98 @@
+from typing import Optional
+
 from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
 from structlog import get_logger
 
-from app.repositories.shared_state import (
-    get_connection_manager,
-)
+from app.constants.message import MessageEvent, MessageStatus
+from app.constants.turn_scheduler import TurnAdmission
+from app.controllers.wellness_profile_routes import REFUSED_TURNS
+from app.models.message import Message, OutgoingFrame, UserAnswerInput
+from app.repositories.shared_state import get_connection_manager
+from app.usecases.session_manager_usecase import ConnectionManager
 
 ws_routes = APIRouter()
 
 
+async def dispatch_frame(
+    text: str,
+    session_id: str,
+    manager: ConnectionManager,
+    websocket: WebSocket,
+) -> Optional[Message]:
+    """Handle a frame received from a client, like the matching REST route
+
+    :param str text: The received frame
+    :param str session_id: The ID of the session of the connection
+    :param ConnectionManager manager: The connection manager
+    :param WebSocket websocket: The connection the frame was received on
+    :return Optional[Message]: The reply to send back on the connection only, if any
+    """
+    manager.touch(websocket)
+    try:
+        frame = Message.model_validate_json(text)
+        if frame.event == MessageEvent.USER_ANSWER:
+            answer = UserAnswerInput(message=frame.message)
+
+    except ValidationError as e:
+        error = e.errors()[0]
+        return Message(
+            event=MessageEvent.INVALID_FRAME,
+            status=MessageStatus.ERROR,
+            message=f'{".".join(map(str, error["loc"]))}: {error["msg"]}',
+        )
+
+    if frame.event == MessageEvent.PING:
+        return Message(event=MessageEvent.PONG)
+    if frame.event == MessageEvent.PONG:
+        return None
+
+    if frame.event == MessageEvent.INIT_PROFILE:
+        turn = Message(event=MessageEvent.INIT_PROFILE)
+    elif frame.event == MessageEvent.USER_ANSWER:
+        turn = Message(event=MessageEvent.USER_ANSWER, message=answer.message)
+    else:
+        return Message(
+            event=MessageEvent.INVALID_FRAME,
+            status=MessageStatus.ERROR,
+            message=f'Unsupported event: {frame.event}',
+        )
+
+    admission = await manager.submit_turn(session_id, turn)
+    if admission != TurnAdmission.ACCEPTED:
+        _, message = REFUSED_TURNS[admission]
+        return Message(event=MessageEvent.SERVICE_BUSY, status=MessageStatus.ERROR, message=message)
+    return None
+
+
 @ws_routes.websocket('/wellnessProfile/{session_id}')
 async def wellness_profile(
     websocket: WebSocket,
     session_id: str,
-    manager=Depends(get_connection_manager),
+    last_seq: Optional[int] = None,
+    manager: ConnectionManager = Depends(get_connection_manager),
 ):
     logger = get_logger()
-    await manager.connect(websocket, session_id)
+    # A reconnecting client passes ?last_seq= to get the frames it missed instead of re-initializing
+    await manager.connect(websocket, session_id, last_seq)
 
     try:
-        await websocket.receive_text()
+        # INIT_PROFILE and USER_ANSWER frames replace the REST routes, which remain available
+        while True:
+            text = await websocket.receive_text()
+            reply = await dispatch_frame(text, session_id, manager, websocket)
+            if reply is not None:
+                await manager.send_personal_message(
+                    OutgoingFrame.from_message(reply), websocket, persist=False
+                )
 
     except WebSocketDisconnect as e:
         message = f'Client disconnected: {str(e)}'
         logger.error(message, session_id=session_id)
-        manager.disconnect(websocket)
 
     except Exception as e:
         message = f'Error in wellness profile: {str(e)}'
         logger.error(message, session_id=session_id)
+
+    finally:
         manager.disconnect(websocket)
@@ -1,4 +1,7 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.docs import (
     get_redoc_html,
@@ -6,10 +9,73 @@ from fastapi.openapi.docs import (
     get_swagger_ui_oauth2_redirect_html,
 )
 from fastapi.responses import HTMLResponse
+from structlog import get_logger
 
+from app.controllers.dependencies import AppContainer
 from app.controllers.wellness_profile_controller import ws_controller
+from app.models.wellness_profile import WellnessProfileResponse
+from app.repositories.metrics import CONTENT_TYPE
+from app.repositories.shared_state import (
+    get_connection_manager,
+    get_llm_cassette,
+    get_llm_client_registry,
+    get_metrics_registry,
+    get_session_journal,
+    get_session_store,
+    get_turn_scheduler,
+)
 
-app = FastAPI(title='Healf LLM', version='1.2.1', docs_url=None, redoc_url=None)
+
+def log_startup_failure(task: asyncio.Task):
+    """Log a failed background startup when it fails, not only once the app shuts down
+
+    :param asyncio.Task task: The finished startup task
+    """
+    if not task.cancelled() and task.exception() is not None:
+        get_logger().error(f'LLM stack startup failed: {task.exception()}')
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    llm_client_registry = get_llm_client_registry()
+    connection_manager = get_connection_manager()
+    turn_scheduler = get_turn_scheduler()
+    session_journal = get_session_journal()
+    if session_journal.enabled:
+        # Only the snapshot index is built here, sessions are parsed on first access
+        session_store = get_session_store()
+        get_logger().info('Sessions recovered', **session_store.recover())
+        await session_journal.start(session_store)
+    app.state.container = AppContainer()
+    wellness_usecase = app.state.container.wellness_usecase
+    # Turns of the sessions this worker owns, submitted here or forwarded by other workers
+    connection_manager.set_turn_handler(
+        lambda session_id, frame: turn_scheduler.submit(
+            session_id, wellness_usecase.get_turn(session_id, frame)
+        )
+    )
+    # The LLM stack loads in the background so the app serves, /health included, right away
+    llm_startup = asyncio.create_task(
+        llm_client_registry.startup(response_models=(WellnessProfileResponse,))
+    )
+    llm_startup.add_done_callback(log_startup_failure)
+    await connection_manager.start()
+    turn_scheduler.start()
+    yield
+    # Drain turns first, they still need the connections and the LLM client
+    await turn_scheduler.stop()
+    await connection_manager.stop()
+    if session_journal.enabled:
+        await session_journal.stop()
+    llm_startup.cancel()
+    # A startup failure was logged when it happened, it must not skip the cleanup below
+    with suppress(Exception, asyncio.CancelledError):
+        await llm_startup
+    await llm_client_registry.shutdown()
+    get_llm_cassette().close()
+
+
+app = FastAPI(title='Healf LLM', version='1.2.1', docs_url=None, redoc_url=None, lifespan=lifespan)
 
 
 @app.get('/health')
@@ -17,6 +83,11 @@ def health_check():
     return {'status': 'ok'}
 
 
+@app.get('/metrics', include_in_schema=False)
+def metrics():
+    return Response(get_metrics_registry().render(), media_type=CONTENT_TYPE)
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=['*'],
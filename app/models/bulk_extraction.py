@@ -0,0 +1,63 @@
+from typing import Annotated, List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, StringConstraints
+
+from app.constants.message import MessageStatus
+from app.models.message import Message
+from app.models.wellness_profile import WellnessProfileResponse
+
+
+class TranscriptInput(BaseModel):
+    """
+    Historical intake transcript input model
+    """
+
+    model_config = ConfigDict(extra='forbid')
+
+    id: Annotated[str, StringConstraints(min_length=1, max_length=100)] = Field(
+        description='Caller identifier of the transcript, echoed on its result'
+    )
+    messages: List[Message] = Field(
+        min_length=1,
+        max_length=200,
+        description='The conversation, assistant questions and user answers in order',
+    )
+
+
+class BulkExtractionInput(BaseModel):
+    """
+    Bulk extraction input model
+    """
+
+    model_config = ConfigDict(extra='forbid')
+
+    transcripts: List[TranscriptInput] = Field(
+        min_length=1, max_length=10000, description='The transcripts to extract profiles from'
+    )
+    cursor: int = Field(
+        default=0,
+        ge=0,
+        description='Resume from the cursor of the last result received by a previous request',
+    )
+    concurrency: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description='Transcripts extracted at once, capped by the server',
+    )
+
+
+class BulkExtractionResult(BaseModel):
+    """
+    Bulk extraction result model, one NDJSON line per transcript
+    """
+
+    model_config = ConfigDict(use_enum_values=True, extra='forbid')
+
+    index: int = Field(description='Position of the transcript in the request')
+    id: str = Field(description='Identifier of the transcript')
+    status: MessageStatus
+    result: Optional[WellnessProfileResponse] = None
+    error: Optional[str] = None
+    cursor: int = Field(
+        default=0, description='Every transcript before this position has a result line'
+    )
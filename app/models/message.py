@@ -4,6 +4,12 @@ from pydantic import BaseModel, ConfigDict, Field, StringConstraints
 
 from app.constants.message import MessageEvent, MessageStatus
 
+try:
+    import orjson
+
+except ImportError:  # optional, pip install ".[fast-json]"
+    orjson = None
+
 
 class Message(BaseModel):
     model_config = ConfigDict(use_enum_values=True, extra='forbid')
@@ -13,6 +19,40 @@ class Message(BaseModel):
     message: Optional[str] = None
 
 
+class OutgoingFrame:
+    """A frame encoded once and shared by every recipient, persisted from its structured form"""
+
+    __slots__ = ('payload', 'text')
+
+    def __init__(self, payload: dict, text: str):
+        self.payload = payload
+        self.text = text
+
+    @classmethod
+    def from_message(cls, message: Message) -> 'OutgoingFrame':
+        """Encode a message for sending
+
+        :param Message message: The message to send
+        :return OutgoingFrame: The frame carrying the message and its encoded text
+        """
+        payload = message.model_dump()
+        if orjson is not None:
+            return cls(payload, orjson.dumps(payload).decode())
+        # pydantic's serializer beats encoding the payload with the stdlib json module
+        return cls(payload, message.model_dump_json())
+
+    def with_seq(self, seq: int) -> 'OutgoingFrame':
+        """Stamp the frame with its sequence number in the session
+
+        The number is spliced into the encoded object rather than re-encoding it. The payload
+        is left as is, history entries with a constant payload are shared between sessions.
+
+        :param int seq: The sequence number of the frame
+        :return OutgoingFrame: The frame whose text carries the sequence number
+        """
+        return OutgoingFrame(self.payload, f'{self.text[:-1]},"seq":{seq}}}')
+
+
 class TransationResponse(BaseModel):
     model_config = ConfigDict(use_enum_values=True, extra='forbid')
 
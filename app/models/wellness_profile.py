@@ -1,6 +1,16 @@
-from typing import Annotated, Optional
+from enum import Enum
+from typing import Annotated, List, Optional, get_args
 
-from pydantic import BaseModel, ConfigDict, Field, StringConstraints
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    StringConstraints,
+    ValidationError,
+    ValidationInfo,
+    ValidatorFunctionWrapHandler,
+    field_validator,
+)
 
 from app.constants.wellness_profile import (
     ActivityLevel,
@@ -78,3 +88,149 @@ class WellnessProfileResponse(BaseModel):
     followUpQuestion: Optional[Annotated[str, StringConstraints(min_length=1, max_length=1000)]] = (
         Field(default=None, description='Follow up question to the user')
     )
+
+
+def allow_enum_prefix(cls, value, handler: ValidatorFunctionWrapHandler, info: ValidationInfo):
+    """Validate an enum value the LLM is still generating as None
+
+    Partial outputs are validated as every chunk streams in, their last string cut short.
+    A value that is no prefix of a member is still rejected.
+    """
+    try:
+        return handler(value)
+    except ValidationError:
+        annotation = cls.model_fields[info.field_name].annotation
+        enums = [arg for arg in get_args(annotation) or (annotation,) if isinstance(arg, type)]
+        if isinstance(value, str) and any(
+            member.value.startswith(value)
+            for enum in enums
+            if issubclass(enum, Enum)
+            for member in enum
+        ):
+            return None
+        raise
+
+
+class StreamedWellnessProfile(WellnessProfile):
+    """
+    Wellness profile model of streamed partial outputs
+    """
+
+    _allow_enum_prefix = field_validator(
+        'gender', 'activityLevel', 'dietaryPreference', 'sleepQuality', 'stressLevel', mode='wrap'
+    )(allow_enum_prefix)
+
+
+class StreamedWellnessProfileConfidence(WellnessProfileConfidence):
+    """
+    Wellness profile confidence model of streamed partial outputs
+    """
+
+    _allow_enum_prefix = field_validator('*', mode='wrap')(allow_enum_prefix)
+
+
+class StreamedWellnessProfileResponse(WellnessProfileResponse):
+    """
+    Wellness profile measured model of streamed partial outputs
+
+    Kept apart from WellnessProfileResponse, which instructor validates strictly from JSON,
+    and wrap validators would make it validate the enums as Python values.
+    """
+
+    # The tool keeps its name, the streamed and complete outputs are the same shape
+    model_config = ConfigDict(title='WellnessProfileResponse')
+
+    wellnessProfile: StreamedWellnessProfile = Field(
+        default=None, description='Wellness profile of the user'
+    )
+    confidence: StreamedWellnessProfileConfidence = Field(
+        default=None, description='Confidence of the wellness profile'
+    )
+
+
+PROFILE_FIELDS = tuple(WellnessProfile.model_fields)
+
+
+class ProfileState:
+    """Merged profile of a session, values and confidences indexed like PROFILE_FIELDS
+
+    Extractions are merged in place from the validated models they arrive as, so a turn
+    neither dumps nor re-validates the whole profile.
+    """
+
+    __slots__ = ('values', 'confidences')
+
+    def __init__(self):
+        self.values: List[Optional[object]] = [None] * len(PROFILE_FIELDS)
+        self.confidences: List[Confidence] = [Confidence.LOW] * len(PROFILE_FIELDS)
+
+    def copy(self) -> 'ProfileState':
+        state = ProfileState()
+        state.values = self.values.copy()
+        state.confidences = self.confidences.copy()
+        return state
+
+    def merge(
+        self,
+        profile: Optional[WellnessProfile],
+        confidence: Optional[WellnessProfileConfidence],
+        found_only: bool = False,
+    ) -> List[str]:
+        """Merge an extraction, new non-null values and confidences taking priority
+
+        :param Optional[WellnessProfile] profile: The extracted profile
+        :param Optional[WellnessProfileConfidence] confidence: The extracted confidence
+        :param bool found_only: Leave the confidence of fields the extraction did not find
+        :return List[str]: The fields whose value or confidence changed
+        """
+        changed = []
+        for index, field in enumerate(PROFILE_FIELDS):
+            value = getattr(profile, field) if profile is not None else None
+            if value is None and found_only:
+                continue
+
+            field_confidence = getattr(confidence, field) if confidence is not None else None
+            is_changed = False
+            if value is not None and value != self.values[index]:
+                self.values[index] = value
+                is_changed = True
+            if field_confidence is not None and field_confidence != self.confidences[index]:
+                self.confidences[index] = field_confidence
+                is_changed = True
+            if is_changed:
+                changed.append(field)
+        return changed
+
+    def is_complete(self) -> bool:
+        """Whether every field is filled with high or medium confidence"""
+        return all(value is not None for value in self.values) and all(
+            confidence in (Confidence.HIGH, Confidence.MEDIUM) for confidence in self.confidences
+        )
+
+    def has_pending_clarifications(self) -> bool:
+        """Whether any field still has low confidence"""
+        return Confidence.LOW in self.confidences
+
+    def get_delta(self, fields: List[str]) -> dict:
+        """Get the values and confidences of the given fields, shaped like an extraction
+
+        :param List[str] fields: The changed fields
+        :return dict: The delta, with a wellnessProfile and a confidence mapping
+        """
+        indexes = [PROFILE_FIELDS.index(field) for field in fields]
+        return {
+            'wellnessProfile': {PROFILE_FIELDS[i]: self.values[i] for i in indexes},
+            'confidence': {PROFILE_FIELDS[i]: self.confidences[i] for i in indexes},
+        }
+
+    def as_dict(self) -> dict:
+        return dict(zip(PROFILE_FIELDS, self.values))
+
+    def to_profile(self) -> WellnessProfile:
+        # The values were validated on the way in
+        return WellnessProfile.model_construct(**self.as_dict())
+
+    def to_confidence(self) -> WellnessProfileConfidence:
+        return WellnessProfileConfidence.model_construct(
+            **dict(zip(PROFILE_FIELDS, self.confidences))
+        )
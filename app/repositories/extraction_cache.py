@@ -0,0 +1,212 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from structlog import get_logger
+
+from app.models.wellness_profile import WellnessProfileResponse
+from app.repositories.shared_state import get_metrics_registry
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_user_response(user_response: str) -> str:
+    """Normalize a user response so trivially different spellings share a cache entry
+
+    :param str user_response: The raw user response
+    :return str: The response with unicode, case and whitespace normalized
+    """
+    normalized = unicodedata.normalize('NFKC', user_response).casefold()
+    return WHITESPACE.sub(' ', normalized).strip()
+
+
+class ExtractionCache:
+    """Content-addressed cache of validated extraction outputs
+
+    Entries live in an LRU-bounded memory tier with a TTL, optionally backed by a directory
+    of JSON files shared across workers. Concurrent lookups of a key that is being computed
+    wait for the in-flight computation instead of starting their own.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ExtractionCache, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.max_entries = int(os.getenv('EXTRACTION_CACHE_SIZE') or 1024)
+            self.ttl = float(os.getenv('EXTRACTION_CACHE_TTL') or 600)
+            self.directory = os.getenv('EXTRACTION_CACHE_DIR')
+            self.entries: OrderedDict[str, Tuple[float, WellnessProfileResponse]] = OrderedDict()
+            self.in_flight: Dict[str, asyncio.Future] = {}
+            self.logger = get_logger()
+
+            metrics = get_metrics_registry()
+            self.requests = metrics.counter(
+                'extraction_cache_requests_total', 'Extraction cache lookups, by result'
+            )
+            self.entries_gauge = metrics.gauge(
+                'extraction_cache_entries', 'Extraction outputs held in the memory tier'
+            )
+
+            if self.directory:
+                os.makedirs(self.directory, exist_ok=True)
+            self._initialized = True
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """Hash the inputs that fully determine an extraction output
+
+        :param parts: The normalized response, compacted history, model id and prompt version
+        :return str: The hex digest addressing the output
+        """
+        digest = hashlib.sha256()
+        for part in parts:
+            encoded = (part or '').encode()
+            # Length-prefix every part so ('ab', 'c') and ('a', 'bc') never collide
+            digest.update(len(encoded).to_bytes(8, 'big'))
+            digest.update(encoded)
+        return digest.hexdigest()
+
+    async def get_or_compute(
+        self, key: str, compute: Callable[[], Awaitable[WellnessProfileResponse]]
+    ) -> WellnessProfileResponse:
+        """Return the cached output for a key, computing it at most once across waiters
+
+        When the task computing the output is cancelled, e.g. its session disconnected, the
+        first waiter computes it instead, so the cancellation never reaches other sessions.
+
+        :param str key: The content address of the output
+        :param compute: Produces the output on a miss, failures are not cached
+        :return WellnessProfileResponse: A copy of the cached or computed output
+        """
+        if not self.is_enabled:
+            return await compute()
+
+        while True:
+            response = self.__get_from_memory(key)
+            if response is not None:
+                self.requests.inc(result='hit')
+                return response.model_copy(deep=True)
+
+            in_flight = self.in_flight.get(key)
+            if in_flight is None:
+                break
+
+            self.requests.inc(result='shared')
+            try:
+                return (await asyncio.shield(in_flight)).model_copy(deep=True)
+
+            except asyncio.CancelledError:
+                # Only the owner was cancelled when this task is not, take over from it
+                if asyncio.current_task().cancelling() or not in_flight.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            response = await self.__get_from_disk(key)
+            if response is not None:
+                self.requests.inc(result='disk_hit')
+            else:
+                self.requests.inc(result='miss')
+                response = await compute()
+                await self.__write_to_disk(key, response)
+
+            self.__put_in_memory(key, response)
+            future.set_result(response)
+
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieve the exception so an unwaited future does not log it as never retrieved
+            future.exception()
+            raise
+
+        finally:
+            del self.in_flight[key]
+
+        return response.model_copy(deep=True)
+
+    def __get_from_memory(self, key: str) -> Optional[WellnessProfileResponse]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, response = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            self.entries_gauge.set(len(self.entries))
+            return None
+
+        self.entries.move_to_end(key)
+        return response
+
+    def __put_in_memory(self, key: str, response: WellnessProfileResponse):
+        self.entries[key] = (time.monotonic() + self.ttl, response)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self.entries_gauge.set(len(self.entries))
+
+    def __path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f'{key}.json')
+
+    async def __get_from_disk(self, key: str) -> Optional[WellnessProfileResponse]:
+        if not self.directory:
+            return None
+
+        try:
+            return await asyncio.to_thread(self.__read_file, self.__path(key))
+        except Exception as e:
+            self.logger.warning(f'Error reading extraction cache entry: {e}')
+            return None
+
+    async def __write_to_disk(self, key: str, response: WellnessProfileResponse):
+        if not self.directory:
+            return
+
+        try:
+            await asyncio.to_thread(self.__write_file, self.__path(key), response)
+        except Exception as e:
+            self.logger.warning(f'Error writing extraction cache entry: {e}')
+
+    def __read_file(self, path: str) -> Optional[WellnessProfileResponse]:
+        try:
+            with open(path) as file:
+                entry = json.load(file)
+        except FileNotFoundError:
+            return None
+
+        # Wall-clock expiry, the file outlives this process
+        if entry['expires_at'] <= time.time():
+            os.remove(path)
+            return None
+        return WellnessProfileResponse.model_validate(entry['response'])
+
+    def __write_file(self, path: str, response: WellnessProfileResponse):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {'expires_at': time.time() + self.ttl, 'response': response.model_dump(mode='json')}
+
+        # Write then rename so concurrent readers never see a partial file
+        temporary_path = f'{path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(entry, file)
+        os.replace(temporary_path, path)
@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import json
+import os
+from collections import deque
+from types import SimpleNamespace
+from typing import Deque, Dict, Optional, Tuple
+
+from pydantic import BaseModel
+from structlog import get_logger
+
+from app.constants.llm_cassette import CassetteMode
+from app.repositories.shared_state import get_metrics_registry
+
+USAGE_FIELDS = (
+    'input_tokens',
+    'output_tokens',
+    'cache_read_input_tokens',
+    'cache_creation_input_tokens',
+)
+
+
+class LLMCassette:
+    """Records LLM exchanges to a JSON lines file and serves them back offline
+
+    In record mode every call appends its model id, prompts, validated response, token usage
+    and latency. In replay mode calls are answered from the file, matched on the model id and
+    prompts, and fall back to the recorded order when a build changes the prompts. The
+    recorded latency can be reproduced, scaled by LLM_CASSETTE_LATENCY_SCALE.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(LLMCassette, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.mode = CassetteMode(os.getenv('LLM_CASSETTE_MODE') or CassetteMode.OFF)
+            self.path = os.getenv('LLM_CASSETTE_PATH') or 'llm_cassette.jsonl'
+            self.latency_scale = float(os.getenv('LLM_CASSETTE_LATENCY_SCALE') or 1.0)
+            self.file = None
+            self.entries_by_key: Dict[str, Deque[dict]] = {}
+            self.entries_in_order: Deque[dict] = deque()
+            self.is_loaded = False
+            self.logger = get_logger()
+
+            metrics = get_metrics_registry()
+            self.replays = metrics.counter(
+                'llm_cassette_replays_total', 'LLM calls answered from the cassette, by match'
+            )
+            self._initialized = True
+
+    @property
+    def is_recording(self) -> bool:
+        return self.mode == CassetteMode.RECORD
+
+    @property
+    def is_replaying(self) -> bool:
+        return self.mode == CassetteMode.REPLAY
+
+    @staticmethod
+    def make_key(model_id: str, system_prompt: Optional[str], prompt: str) -> str:
+        digest = hashlib.sha256()
+        for part in (model_id or '', system_prompt or '', prompt):
+            encoded = part.encode()
+            digest.update(len(encoded).to_bytes(8, 'big'))
+            digest.update(encoded)
+        return digest.hexdigest()
+
+    def record(
+        self,
+        model_id: str,
+        system_prompt: Optional[str],
+        prompt: str,
+        response: BaseModel,
+        completion,
+        latency: float,
+        routed_model_id: Optional[str] = None,
+    ):
+        """Append an exchange to the cassette
+
+        :param str model_id: The model that answered
+        :param Optional[str] system_prompt: The cached system prefix, if any
+        :param str prompt: The user prompt
+        :param BaseModel response: The validated output
+        :param completion: The raw completion carrying the token usage, if any
+        :param float latency: The observed latency in seconds, retries included
+        :param Optional[str] routed_model_id: The model the call was routed to, which replay
+            matches on, when a hedge to another model answered instead
+        """
+        usage = getattr(completion, 'usage', None)
+        entry = {
+            'key': self.make_key(routed_model_id or model_id, system_prompt, prompt),
+            'model': model_id,
+            'prompt': prompt,
+            'latency': round(latency, 4),
+            'response': response.model_dump(mode='json', exclude_none=True),
+            'usage': {field: getattr(usage, field, None) or 0 for field in USAGE_FIELDS if usage},
+        }
+
+        if self.file is None:
+            # Line buffered so every exchange is on disk even if the process is killed
+            self.file = open(self.path, 'a', buffering=1)
+        self.file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+    async def replay(
+        self,
+        model_id: str,
+        system_prompt: Optional[str],
+        prompt: str,
+        response_model: type[BaseModel],
+    ) -> Tuple[BaseModel, SimpleNamespace]:
+        """Serve a recorded exchange, waiting for its recorded latency
+
+        :param str model_id: The model the call is routed to
+        :param Optional[str] system_prompt: The cached system prefix, if any
+        :param str prompt: The user prompt
+        :param type[BaseModel] response_model: The model to validate the recorded output with
+        :return Tuple[BaseModel, SimpleNamespace]: The output and a completion carrying its usage
+        """
+        if not self.is_loaded:
+            self.__load()
+
+        entries = self.entries_by_key.get(self.make_key(model_id, system_prompt, prompt))
+        if entries:
+            match = 'exact'
+        else:
+            # The prompt differs from the recording, e.g. another build compacts history
+            # differently, so serve the recorded traffic in order instead
+            entries = self.entries_in_order
+            match = 'sequential'
+        if not entries:
+            raise LookupError(f'Cassette {self.path} has no recorded exchanges')
+
+        # Rotate so repeated prompts cycle through every recording of them
+        entry = entries[0]
+        entries.rotate(-1)
+        self.replays.inc(match=match)
+
+        delay = entry['latency'] * self.latency_scale
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        usage = SimpleNamespace(**entry['usage']) if entry['usage'] else None
+        completion = SimpleNamespace(usage=usage)
+        return response_model.model_validate(entry['response']), completion
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __load(self):
+        with open(self.path) as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self.entries_by_key.setdefault(entry['key'], deque()).append(entry)
+                self.entries_in_order.append(entry)
+
+        self.is_loaded = True
+        self.logger.info(
+            'Loaded LLM cassette', path=self.path, exchanges=len(self.entries_in_order)
+        )
@@ -0,0 +1,235 @@
+import asyncio
+import importlib
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from json import JSONDecodeError
+from typing import TYPE_CHECKING, Dict, Iterator, Optional, Type
+
+from pydantic import BaseModel, ValidationError
+from structlog import get_logger
+
+if TYPE_CHECKING:
+    import httpx
+    import instructor
+    from anthropic import AsyncAnthropicBedrock
+    from instructor.function_calls import OpenAISchema
+    from tenacity import AsyncRetrying
+
+# The LLM stack takes over a second to import, it is loaded off the event loop once the app
+# serves rather than when the app is imported. boto3 is otherwise imported by the first call.
+LLM_STACK_MODULES = (
+    'httpx',
+    'anthropic',
+    'instructor',
+    'tenacity',
+    'boto3',
+    'botocore.auth',
+    'botocore.awsrequest',
+)
+
+
+def import_llm_stack():
+    """Import the modules of the LLM stack, meant to run in a worker thread"""
+    for module in LLM_STACK_MODULES:
+        importlib.import_module(module)
+
+
+class LLMCallStats:
+    """Attempts and validation time of one instructor call, filled in by the client hooks"""
+
+    __slots__ = ('attempts', 'validation_seconds', 'response_at')
+
+    def __init__(self):
+        self.attempts = 0
+        self.validation_seconds = 0.0
+        self.response_at: Optional[float] = None
+
+    def close_validation(self):
+        if self.response_at is not None:
+            self.validation_seconds += time.perf_counter() - self.response_at
+            self.response_at = None
+
+    @property
+    def retries(self) -> int:
+        return max(0, self.attempts - 1)
+
+
+def retry_on_invalid_output(max_attempts: int) -> 'AsyncRetrying':
+    """Let instructor re-ask on invalid outputs only, it retries every error immediately otherwise
+
+    API errors such as throttling propagate to the LLMRateController, which backs off instead.
+    A fresh object per call, tenacity keeps the attempt state on it.
+
+    :param int max_attempts: The number of attempts at getting a valid output
+    :return AsyncRetrying: The retrying policy to pass as instructor's max_retries
+    """
+    from instructor.validators import AsyncValidationError
+    from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt
+
+    return AsyncRetrying(
+        stop=stop_after_attempt(max_attempts),
+        retry=retry_if_exception_type((ValidationError, JSONDecodeError, AsyncValidationError)),
+    )
+
+
+# The hooks are shared by every call on the client, the stats of the current call ride the context
+current_call_stats: ContextVar[Optional[LLMCallStats]] = ContextVar(
+    'current_call_stats', default=None
+)
+
+
+class LLMClientRegistry:
+    """Process-wide Bedrock client with pooled keep-alive connections and cached tool schemas"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(LLMClientRegistry, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.aws_region = os.environ.get('BEDROCK_REGION')
+            self.max_connections = int(os.getenv('BEDROCK_MAX_CONNECTIONS') or 100)
+            self.keepalive_expiry = float(os.getenv('BEDROCK_KEEPALIVE_EXPIRY') or 30)
+            self.warm_up_enabled = bool(os.getenv('BEDROCK_WARM_UP'))
+            self.warm_up_model_id = os.getenv('HAIKU_MODEL_ID') or os.getenv('SONNET_MODEL_ID')
+
+            self.http_client: Optional['httpx.AsyncClient'] = None
+            self.bedrock_client: Optional['AsyncAnthropicBedrock'] = None
+            self.client: Optional['instructor.AsyncInstructor'] = None
+            self.response_models: Dict[Type[BaseModel], Type['OpenAISchema']] = {}
+            self.logger = get_logger()
+            self._initialized = True
+
+    def get_client(self) -> 'instructor.AsyncInstructor':
+        """Get the shared instructor client, building it on first use
+
+        :return instructor.AsyncInstructor: The shared instructor client
+        """
+        if self.client is None:
+            self.__build_client()
+        return self.client
+
+    def get_response_model(self, response_model: Type[BaseModel]) -> Type['OpenAISchema']:
+        """Get the precompiled instructor response model with its tool schema cached
+
+        :param Type[BaseModel] response_model: The response model to compile
+        :return Type[OpenAISchema]: The compiled response model
+        """
+        compiled = self.response_models.get(response_model)
+        if compiled is None:
+            from instructor.function_calls import openai_schema
+            from instructor.utils import classproperty
+
+            compiled = openai_schema(response_model)
+            tool_schema = compiled.anthropic_schema
+            # instructor rebuilds the JSON schema on every call through this classproperty
+            compiled.anthropic_schema = classproperty(lambda _: tool_schema)
+            self.response_models[response_model] = compiled
+        return compiled
+
+    @contextmanager
+    def track_call(self) -> Iterator[LLMCallStats]:
+        """Collect the attempts and validation time of the instructor call made in the block
+
+        :return Iterator[LLMCallStats]: The stats, complete once the block exits
+        """
+        stats = LLMCallStats()
+        token = current_call_stats.set(stats)
+        try:
+            yield stats
+        finally:
+            stats.close_validation()
+            current_call_stats.reset(token)
+
+    async def startup(self, response_models: tuple = ()):
+        """Import the LLM stack in a worker thread, build the client, compile the tool schemas
+        and optionally warm up the connection pool
+
+        Run in the background by the app lifespan, a call made before it completes builds the
+        client itself.
+
+        :param tuple response_models: The response models to precompile
+        """
+        started = time.perf_counter()
+        await asyncio.to_thread(import_llm_stack)
+        self.logger.info('LLM stack imported', seconds=round(time.perf_counter() - started, 3))
+
+        self.get_client()
+        for response_model in response_models:
+            self.get_response_model(response_model)
+
+        if self.warm_up_enabled and self.warm_up_model_id:
+            await self.warm_up()
+
+    async def warm_up(self):
+        """Send a minimal request so the TLS handshake and credential resolution happen on boot"""
+        try:
+            await self.bedrock_client.messages.create(
+                model=self.warm_up_model_id,
+                max_tokens=1,
+                messages=[{'role': 'user', 'content': 'ping'}],
+            )
+            self.logger.info('Bedrock client warmed up', model=self.warm_up_model_id)
+
+        except Exception as e:
+            self.logger.warning(f'Bedrock warm up failed: {e}', model=self.warm_up_model_id)
+
+    async def shutdown(self):
+        """Close the pooled connections"""
+        if self.http_client is not None:
+            await self.http_client.aclose()
+
+        self.http_client = None
+        self.bedrock_client = None
+        self.client = None
+
+    def __build_client(self):
+        import httpx
+        import instructor
+        from anthropic import AsyncAnthropicBedrock, DefaultAsyncHttpxClient
+        from instructor.utils import disable_pydantic_error_url
+
+        disable_pydantic_error_url()  # instructor not include error url in response to save on tokens
+
+        self.http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            )
+        )
+        # Retries are left to the LLMRateController, SDK retries would hide throttling from it
+        self.bedrock_client = AsyncAnthropicBedrock(
+            aws_region=self.aws_region, http_client=self.http_client, max_retries=0
+        )
+        self.client = instructor.from_anthropic(
+            self.bedrock_client, mode=instructor.Mode.ANTHROPIC_TOOLS
+        )
+        self.client.on('completion:kwargs', self.__on_attempt)
+        self.client.on('completion:response', self.__on_response)
+        self.client.on('parse:error', self.__on_parse_error)
+
+    @staticmethod
+    def __on_attempt(*args, **kwargs):
+        stats = current_call_stats.get()
+        if stats is not None:
+            stats.attempts += 1
+
+    @staticmethod
+    def __on_response(response):
+        # Validation starts once the raw response is in and ends on a parse error or return
+        stats = current_call_stats.get()
+        if stats is not None:
+            stats.response_at = time.perf_counter()
+
+    @staticmethod
+    def __on_parse_error(error):
+        stats = current_call_stats.get()
+        if stats is not None:
+            stats.close_validation()
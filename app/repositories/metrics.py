@@ -0,0 +1,197 @@
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LABEL_ESCAPES = str.maketrans({'\\': '\\\\', '"': '\\"', '\n': '\\n'})
+
+
+def format_labels(labels: Tuple, *extra: Tuple) -> str:
+    """Render a label set in the Prometheus text exposition format
+
+    :param Tuple labels: The (name, value) pairs of the series
+    :param extra: Additional (name, value) pairs, e.g. the histogram bucket bound
+    :return str: The rendered label set, empty when there are no labels
+    """
+    pairs = [f'{name}="{str(value).translate(LABEL_ESCAPES)}"' for name, value in labels + extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    __slots__ = ('name', 'description', 'values')
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        """Increment the counter
+
+        :param float amount: The amount to increment by
+        :param labels: The label values of the series to increment
+        """
+        key = tuple(labels.items())
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(tuple(labels.items()), 0)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        for labels, value in self.values.items():
+            lines.append(f'{self.name}{format_labels(labels)} {format_value(value)}')
+        return lines
+
+
+class Gauge:
+    __slots__ = ('name', 'description', 'values')
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        """Set the gauge to a value
+
+        :param float value: The value to set
+        :param labels: The label values of the series to set
+        """
+        self.values[tuple(labels.items())] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.items())
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        return self.values.get(tuple(labels.items()), 0)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} gauge']
+        for labels, value in self.values.items():
+            lines.append(f'{self.name}{format_labels(labels)} {format_value(value)}')
+        return lines
+
+
+class Histogram:
+    __slots__ = ('name', 'description', 'buckets', 'values')
+
+    def __init__(self, name: str, description: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        # per series: [bucket counts..., +Inf count, sum]
+        self.values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        """Record an observation
+
+        :param float value: The observed value
+        :param labels: The label values of the series to record in
+        """
+        key = tuple(labels.items())
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = [0] * (len(self.buckets) + 2)
+
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def get_count(self, **labels) -> int:
+        series = self.values.get(tuple(labels.items()))
+        return int(sum(series[:-1])) if series else 0
+
+    def get_sum(self, **labels) -> float:
+        series = self.values.get(tuple(labels.items()))
+        return series[-1] if series else 0.0
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        bounds = [format_value(float(bound)) for bound in self.buckets] + ['+Inf']
+        for labels, series in self.values.items():
+            # Buckets are stored per interval, the exposition format wants them cumulative
+            cumulative = 0
+            for bound, count in zip(bounds, series[:-1]):
+                cumulative += count
+                lines.append(
+                    f'{self.name}_bucket{format_labels(labels, ("le", bound))} {cumulative}'
+                )
+            lines.append(f'{self.name}_sum{format_labels(labels)} {format_value(series[-1])}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide, allocation-light metrics store shared by the usecases"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(MetricsRegistry, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.metrics: Dict[str, Counter | Gauge | Histogram] = {}
+            self._initialized = True
+
+    def counter(self, name: str, description: str) -> Counter:
+        """Get or create a counter
+
+        :param str name: The name of the metric
+        :param str description: The help text of the metric
+        :return Counter: The counter
+        """
+        return self.__get_or_create(Counter, name, description)
+
+    def gauge(self, name: str, description: str) -> Gauge:
+        """Get or create a gauge
+
+        :param str name: The name of the metric
+        :param str description: The help text of the metric
+        :return Gauge: The gauge
+        """
+        return self.__get_or_create(Gauge, name, description)
+
+    def histogram(
+        self, name: str, description: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """Get or create a histogram
+
+        :param str name: The name of the metric
+        :param str description: The help text of the metric
+        :param Tuple[float, ...] buckets: The upper bounds of the histogram buckets
+        :return Histogram: The histogram
+        """
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = Histogram(name, description, buckets)
+        return metric
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format
+
+        :return str: The exposition, one metric family after another
+        """
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def __get_or_create(self, metric_type, name: str, description: str):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = metric_type(name, description)
+        return metric
@@ -0,0 +1,224 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from structlog import get_logger
+
+MessageHandler = Callable[[str, str], Awaitable[None]]
+
+# Take a free key, or one held by an owner found gone, and keep it alive for its holder
+CLAIM_SCRIPT = """
+local owner = redis.call('GET', KEYS[1])
+if not owner or owner == ARGV[2] then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+    return ARGV[1]
+end
+if owner == ARGV[1] then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+return owner
+"""
+
+
+def session_channel(session_id: str) -> str:
+    """Get the pub/sub channel carrying the frames of a session
+
+    :param str session_id: The ID of the session
+    :return str: The channel name
+    """
+    return f'session:{session_id}'
+
+
+def worker_channel(worker_id: str) -> str:
+    """Get the pub/sub channel carrying the turns and replays addressed to a worker
+
+    :param str worker_id: The ID of the worker
+    :return str: The channel name
+    """
+    return f'worker:{worker_id}'
+
+
+def session_owner_key(session_id: str) -> str:
+    """Get the key naming the worker that holds the state of a session
+
+    :param str session_id: The ID of the session
+    :return str: The key name
+    """
+    return f'session-owner:{session_id}'
+
+
+class PubSubBackend:
+    """Delivers published frames to whichever worker subscribed to the channel
+
+    Session state stays on the worker owning the session, recorded under a claimed key, and
+    the other workers forward the session's turns to it over its worker channel.
+    """
+
+    def __init__(self):
+        self.handler: Optional[MessageHandler] = None
+
+    def set_handler(self, handler: MessageHandler):
+        """Set the coroutine called with (channel, message) for every delivered message
+
+        :param MessageHandler handler: The delivery handler
+        """
+        self.handler = handler
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, channel: str, message: str) -> int:
+        """Publish a message on a channel
+
+        :param str channel: The channel to publish on
+        :param str message: The message to publish
+        :return int: The number of subscribers that received the message
+        """
+        raise NotImplementedError
+
+    async def subscribe(self, channel: str):
+        raise NotImplementedError
+
+    async def unsubscribe(self, channel: str):
+        raise NotImplementedError
+
+    async def count_subscribers(self, channel: str) -> int:
+        """Count the subscribers of a channel across every worker
+
+        :param str channel: The channel to count the subscribers of
+        :return int: The number of subscribers
+        """
+        raise NotImplementedError
+
+    async def claim(self, key: str, owner: str, ttl: int, replacing: Optional[str] = None) -> str:
+        """Claim a key for an owner unless another owner holds it, refreshing its expiry
+
+        :param str key: The key to claim
+        :param str owner: The ID of the claiming owner
+        :param int ttl: The seconds the claim lasts unless claimed again
+        :param Optional[str] replacing: An owner known to be gone, whose claim is taken over
+        :return str: The owner holding the key afterwards
+        """
+        raise NotImplementedError
+
+
+class InProcessPubSub(PubSubBackend):
+    """Single-process backend: publishing hands the message straight to the local handler"""
+
+    def __init__(self):
+        super().__init__()
+        self.channels: Set[str] = set()
+
+    async def publish(self, channel: str, message: str) -> int:
+        if channel not in self.channels:
+            return 0
+
+        await self.handler(channel, message)
+        return 1
+
+    async def subscribe(self, channel: str):
+        self.channels.add(channel)
+
+    async def unsubscribe(self, channel: str):
+        self.channels.discard(channel)
+
+    async def count_subscribers(self, channel: str) -> int:
+        return 1 if channel in self.channels else 0
+
+    async def claim(self, key: str, owner: str, ttl: int, replacing: Optional[str] = None) -> str:
+        # The only worker owns every session
+        return owner
+
+
+class RedisPubSub(PubSubBackend):
+    """Redis backend: every worker subscribes to its worker channel and its sockets' sessions
+
+    Session owners are claimed with a script, so two workers cannot both take a session over.
+    """
+
+    def __init__(self, url: str):
+        super().__init__()
+        self.url = url
+        self.client = None
+        self.pubsub = None
+        self.listener: Optional[asyncio.Task] = None
+        self.channels: Set[str] = set()
+        # redis-py opens a new pub/sub connection per concurrent first subscribe, keep them serial
+        self.subscription_lock = asyncio.Lock()
+        self.logger = get_logger()
+
+    async def start(self):
+        try:
+            from redis import asyncio as redis
+
+        except ImportError as e:
+            raise RuntimeError(
+                'PUBSUB_BACKEND=redis requires the redis extra: pip install ".[redis]"'
+            ) from e
+
+        self.client = redis.from_url(self.url, decode_responses=True)
+        self.pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self.listener = asyncio.create_task(self.__listen())
+
+    async def stop(self):
+        if self.listener is not None:
+            self.listener.cancel()
+            self.listener = None
+        if self.pubsub is not None:
+            await self.pubsub.aclose()
+        if self.client is not None:
+            await self.client.aclose()
+
+    async def publish(self, channel: str, message: str) -> int:
+        return await self.client.publish(channel, message)
+
+    async def subscribe(self, channel: str):
+        async with self.subscription_lock:
+            await self.pubsub.subscribe(channel)
+            self.channels.add(channel)
+
+    async def unsubscribe(self, channel: str):
+        async with self.subscription_lock:
+            self.channels.discard(channel)
+            await self.pubsub.unsubscribe(channel)
+
+    async def count_subscribers(self, channel: str) -> int:
+        counts = await self.client.pubsub_numsub(channel)
+        return counts[0][1] if counts else 0
+
+    async def claim(self, key: str, owner: str, ttl: int, replacing: Optional[str] = None) -> str:
+        return await self.client.eval(CLAIM_SCRIPT, 1, key, owner, replacing or '', ttl)
+
+    async def __listen(self):
+        """Hand every message received on the subscribed channels to the handler"""
+        while True:
+            try:
+                if not self.channels:
+                    await asyncio.sleep(0.05)
+                    continue
+
+                message = await self.pubsub.get_message(timeout=1.0)
+                if message is not None and message['type'] == 'message':
+                    await self.handler(message['channel'], message['data'])
+
+            except asyncio.CancelledError:
+                raise
+
+            except Exception as e:
+                self.logger.error(f'Error receiving pub/sub message: {e}')
+                await asyncio.sleep(1)
+
+
+def create_pubsub_backend() -> PubSubBackend:
+    """Create the backend selected by PUBSUB_BACKEND (memory or redis)
+
+    :return PubSubBackend: The pub/sub backend
+    """
+    backends: Dict[str, Callable[[], PubSubBackend]] = {
+        'memory': InProcessPubSub,
+        'redis': lambda: RedisPubSub(os.getenv('REDIS_URL') or 'redis://localhost:6379/0'),
+    }
+    return backends[os.getenv('PUBSUB_BACKEND') or 'memory']()
@@ -0,0 +1,290 @@
+import asyncio
+import json
+import mmap
+import os
+import re
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from structlog import get_logger
+
+from app.repositories.shared_state import get_metrics_registry
+
+try:
+    import orjson
+
+except ImportError:  # optional, pip install ".[fast-json]"
+    orjson = None
+
+SNAPSHOT_FILE = 'snapshot-{:08d}.dat'
+JOURNAL_FILE = 'journal-{:08d}.log'
+GENERATION_FILE = re.compile(r'^(snapshot|journal)-(\d{8})\.(dat|log)$')
+# Session IDs come from clients, the snapshot index must not split on their separators
+SESSION_ID_ESCAPES = ((b'\\', b'\\\\'), (b'\t', b'\\t'), (b'\n', b'\\n'))
+
+
+def encode(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':')).encode()
+
+
+def decode(data: bytes):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def encode_snapshot_line(session_id: str, last_active: float, state: list) -> bytes:
+    """Encode a session for the snapshot, its ID and last activity readable without parsing
+
+    :param str session_id: The ID of the session
+    :param float last_active: The wall-clock time the session was last accessed
+    :param list state: The encoded session state
+    :return bytes: The snapshot line
+    """
+    return b'%s\t%.3f\t%s\n' % (escape_session_id(session_id), last_active, encode(state))
+
+
+def escape_session_id(session_id: str) -> bytes:
+    encoded = session_id.encode()
+    for character, escaped in SESSION_ID_ESCAPES:
+        encoded = encoded.replace(character, escaped)
+    return encoded
+
+
+def unescape_session_id(encoded: bytes) -> str:
+    if b'\\' in encoded:
+        encoded = re.sub(
+            rb'\\(.)', lambda match: {b't': b'\t', b'n': b'\n'}.get(match[1], match[1]), encoded
+        )
+    return encoded.decode()
+
+
+class SessionJournal:
+    """Write-behind append-only journal of session mutations, compacted into snapshots
+
+    Mutations are buffered on the event loop and written in batches from a worker thread
+    every SESSION_JOURNAL_FLUSH_INTERVAL seconds. Generation g is a journal file holding the
+    mutations made since the snapshot of generation g was started, so recovery loads the
+    latest snapshot and replays the journals from its generation on. Replaying is
+    idempotent, which lets a snapshot be written while sessions keep changing.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SessionJournal, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.directory = os.getenv('SESSION_JOURNAL_DIR')
+            self.enabled = bool(self.directory)
+            self.flush_interval = float(os.getenv('SESSION_JOURNAL_FLUSH_INTERVAL') or 0.05)
+            self.fsync = bool(os.getenv('SESSION_JOURNAL_FSYNC'))
+            self.snapshot_interval = float(os.getenv('SESSION_JOURNAL_SNAPSHOT_INTERVAL') or 600)
+            self.snapshot_bytes = int(os.getenv('SESSION_JOURNAL_SNAPSHOT_BYTES') or 64 * 1024**2)
+
+            self.pending: List[tuple] = []
+            self.generation = 0
+            self.file = None
+            self.journal_bytes = 0
+            self.last_snapshot_at = time.monotonic()
+            self.lock = asyncio.Lock()
+            self.task: Optional[asyncio.Task] = None
+            self.logger = get_logger()
+
+            metrics = get_metrics_registry()
+            self.batch_gauge = metrics.gauge(
+                'session_journal_batch_ops', 'Session mutations written by the last flush'
+            )
+            self.flush_time = metrics.histogram(
+                'session_journal_flush_seconds', 'Time to write a batch of session mutations'
+            )
+            self.snapshot_time = metrics.histogram(
+                'session_journal_snapshot_seconds',
+                'Time to compact the session journal into a snapshot',
+                buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60),
+            )
+            self._initialized = True
+
+    def append(self, *op):
+        """Buffer a session mutation, written by the next flush
+
+        :param op: The operation, the session ID and the operation's arguments
+        """
+        self.pending.append(op)
+
+    def open_for_recovery(self) -> Tuple[Optional[mmap.mmap], Iterator[list]]:
+        """Map the latest snapshot and list the journal operations made after it
+
+        New mutations go to a generation after every existing one, so a torn last line of
+        the previous run is never appended to.
+
+        :return Tuple[Optional[mmap.mmap], Iterator[list]]: The mapped snapshot, None if
+            there is none, and the journal operations to replay over it in order
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        snapshots, journals = [], []
+        for name in os.listdir(self.directory):
+            match = GENERATION_FILE.match(name)
+            if match:
+                kind, generation = match.group(1), int(match.group(2))
+                (snapshots if kind == 'snapshot' else journals).append(generation)
+
+        snapshot_generation = max(snapshots, default=0)
+        self.generation = max(snapshots + journals, default=0) + 1
+
+        snapshot_map = None
+        if snapshots:
+            path = os.path.join(self.directory, SNAPSHOT_FILE.format(snapshot_generation))
+            with open(path, 'rb') as file:
+                if os.fstat(file.fileno()).st_size:
+                    # The mapping outlives the file, which a later compaction deletes
+                    snapshot_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        replayed = sorted(
+            generation for generation in journals if generation >= snapshot_generation
+        )
+        return snapshot_map, self.__iter_journals(replayed)
+
+    @staticmethod
+    def iter_snapshot(snapshot_map: mmap.mmap) -> Iterator[Tuple[str, int]]:
+        """Index a mapped snapshot without parsing the sessions
+
+        :param mmap.mmap snapshot_map: The mapped snapshot
+        :return Iterator[Tuple[str, int]]: The ID and line offset of every session
+        """
+        find = snapshot_map.find
+        position = 0
+        while True:
+            tab = find(b'\t', position)
+            end = find(b'\n', tab)
+            if tab < 0 or end < 0:
+                return
+            yield unescape_session_id(snapshot_map[position:tab]), position
+            position = end + 1
+
+    @staticmethod
+    def read_snapshot_line(snapshot_map: mmap.mmap, offset: int) -> Tuple[float, bytes]:
+        """Read the last activity and encoded state of a session from a mapped snapshot
+
+        :param mmap.mmap snapshot_map: The mapped snapshot
+        :param int offset: The offset of the session's line
+        :return Tuple[float, bytes]: The wall-clock time of the last activity and the state
+        """
+        end = snapshot_map.find(b'\n', offset)
+        _, last_active, state = snapshot_map[offset:end].split(b'\t', 2)
+        return float(last_active), state
+
+    async def start(self, store):
+        """Open a new journal generation and start flushing and compacting in the background
+
+        :param SessionStore store: The store snapshots are taken from
+        """
+        self.__open(self.generation)
+        self.task = asyncio.create_task(self.__run(store))
+
+    async def stop(self):
+        """Stop the background work and write the mutations still buffered"""
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        await self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    async def flush(self):
+        """Write the buffered mutations in a worker thread"""
+        async with self.lock:
+            await self.__flush()
+
+    async def snapshot(self, store):
+        """Compact the journal into a snapshot of the store
+
+        The journal is rotated first, the snapshot is then written in a worker thread while
+        new mutations go to the new generation, and older generations are deleted once the
+        snapshot is in place.
+
+        :param SessionStore store: The store to snapshot
+        """
+        started = time.perf_counter()
+        async with self.lock:
+            await self.__flush()
+            generation = self.generation + 1
+            await asyncio.to_thread(self.__open, generation)
+            lines = store.get_snapshot_lines()
+
+        await asyncio.to_thread(self.__write_snapshot, generation, lines)
+        self.last_snapshot_at = time.monotonic()
+        self.snapshot_time.observe(time.perf_counter() - started)
+        self.logger.info(
+            'Session journal compacted',
+            generation=generation,
+            seconds=round(time.perf_counter() - started, 3),
+        )
+
+    async def __run(self, store):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if (
+                    self.journal_bytes >= self.snapshot_bytes
+                    or time.monotonic() - self.last_snapshot_at >= self.snapshot_interval
+                ):
+                    await self.snapshot(store)
+
+            except Exception as e:
+                self.logger.error(f'Error writing session journal: {e}')
+
+    async def __flush(self):
+        if not self.pending:
+            return
+
+        batch, self.pending = self.pending, []
+        self.batch_gauge.set(len(batch))
+        started = time.perf_counter()
+        await asyncio.to_thread(self.__write, batch)
+        self.flush_time.observe(time.perf_counter() - started)
+
+    def __write(self, batch: List[tuple]):
+        data = b''.join(encode(op) + b'\n' for op in batch)
+        self.file.write(data)
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        self.journal_bytes += len(data)
+
+    def __open(self, generation: int):
+        if self.file is not None:
+            self.file.close()
+        self.generation = generation
+        self.file = open(os.path.join(self.directory, JOURNAL_FILE.format(generation)), 'ab')
+        self.journal_bytes = 0
+
+    def __write_snapshot(self, generation: int, lines: Iterable[bytes]):
+        path = os.path.join(self.directory, SNAPSHOT_FILE.format(generation))
+        with open(path + '.tmp', 'wb') as file:
+            file.writelines(lines)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + '.tmp', path)
+
+        for name in os.listdir(self.directory):
+            match = GENERATION_FILE.match(name)
+            if match and int(match.group(2)) < generation:
+                os.remove(os.path.join(self.directory, name))
+
+    def __iter_journals(self, generations: List[int]) -> Iterator[list]:
+        for generation in generations:
+            with open(os.path.join(self.directory, JOURNAL_FILE.format(generation)), 'rb') as file:
+                for line in file:
+                    try:
+                        yield decode(line)
+                    except ValueError:
+                        # A torn last line, the write it belongs to never completed
+                        break
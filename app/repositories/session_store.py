@@ -0,0 +1,468 @@
+import mmap
+import os
+import sys
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from app.constants.profiling_stage import ProfilingStage
+from app.constants.questions import WellnessProfileQuestions
+from app.constants.session_journal import JournalOp
+from app.constants.wellness_profile import Confidence
+from app.models.message import OutgoingFrame
+from app.models.wellness_profile import ProfileState
+from app.repositories.session_journal import decode, encode_snapshot_line
+from app.repositories.shared_state import get_metrics_registry, get_session_journal
+
+# Rough per-object costs used to keep the store under its memory ceiling
+RECORD_OVERHEAD_BYTES = 2048
+MESSAGE_OVERHEAD_BYTES = 232
+INTERNED_MESSAGE_BYTES = 64
+
+INTERNED_PAYLOADS = frozenset(
+    (
+        WellnessProfileQuestions.INTRODUCTION,
+        WellnessProfileQuestions.USER_ANSWER_RECEIVED,
+        WellnessProfileQuestions.USER_ANSWER_FAILED,
+    )
+)
+
+
+class SessionRecord:
+    """All in-memory state of a single profiling session"""
+
+    __slots__ = (
+        'messages',
+        'status',
+        'profile_state',
+        'assistant_replies',
+        'is_generating',
+        'pending_answers',
+        'last_seq',
+        'replay',
+        'last_access',
+        'size',
+    )
+
+    def __init__(self):
+        self.messages: List[dict] = []
+        self.status = ProfilingStage.INIT
+        self.profile_state: Optional[ProfileState] = None
+        self.assistant_replies = 0
+        self.is_generating = False
+        # answers received while a turn is generating, coalesced into the next turn
+        self.pending_answers: List[str] = []
+        # sequence number of the last persisted frame, and the latest frames kept for replay
+        self.last_seq = 0
+        self.replay: Optional[Deque[Tuple[int, str]]] = None
+        self.last_access = time.monotonic()
+        self.size = RECORD_OVERHEAD_BYTES
+
+
+class SessionStore:
+    """Bounded session store with idle-TTL and LRU eviction
+
+    Records are kept in least-recently-used order, so both idle expiry and the memory
+    ceiling only ever evict from the head of the ordering. Sessions generating a turn or
+    holding a connection are never evicted, they are moved back to the tail instead. With the session journal
+    enabled, mutations are journaled and sessions recovered from a snapshot stay cold in
+    the mapped file until first accessed.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SessionStore, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.idle_ttl = float(os.getenv('SESSION_IDLE_TTL') or 3600)
+            self.max_bytes = int(os.getenv('SESSION_STORE_MAX_BYTES') or 256 * 1024**2)
+            self.replay_size = int(os.getenv('WS_REPLAY_BUFFER_SIZE') or 32)
+            self.records: OrderedDict[str, SessionRecord] = OrderedDict()
+            self.total_bytes = 0
+            self.interned_messages: Dict[Tuple, dict] = {}
+            self.journal = get_session_journal()
+            # Sessions recovered from the snapshot and not accessed since, by line offset
+            self.cold: Dict[str, int] = {}
+            self.snapshot_map: Optional[mmap.mmap] = None
+            # Connections held by each session on this worker
+            self.pinned: Dict[str, int] = {}
+
+            metrics = get_metrics_registry()
+            self.evictions = metrics.counter(
+                'session_store_evictions_total', 'Sessions evicted from the in-memory store'
+            )
+            self.sessions_gauge = metrics.gauge(
+                'session_store_sessions', 'Sessions held in the in-memory store'
+            )
+            self.bytes_gauge = metrics.gauge(
+                'session_store_bytes', 'Estimated memory held by the in-memory session store'
+            )
+            self._initialized = True
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self.records or session_id in self.cold
+
+    def __len__(self) -> int:
+        return len(self.records) + len(self.cold)
+
+    def get(self, session_id: str) -> Optional[SessionRecord]:
+        """Get a session record and mark it as recently used
+
+        :param str session_id: The ID of the session
+        :return Optional[SessionRecord]: The session record, None if unknown or evicted
+        """
+        record = self.records.get(session_id)
+        if record is not None:
+            record.last_access = time.monotonic()
+            self.records.move_to_end(session_id)
+        elif self.cold:
+            record = self.__hydrate(session_id)
+        self.evict_expired()
+        return record
+
+    def get_or_create(self, session_id: str) -> SessionRecord:
+        """Get a session record, creating an empty one when missing
+
+        :param str session_id: The ID of the session
+        :return SessionRecord: The session record
+        """
+        record = self.get(session_id)
+        if record is None:
+            record = self.records[session_id] = SessionRecord()
+            self.__grow(record.size)
+        return record
+
+    def delete(self, session_id: str):
+        """Delete a session record
+
+        :param str session_id: The ID of the session
+        """
+        record = self.records.pop(session_id, None)
+        if record is not None:
+            self.__grow(-record.size)
+        self.cold.pop(session_id, None)
+        if self.journal.enabled:
+            self.journal.append(JournalOp.DELETE, session_id)
+
+    def append_message(self, session_id: str, message: dict):
+        """Append a message to the session history, interning constant payloads
+
+        :param str session_id: The ID of the session
+        :param dict message: The message to append
+        """
+        record = self.get_or_create(session_id)
+        if self.journal.enabled:
+            self.journal.append(JournalOp.APPEND_MESSAGE, session_id, len(record.messages), message)
+        self.__add_message(record, message)
+
+    def clear_messages(self, session_id: str):
+        """Clear the message history of a session
+
+        :param str session_id: The ID of the session
+        """
+        record = self.records.get(session_id) or self.__hydrate(session_id)
+        if record is None:
+            return
+
+        if self.journal.enabled:
+            self.journal.append(JournalOp.CLEAR_MESSAGES, session_id)
+        self.__clear(record)
+
+    def save_state(self, session_id: str):
+        """Journal the stage, profile and reply count of a session after they changed
+
+        :param str session_id: The ID of the session
+        """
+        record = self.records.get(session_id)
+        if record is not None and self.journal.enabled:
+            self.journal.append(JournalOp.SAVE_STATE, session_id, self.__encode_state(record))
+
+    def sequence_frame(self, session_id: str, frame: OutgoingFrame) -> OutgoingFrame:
+        """Number a persisted frame and keep it in the session's replay buffer
+
+        Frames are numbered by the worker owning the session, which every worker forwards
+        the session's turns to.
+
+        :param str session_id: The ID of the session
+        :param OutgoingFrame frame: The frame to number
+        :return OutgoingFrame: The frame carrying its sequence number
+        """
+        record = self.get_or_create(session_id)
+        record.last_seq += 1
+        frame = frame.with_seq(record.last_seq)
+        if self.journal.enabled:
+            # Numbering must carry on after a restart, or clients would drop new frames
+            self.journal.append(JournalOp.SEQUENCE, session_id, record.last_seq)
+
+        if record.replay is None:
+            record.replay = deque()
+        size = MESSAGE_OVERHEAD_BYTES + len(frame.text)
+        while record.replay and len(record.replay) >= self.replay_size:
+            _, dropped = record.replay.popleft()
+            size -= MESSAGE_OVERHEAD_BYTES + len(dropped)
+        record.replay.append((record.last_seq, frame.text))
+        record.size += size
+        self.__grow(size)
+        return frame
+
+    def get_frames_since(self, session_id: str, last_seq: int) -> Tuple[List[str], bool]:
+        """Get the frames of a session sent after a sequence number, for a reconnecting client
+
+        :param str session_id: The ID of the session
+        :param int last_seq: The sequence number of the last frame the client received
+        :return Tuple[List[str], bool]: The missed frames still buffered, and whether they are
+            all of the missed frames
+        """
+        record = self.get(session_id)
+        if record is None:
+            return [], last_seq == 0
+
+        replay = record.replay or ()
+        frames = [text for seq, text in replay if seq > last_seq]
+        first_seq = replay[0][0] if replay else record.last_seq + 1
+        # A client ahead of the session saw frames of a session since evicted or reset
+        is_complete = first_seq <= last_seq + 1 and last_seq <= record.last_seq
+        return frames, is_complete
+
+    def intern_message(self, message: dict) -> dict:
+        """Share one dict between every session for messages carrying a constant payload
+
+        :param dict message: The message to intern
+        :return dict: The shared message, or the original one if its payload is not constant
+        """
+        if not isinstance(message, dict) or message.get('message') not in INTERNED_PAYLOADS:
+            return message
+
+        key = tuple(message.items())
+        interned = self.interned_messages.get(key)
+        if interned is None:
+            interned = self.interned_messages[key] = {
+                sys.intern(k) if isinstance(k, str) else k: v for k, v in message.items()
+            }
+        return interned
+
+    def pin(self, session_id: str):
+        """Keep a session from being evicted while a connection holds it
+
+        :param str session_id: The ID of the session
+        """
+        self.pinned[session_id] = self.pinned.get(session_id, 0) + 1
+
+    def unpin(self, session_id: str):
+        """Release a session pinned by a connection that closed
+
+        :param str session_id: The ID of the session
+        """
+        refs = self.pinned.get(session_id, 0) - 1
+        if refs > 0:
+            self.pinned[session_id] = refs
+        else:
+            self.pinned.pop(session_id, None)
+
+    def evict_expired(self):
+        """Evict sessions idle for longer than the TTL, unless generating or connected"""
+        deadline = time.monotonic() - self.idle_ttl
+        for _ in range(len(self.records)):
+            session_id, record = next(iter(self.records.items()))
+            if record.last_access > deadline:
+                break
+            if not self.__skip_in_use(session_id, record):
+                self.__evict(session_id, 'ttl')
+
+    def recover(self) -> dict:
+        """Rebuild the store from the latest snapshot and the journal written after it
+
+        Only the snapshot index is built, each session is parsed on first access.
+
+        :return dict: The number of sessions recovered and journal operations replayed
+        """
+        started = time.perf_counter()
+        self.snapshot_map, operations = self.journal.open_for_recovery()
+        if self.snapshot_map is not None:
+            self.cold = dict(self.journal.iter_snapshot(self.snapshot_map))
+
+        replayed = 0
+        for operation in operations:
+            self.__apply(operation)
+            replayed += 1
+
+        return {
+            'sessions': len(self),
+            'replayed': replayed,
+            'seconds': round(time.perf_counter() - started, 3),
+        }
+
+    def get_snapshot_lines(self) -> Iterator[bytes]:
+        """Get the snapshot of every session, encoded lazily so it can be written off the loop
+
+        The sessions are listed when called, their state is read while the lines are
+        written. Sessions still cold are copied from the mapped snapshot without parsing.
+
+        :return Iterator[bytes]: The snapshot lines
+        """
+        records = list(self.records.items())
+        cold = list(self.cold.items())
+        snapshot_map = self.snapshot_map
+        wall_offset = time.time() - time.monotonic()
+        expired_before = time.time() - self.idle_ttl
+
+        def lines() -> Iterator[bytes]:
+            for session_id, record in records:
+                state = self.__encode_state(record) + [record.last_seq, list(record.messages)]
+                yield encode_snapshot_line(session_id, record.last_access + wall_offset, state)
+
+            for session_id, offset in cold:
+                end = snapshot_map.find(b'\n', offset) + 1
+                line = snapshot_map[offset:end]
+                if float(line.split(b'\t', 2)[1]) > expired_before:
+                    yield line
+
+        return lines()
+
+    def get_stats(self) -> dict:
+        """Get the store size and eviction statistics
+
+        :return dict: The number of sessions, estimated bytes and evictions per reason
+        """
+        return {
+            'sessions': len(self.records),
+            'cold_sessions': len(self.cold),
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'evictions': {
+                reason: self.evictions.get(reason=reason) for reason in ('ttl', 'memory')
+            },
+        }
+
+    def __skip_in_use(self, session_id: str, record: SessionRecord) -> bool:
+        """Move a session in use to the tail rather than evict it
+
+        Evicting a session mid-turn would let its next frame start a second generation on
+        an empty record.
+
+        :param str session_id: The ID of the session at the head of the ordering
+        :param SessionRecord record: Its record
+        :return bool: True if the session is in use and was moved
+        """
+        if not record.is_generating and session_id not in self.pinned:
+            return False
+        record.last_access = time.monotonic()
+        self.records.move_to_end(session_id)
+        return True
+
+    def __evict(self, session_id: str, reason: str):
+        record = self.records.pop(session_id)
+        self.__grow(-record.size)
+        self.evictions.inc(reason=reason)
+        if self.journal.enabled:
+            self.journal.append(JournalOp.DELETE, session_id)
+
+    def __add_message(self, record: SessionRecord, message: dict):
+        message = self.intern_message(message)
+        if isinstance(message, dict):
+            payload = message.get('message')
+            size = (
+                INTERNED_MESSAGE_BYTES
+                if payload in INTERNED_PAYLOADS
+                else MESSAGE_OVERHEAD_BYTES + len(payload or '')
+            )
+        else:
+            size = MESSAGE_OVERHEAD_BYTES + len(message)
+        record.messages.append(message)
+        record.size += size
+        self.__grow(size)
+
+    def __clear(self, record: SessionRecord):
+        freed = record.size - RECORD_OVERHEAD_BYTES
+        record.messages = []
+        record.replay = None
+        record.size = RECORD_OVERHEAD_BYTES
+        self.__grow(-freed)
+
+    @staticmethod
+    def __encode_state(record: SessionRecord) -> list:
+        state = record.profile_state
+        return [
+            record.status,
+            list(state.values) if state is not None else None,
+            list(state.confidences) if state is not None else None,
+            record.assistant_replies,
+        ]
+
+    def __restore_state(self, record: SessionRecord, encoded: list):
+        status, values, confidences, assistant_replies = encoded[:4]
+        # Stages advance past COMPLETED to None, see ProfilingStageMapping.get_next_stage
+        record.status = ProfilingStage(status) if status is not None else None
+        record.profile_state = None
+        if values is not None:
+            record.profile_state = ProfileState()
+            record.profile_state.values = values
+            record.profile_state.confidences = [Confidence(value) for value in confidences]
+        record.assistant_replies = assistant_replies
+
+    def __hydrate(self, session_id: str) -> Optional[SessionRecord]:
+        offset = self.cold.pop(session_id, None)
+        if offset is None:
+            return None
+
+        last_active, encoded = self.journal.read_snapshot_line(self.snapshot_map, offset)
+        if time.time() - last_active > self.idle_ttl:
+            self.evictions.inc(reason='ttl')
+            if self.journal.enabled:
+                self.journal.append(JournalOp.DELETE, session_id)
+            return None
+
+        state = decode(encoded)
+        record = self.records[session_id] = SessionRecord()
+        self.__restore_state(record, state)
+        record.last_seq = state[4]
+        self.__grow(record.size)
+        for message in state[5]:
+            self.__add_message(record, message)
+        return record
+
+    def __apply(self, operation: list):
+        # Replay is idempotent, operations already in the snapshot leave the session unchanged
+        op, session_id = operation[0], operation[1]
+        if op == JournalOp.DELETE:
+            record = self.records.pop(session_id, None)
+            if record is not None:
+                self.__grow(-record.size)
+            self.cold.pop(session_id, None)
+            return
+
+        record = self.records.get(session_id) or self.__hydrate(session_id)
+        if record is None:
+            record = self.records[session_id] = SessionRecord()
+            self.__grow(record.size)
+
+        if op == JournalOp.APPEND_MESSAGE:
+            index, message = operation[2], operation[3]
+            # Messages appended before a clear are skipped, the clear is replayed after them
+            if index == len(record.messages):
+                self.__add_message(record, message)
+        elif op == JournalOp.CLEAR_MESSAGES:
+            self.__clear(record)
+        elif op == JournalOp.SAVE_STATE:
+            self.__restore_state(record, operation[2])
+        elif op == JournalOp.SEQUENCE:
+            record.last_seq = max(record.last_seq, operation[2])
+
+    def __grow(self, size: int):
+        self.total_bytes += size
+        # The most recent session, usually the one growing, is never evicted
+        newest = next(reversed(self.records), None)
+        for _ in range(len(self.records)):
+            session_id, record = next(iter(self.records.items()))
+            if self.total_bytes <= self.max_bytes or session_id == newest:
+                break
+            if not self.__skip_in_use(session_id, record):
+                self.__evict(session_id, 'memory')
+
+        self.sessions_gauge.set(len(self.records))
+        self.bytes_gauge.set(self.total_bytes)
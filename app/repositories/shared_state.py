@@ -1,18 +1,68 @@
-from typing import Dict, List
+def get_session_store():
+    """Get the singleton SessionStore instance"""
+    from app.repositories.session_store import SessionStore
 
-from app.constants.profiling_stage import ProfilingStage
-from app.models.wellness_profile import WellnessProfile, WellnessProfileConfidence
+    return SessionStore()
 
-session_messages: Dict[str, List[dict]] = {}
-session_status: Dict[str, ProfilingStage] = {}
-session_wellness_profiles: Dict[str, WellnessProfile] = {}
-session_wellness_confidence: Dict[str, WellnessProfileConfidence] = {}
-session_assistant_replies: Dict[str, int] = {}
-session_has_pending_generation: Dict[str, bool] = {}
+
+def get_session_journal():
+    """Get the singleton SessionJournal instance"""
+    from app.repositories.session_journal import SessionJournal
+
+    return SessionJournal()
 
 
 def get_connection_manager():
     """Get the singleton ConnectionManager instance"""
     from app.usecases.session_manager_usecase import ConnectionManager
 
-    return ConnectionManager(session_messages)
+    return ConnectionManager(get_session_store())
+
+
+def get_turn_scheduler():
+    """Get the singleton TurnScheduler instance"""
+    from app.usecases.turn_scheduler_usecase import TurnScheduler
+
+    return TurnScheduler()
+
+
+def get_llm_rate_controller():
+    """Get the singleton LLMRateController instance"""
+    from app.usecases.llm_rate_controller_usecase import LLMRateController
+
+    return LLMRateController()
+
+
+def get_llm_hedge_policy():
+    """Get the singleton HedgePolicy instance"""
+    from app.usecases.llm_hedging_usecase import HedgePolicy
+
+    return HedgePolicy()
+
+
+def get_llm_client_registry():
+    """Get the singleton LLMClientRegistry instance"""
+    from app.repositories.llm_client_registry import LLMClientRegistry
+
+    return LLMClientRegistry()
+
+
+def get_metrics_registry():
+    """Get the singleton MetricsRegistry instance"""
+    from app.repositories.metrics import MetricsRegistry
+
+    return MetricsRegistry()
+
+
+def get_extraction_cache():
+    """Get the singleton ExtractionCache instance"""
+    from app.repositories.extraction_cache import ExtractionCache
+
+    return ExtractionCache()
+
+
+def get_llm_cassette():
+    """Get the singleton LLMCassette instance"""
+    from app.repositories.llm_cassette import LLMCassette
+
+    return LLMCassette()
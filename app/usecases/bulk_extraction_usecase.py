@@ -0,0 +1,143 @@
+import asyncio
+import os
+from typing import AsyncIterator, List, Optional
+
+from structlog import get_logger
+
+from app.constants.message import MessageEvent, MessageStatus
+from app.constants.questions import WellnessProfileQuestions
+from app.models.bulk_extraction import BulkExtractionResult, TranscriptInput
+from app.repositories.shared_state import get_metrics_registry
+from app.usecases.llm_rate_controller_usecase import LLMOverloadedError
+from app.usecases.llm_usecase import LLMUsecase
+
+
+class BulkExtractionUsecase:
+    __slots__ = ('__llm_usecase', '__max_concurrency', '__logger', '__extractions')
+
+    def __init__(self, llm_usecase: Optional[LLMUsecase] = None):
+        self.__llm_usecase = llm_usecase or LLMUsecase()
+        self.__max_concurrency = int(os.getenv('BULK_EXTRACTION_MAX_CONCURRENCY') or 8)
+        self.__logger = get_logger()
+
+        metrics = get_metrics_registry()
+        self.__extractions = metrics.counter(
+            'bulk_extractions_total', 'Transcripts extracted by the bulk route, by status'
+        )
+
+    def get_concurrency(self, requested: Optional[int]) -> int:
+        """Get the number of transcripts extracted at once for a request
+
+        :param Optional[int] requested: The concurrency asked for by the request
+        :return int: The concurrency, capped by BULK_EXTRACTION_MAX_CONCURRENCY
+        """
+        return min(requested or self.__max_concurrency, self.__max_concurrency)
+
+    async def extract(
+        self, transcripts: List[TranscriptInput], concurrency: int, cursor: int = 0
+    ) -> AsyncIterator[BulkExtractionResult]:
+        """Extract a profile from each transcript, yielding the results as they finish.
+
+        A fixed pool of workers pulls the transcripts in order, so at most `concurrency`
+        extractions run at once however many transcripts are sent. Each result carries the
+        cursor below which every transcript has a result, a request resumed from it skips
+        those and repeats at most the results received beyond it.
+
+        :param List[TranscriptInput] transcripts: The transcripts to extract profiles from
+        :param int concurrency: The number of transcripts extracted at once
+        :param int cursor: The position to resume from
+        :return AsyncIterator[BulkExtractionResult]: The results in order of completion
+        """
+        pending = iter(range(cursor, len(transcripts)))
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def work():
+            # The workers share the iterator, each transcript is taken exactly once
+            for index in pending:
+                # Every transcript gets a result, or the stream would wait for it forever
+                try:
+                    result = await self.__extract_one(index, transcripts[index])
+
+                except asyncio.CancelledError:
+                    if asyncio.current_task().cancelling():
+                        raise
+                    result = self.__failed(index, transcripts[index], 'Extraction cancelled')
+
+                except Exception as e:
+                    self.__logger.error(
+                        f'Error extracting transcript: {e}', transcript_id=transcripts[index].id
+                    )
+                    result = self.__failed(index, transcripts[index], 'Extraction failed')
+
+                results.put_nowait(result)
+
+        remaining = max(0, len(transcripts) - cursor)
+        workers = [asyncio.create_task(work()) for _ in range(min(concurrency, remaining))]
+        finished = set()
+        try:
+            for _ in range(remaining):
+                result = await results.get()
+                finished.add(result.index)
+                while cursor in finished:
+                    finished.discard(cursor)
+                    cursor += 1
+                result.cursor = cursor
+                yield result
+
+        finally:
+            # The client may go away mid-stream, stop paying for extractions nobody reads
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def __extract_one(self, index: int, transcript: TranscriptInput) -> BulkExtractionResult:
+        """Extract the profile of one transcript, reporting failures on its result
+
+        :param int index: The position of the transcript in the request
+        :param TranscriptInput transcript: The transcript to extract the profile from
+        :return BulkExtractionResult: The result of the transcript
+        """
+        # The answers are extracted together like coalesced answers, the questions give context
+        answers = [
+            message.message
+            for message in transcript.messages
+            if message.event == MessageEvent.USER_ANSWER and message.message
+        ]
+        history = [
+            message.model_dump()
+            for message in transcript.messages
+            if message.event != MessageEvent.USER_ANSWER
+        ]
+        if not answers:
+            return self.__failed(index, transcript, 'No user answer in transcript')
+
+        question = next(
+            (
+                message['message']
+                for message in reversed(history)
+                if message['event'] == MessageEvent.ASSISTANT_QUESTION and message['message']
+            ),
+            WellnessProfileQuestions.INTRODUCTION,
+        )
+        try:
+            response = await self.__llm_usecase.get_output_model_from_user_response(
+                '\n'.join(answers), question, response_history=history
+            )
+
+        except LLMOverloadedError as e:
+            return self.__failed(index, transcript, f'Service busy: {e}')
+
+        except Exception as e:
+            self.__logger.error(f'Error extracting transcript: {e}', transcript_id=transcript.id)
+            return self.__failed(index, transcript, 'Extraction failed')
+
+        self.__extractions.inc(status=MessageStatus.SUCCESS)
+        return BulkExtractionResult(
+            index=index, id=transcript.id, status=MessageStatus.SUCCESS, result=response
+        )
+
+    def __failed(self, index: int, transcript: TranscriptInput, error: str) -> BulkExtractionResult:
+        self.__extractions.inc(status=MessageStatus.ERROR)
+        return BulkExtractionResult(
+            index=index, id=transcript.id, status=MessageStatus.ERROR, error=error
+        )
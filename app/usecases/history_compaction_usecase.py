@@ -0,0 +1,115 @@
+import os
+import re
+from typing import List, Optional
+
+from app.constants.message import MessageEvent
+from app.constants.questions import WellnessProfileQuestions
+from app.models.wellness_profile import WellnessProfile, WellnessProfileConfidence
+
+# Claude tokenizers average roughly four characters per token on English prose
+CHARS_PER_TOKEN = 4
+
+CONVERSATIONAL_EVENTS = {
+    MessageEvent.USER_ANSWER: 'User',
+    MessageEvent.ASSISTANT_QUESTION: 'Assistant',
+}
+
+NON_CONVERSATIONAL_PAYLOADS = {
+    WellnessProfileQuestions.INTRODUCTION,
+    WellnessProfileQuestions.USER_ANSWER_RECEIVED,
+    WellnessProfileQuestions.USER_ANSWER_FAILED,
+}
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens of a text without calling the tokenizer
+
+    :param str text: The text to estimate
+    :return int: The estimated number of tokens
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class HistoryCompactionUsecase:
+    __slots__ = ('__token_budget', '__recent_turns')
+
+    def __init__(self):
+        self.__token_budget = int(os.getenv('HISTORY_TOKEN_BUDGET') or 1000)
+        self.__recent_turns = int(os.getenv('HISTORY_RECENT_TURNS') or 4)
+
+    def compact(
+        self,
+        response_history: List[dict],
+        profile: Optional[WellnessProfile] = None,
+        confidence: Optional[WellnessProfileConfidence] = None,
+    ) -> str:
+        """Render the session history as a compact transcript within the token budget
+
+        Status frames and the introduction are dropped, turns older than the most recent
+        ones are replaced by the merged profile state, and the oldest remaining turns are
+        dropped until the transcript fits the budget.
+
+        :param List[dict] response_history: The session messages
+        :param Optional[WellnessProfile] profile: The merged profile extracted so far
+        :param Optional[WellnessProfileConfidence] confidence: The merged confidence so far
+        :return str: The compacted history
+        """
+        turns = self.__render_turns(response_history)
+
+        older_turns = turns[: -self.__recent_turns] if self.__recent_turns else turns
+        recent_turns = turns[len(older_turns) :]
+
+        state = self.__render_profile_state(profile, confidence) if older_turns else ''
+        if older_turns and not state:
+            # Nothing merged yet to stand in for the older turns, keep them
+            recent_turns = turns
+
+        budget = self.__token_budget - estimate_tokens(state)
+        kept: List[str] = []
+        for turn in reversed(recent_turns):
+            cost = estimate_tokens(turn) + 1
+            if cost > budget:
+                if not kept and budget > 0:
+                    kept.append(turn[: budget * CHARS_PER_TOKEN])
+                break
+            kept.append(turn)
+            budget -= cost
+
+        sections = []
+        if state:
+            sections.append(f'Profile extracted from earlier turns: {state}')
+        if kept:
+            sections.append('\n'.join(reversed(kept)))
+        return '\n'.join(sections) or 'No previous conversation.'
+
+    def __render_turns(self, response_history: List[dict]) -> List[str]:
+        turns = []
+        for message in response_history:
+            if not isinstance(message, dict):
+                continue
+
+            speaker = CONVERSATIONAL_EVENTS.get(message.get('event'))
+            text = message.get('message')
+            if speaker is None or not text or text in NON_CONVERSATIONAL_PAYLOADS:
+                continue
+
+            turns.append(f'{speaker}: {WHITESPACE.sub(" ", text).strip()}')
+        return turns
+
+    def __render_profile_state(
+        self,
+        profile: Optional[WellnessProfile],
+        confidence: Optional[WellnessProfileConfidence],
+    ) -> str:
+        if profile is None:
+            return ''
+
+        confidence_data = confidence.model_dump() if confidence else {}
+        fields = [
+            f'{field}={value} ({confidence_data.get(field, "low")})'
+            for field, value in profile.model_dump().items()
+            if value is not None
+        ]
+        return ', '.join(fields)
@@ -0,0 +1,97 @@
+import os
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from app.repositories.shared_state import get_metrics_registry
+
+
+class HedgePolicy:
+    """Decides when a slow LLM call gets a duplicate request, within a bounded extra spend
+
+    The hedge delay is a percentile of the latencies recently observed for the model, so only
+    the slowest calls are hedged. Every call earns LLM_HEDGE_BUDGET of a hedge, up to
+    LLM_HEDGE_MAX_BURST hedges, so hedging adds at most that fraction of calls and a slow
+    spell cannot double the load on Bedrock.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(HedgePolicy, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.enabled = bool(os.getenv('LLM_HEDGING'))
+            self.percentile = float(os.getenv('LLM_HEDGE_PERCENTILE') or 95)
+            self.budget = float(os.getenv('LLM_HEDGE_BUDGET') or 0.05)
+            self.max_burst = float(os.getenv('LLM_HEDGE_MAX_BURST') or 10)
+            self.window = int(os.getenv('LLM_HEDGE_WINDOW') or 200)
+            self.min_samples = int(os.getenv('LLM_HEDGE_MIN_SAMPLES') or 20)
+            # A Haiku or cross-region inference profile ID, the primary's model when unset
+            self.hedge_model_id = os.getenv('LLM_HEDGE_MODEL_ID')
+            self.latencies: Dict[str, Deque[float]] = {}
+            self.credit = 0.0
+
+            metrics = get_metrics_registry()
+            self.hedges = metrics.counter(
+                'llm_hedges_total', 'LLM calls outliving their hedge delay, by outcome'
+            )
+            self.saved_time = metrics.histogram(
+                'llm_hedge_saved_seconds',
+                'Estimated latency saved by hedges that won, from the recent latencies',
+            )
+            self._initialized = True
+
+    def observe(self, model_id: str, latency: float):
+        """Record the latency of a completed call
+
+        :param str model_id: The model that answered
+        :param float latency: The latency of the call in seconds
+        """
+        latencies = self.latencies.get(model_id)
+        if latencies is None:
+            latencies = self.latencies[model_id] = deque(maxlen=self.window)
+        latencies.append(latency)
+
+    def get_delay(self, model_id: str) -> Optional[float]:
+        """Get how long a call waits before it is hedged, earning hedge budget for the call
+
+        :param str model_id: The model of the call
+        :return Optional[float]: The delay in seconds, None if the call is not to be hedged
+        """
+        if not self.enabled:
+            return None
+
+        self.credit = min(self.max_burst, self.credit + self.budget)
+        latencies = self.latencies.get(model_id)
+        if latencies is None or len(latencies) < self.min_samples:
+            return None
+
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))]
+
+    def try_spend(self) -> bool:
+        """Take a hedge from the budget
+
+        :return bool: Whether the budget allows a hedge
+        """
+        if self.credit < 1:
+            return False
+        self.credit -= 1
+        return True
+
+    def estimate_saved(self, model_id: str, pending: float) -> float:
+        """Estimate the latency a winning hedge saved over the cancelled primary call
+
+        The primary had not answered after `pending` seconds, so it is expected to have taken
+        as long as the recent calls slower than that.
+
+        :param str model_id: The model of the primary call
+        :param float pending: How long the primary call had been pending when the hedge won
+        :return float: The estimated latency saved in seconds
+        """
+        slower = [latency for latency in self.latencies.get(model_id, ()) if latency > pending]
+        return sum(slower) / len(slower) - pending if slower else 0.0
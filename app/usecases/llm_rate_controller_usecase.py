@@ -0,0 +1,423 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager, suppress
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from structlog import get_logger
+
+from app.constants.llm_rate_control import ShedReason
+from app.repositories.shared_state import get_metrics_registry
+
+# Bedrock answers 429 ThrottlingException, 503 ServiceUnavailable or 529 when over capacity
+THROTTLE_STATUS_CODES = (429, 503, 529)
+DECREASE_FACTOR = 0.75
+
+
+def is_throttle(error: Exception) -> bool:
+    from anthropic import APIStatusError
+
+    return isinstance(error, APIStatusError) and error.status_code in THROTTLE_STATUS_CODES
+
+
+def is_retryable(error: Exception) -> bool:
+    from anthropic import APIConnectionError, APIStatusError
+
+    if isinstance(error, APIConnectionError):
+        return True
+    return isinstance(error, APIStatusError) and (
+        error.status_code in THROTTLE_STATUS_CODES or error.status_code >= 500
+    )
+
+
+class LLMOverloadedError(Exception):
+    """Raised instead of waiting when a call cannot be admitted or keeps being throttled"""
+
+    def __init__(self, model_id: str, reason: ShedReason):
+        super().__init__(f'LLM call to {model_id} shed: {reason}')
+        self.model_id = model_id
+        self.reason = reason
+
+
+class TokenBucket:
+    """Budget refilled continuously over a minute, reservations may overdraw it"""
+
+    __slots__ = ('capacity', 'rate', 'tokens', 'updated_at')
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated_at = time.monotonic()
+
+    def get_wait(self, amount: float) -> float:
+        """Get how long a reservation would wait for the bucket to cover it
+
+        :param float amount: The amount to reserve
+        :return float: The wait in seconds, 0 if the bucket covers it now
+        """
+        self.__refill()
+        shortfall = min(amount, self.capacity) - self.tokens
+        return shortfall / self.rate if shortfall > 0 else 0.0
+
+    def take(self, amount: float):
+        # Overdrawing queues later reservations behind this one, in arrival order
+        self.__refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        self.__refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def __refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+
+class ModelLimiter:
+    """Request and token budgets and the adaptive concurrency limit of a single model"""
+
+    __slots__ = ('requests', 'tokens', 'limit', 'in_flight', 'waiters', 'last_decrease_at')
+
+    def __init__(self, rpm: float, tpm: float, limit: float):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.limit = limit
+        self.in_flight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.last_decrease_at = 0.0
+
+    def has_free_slot(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+
+class Admission:
+    """A call admitted by the controller, settled with the tokens it actually used"""
+
+    __slots__ = ('reserved_tokens', 'used_tokens', 'started_at')
+
+    def __init__(self, reserved_tokens: int):
+        self.reserved_tokens = reserved_tokens
+        self.used_tokens: Optional[int] = None
+        self.started_at = time.monotonic()
+
+    def settle(self, completion):
+        """Record the token usage of the completion so the unused reservation is returned
+
+        :param completion: The raw completion carrying the token usage, if any
+        """
+        usage = getattr(completion, 'usage', None)
+        if usage is None:
+            return
+
+        self.used_tokens = sum(
+            getattr(usage, field, None) or 0
+            for field in (
+                'input_tokens',
+                'output_tokens',
+                'cache_read_input_tokens',
+                'cache_creation_input_tokens',
+            )
+        )
+
+
+class LLMRateController:
+    """Admits Bedrock calls within per-model RPM and TPM budgets and an adaptive concurrency limit
+
+    Budgets are token buckets, and a call that would wait longer than LLM_MAX_ADMISSION_WAIT
+    for them or for a free slot is shed with LLMOverloadedError instead of timing out. The
+    concurrency limit grows additively while calls succeed within LLM_LATENCY_SLO and is
+    scaled by DECREASE_FACTOR on throttling or SLO breaches, so a throttled model gets fewer
+    calls rather than retry storms. Throttled and failed calls are retried with jittered exponential backoff.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(LLMRateController, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.budgets: Dict[str, Tuple[float, float]] = {
+                os.getenv('SONNET_MODEL_ID'): (
+                    float(os.getenv('SONNET_RPM') or 0),
+                    float(os.getenv('SONNET_TPM') or 0),
+                ),
+                os.getenv('HAIKU_MODEL_ID'): (
+                    float(os.getenv('HAIKU_RPM') or 0),
+                    float(os.getenv('HAIKU_TPM') or 0),
+                ),
+            }
+            self.min_concurrency = int(os.getenv('LLM_CONCURRENCY_MIN') or 1)
+            self.max_concurrency = int(os.getenv('LLM_CONCURRENCY_MAX') or 64)
+            self.initial_concurrency = int(os.getenv('LLM_CONCURRENCY_INITIAL') or 16)
+            self.latency_slo = float(os.getenv('LLM_LATENCY_SLO') or 20)
+            self.max_admission_wait = float(os.getenv('LLM_MAX_ADMISSION_WAIT') or 5)
+            self.max_retries = int(os.getenv('LLM_THROTTLE_RETRIES') or 3)
+            self.backoff_base = float(os.getenv('LLM_BACKOFF_BASE') or 0.5)
+            self.backoff_cap = float(os.getenv('LLM_BACKOFF_CAP') or 8)
+            self.limiters: Dict[str, ModelLimiter] = {}
+            self.logger = get_logger()
+
+            metrics = get_metrics_registry()
+            self.limit_gauge = metrics.gauge(
+                'llm_concurrency_limit', 'Adaptive limit on concurrent LLM calls, by model'
+            )
+            self.admission_wait = metrics.histogram(
+                'llm_admission_wait_seconds', 'Time LLM calls waited for budget and a free slot'
+            )
+            self.throttled = metrics.counter(
+                'llm_throttled_total', 'LLM calls throttled by Bedrock, by model'
+            )
+            self.retries = metrics.counter(
+                'llm_backoff_retries_total', 'LLM calls retried after a backoff, by model'
+            )
+            self.shed = metrics.counter('llm_shed_total', 'LLM calls shed, by model and reason')
+            self._initialized = True
+
+    def get_backoff(self, attempt: int) -> float:
+        """Full jitter, so calls throttled together do not come back together
+
+        :param int attempt: The number of retries already made
+        :return float: The delay in seconds before the next retry
+        """
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2**attempt))
+
+    async def call(
+        self,
+        model_id: str,
+        estimated_tokens: int,
+        request: Callable[[], Awaitable[Tuple[object, object]]],
+    ) -> Tuple[object, object]:
+        """Make an LLM call once admitted, retrying throttled and failed attempts
+
+        :param str model_id: The model the call goes to
+        :param int estimated_tokens: The tokens reserved against the TPM budget
+        :param request: Makes the call and returns the output with its raw completion
+        :return Tuple[object, object]: The output and the raw completion
+        """
+        attempt = 0
+        while True:
+            try:
+                async with self.admit(model_id, estimated_tokens) as admission:
+                    output, completion = await request()
+                    admission.settle(completion)
+                    return output, completion
+
+            except Exception as e:
+                if not await self.__back_off(model_id, e, attempt):
+                    raise
+                attempt += 1
+
+    async def stream(
+        self,
+        model_id: str,
+        estimated_tokens: int,
+        open_stream: Callable[[], AsyncIterator],
+    ) -> AsyncIterator:
+        """Stream an LLM call once admitted, retrying attempts that fail before the first item
+
+        :param str model_id: The model the call goes to
+        :param int estimated_tokens: The tokens reserved against the TPM budget
+        :param open_stream: Opens the stream of partial outputs
+        :return AsyncIterator: The partial outputs
+        """
+        attempt = 0
+        while True:
+            received = False
+            try:
+                async with self.admit(model_id, estimated_tokens):
+                    async for item in open_stream():
+                        received = True
+                        yield item
+                return
+
+            except Exception as e:
+                # Partials already on the wire cannot be taken back
+                if received or not await self.__back_off(model_id, e, attempt):
+                    raise
+                attempt += 1
+
+    @asynccontextmanager
+    async def admit(self, model_id: str, estimated_tokens: int) -> AsyncIterator[Admission]:
+        """Hold a slot for a single LLM call, feeding its outcome back into the limit
+
+        :param str model_id: The model the call goes to
+        :param int estimated_tokens: The tokens reserved against the TPM budget
+        :return AsyncIterator[Admission]: The admission, to be settled with the completion
+        """
+        limiter = self.__get_limiter(model_id)
+        started = time.monotonic()
+        wait = self.__reserve_budget(limiter, model_id, estimated_tokens)
+        try:
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await self.__acquire_slot(limiter, model_id, started + self.max_admission_wait)
+
+        except BaseException:
+            self.__return_budget(limiter, estimated_tokens)
+            raise
+
+        self.admission_wait.observe(time.monotonic() - started, model=model_id)
+        admission = Admission(estimated_tokens)
+        try:
+            yield admission
+
+        except asyncio.CancelledError:
+            # A cancelled call, e.g. a losing hedge, reports no usage, return its reservation
+            # rather than hold it against the budget until the bucket refills
+            if admission.used_tokens is None:
+                admission.used_tokens = 0
+            raise
+
+        except Exception as e:
+            if is_throttle(e):
+                self.throttled.inc(model=model_id)
+                self.__decrease(limiter, model_id, admission)
+            raise
+
+        else:
+            if time.monotonic() - admission.started_at > self.latency_slo:
+                self.__decrease(limiter, model_id, admission)
+            else:
+                self.__increase(limiter, model_id)
+
+        finally:
+            if admission.used_tokens is not None and limiter.tokens is not None:
+                limiter.tokens.give_back(admission.reserved_tokens - admission.used_tokens)
+            limiter.in_flight -= 1
+            self.__wake(limiter)
+
+    def get_stats(self) -> Dict[str, dict]:
+        return {
+            model_id: {
+                'limit': int(limiter.limit),
+                'in_flight': limiter.in_flight,
+                'waiting': len(limiter.waiters),
+            }
+            for model_id, limiter in self.limiters.items()
+        }
+
+    def __get_limiter(self, model_id: str) -> ModelLimiter:
+        limiter = self.limiters.get(model_id)
+        if limiter is None:
+            rpm, tpm = self.budgets.get(model_id, (0, 0))
+            limiter = self.limiters[model_id] = ModelLimiter(rpm, tpm, self.initial_concurrency)
+            self.limit_gauge.set(int(limiter.limit), model=model_id)
+        return limiter
+
+    def __reserve_budget(
+        self, limiter: ModelLimiter, model_id: str, estimated_tokens: int
+    ) -> float:
+        """Reserve a request and the estimated tokens, shedding if the budgets are too far behind
+
+        :param ModelLimiter limiter: The limiter of the model
+        :param str model_id: The model the call goes to
+        :param int estimated_tokens: The tokens to reserve
+        :return float: How long to wait for the budgets to cover the reservation
+        """
+        wait = max(
+            limiter.requests.get_wait(1) if limiter.requests else 0.0,
+            limiter.tokens.get_wait(estimated_tokens) if limiter.tokens else 0.0,
+        )
+        if wait > self.max_admission_wait:
+            self.shed.inc(model=model_id, reason=ShedReason.BUDGET_EXHAUSTED)
+            raise LLMOverloadedError(model_id, ShedReason.BUDGET_EXHAUSTED)
+
+        if limiter.requests:
+            limiter.requests.take(1)
+        if limiter.tokens:
+            limiter.tokens.take(estimated_tokens)
+        return wait
+
+    def __return_budget(self, limiter: ModelLimiter, estimated_tokens: int):
+        if limiter.requests:
+            limiter.requests.give_back(1)
+        if limiter.tokens:
+            limiter.tokens.give_back(estimated_tokens)
+
+    async def __acquire_slot(self, limiter: ModelLimiter, model_id: str, deadline: float):
+        """Take a slot under the concurrency limit, waiting in line until the deadline
+
+        :param ModelLimiter limiter: The limiter of the model
+        :param str model_id: The model the call goes to
+        :param float deadline: The monotonic time after which the call is shed
+        """
+        if limiter.has_free_slot() and not limiter.waiters:
+            limiter.in_flight += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        limiter.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, max(0.0, deadline - time.monotonic()))
+
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ended, pass it on
+                limiter.in_flight -= 1
+                self.__wake(limiter)
+            with suppress(ValueError):
+                limiter.waiters.remove(waiter)
+
+            if isinstance(e, asyncio.TimeoutError):
+                self.shed.inc(model=model_id, reason=ShedReason.CONCURRENCY_SATURATED)
+                raise LLMOverloadedError(model_id, ShedReason.CONCURRENCY_SATURATED) from e
+            raise
+
+    def __wake(self, limiter: ModelLimiter):
+        """Hand free slots to the waiting calls in arrival order"""
+        while limiter.waiters and limiter.has_free_slot():
+            waiter = limiter.waiters.popleft()
+            if not waiter.done():
+                limiter.in_flight += 1
+                waiter.set_result(None)
+
+    def __increase(self, limiter: ModelLimiter, model_id: str):
+        # About one more slot per limit's worth of successful calls
+        limiter.limit = min(self.max_concurrency, limiter.limit + 1 / limiter.limit)
+        self.limit_gauge.set(int(limiter.limit), model=model_id)
+        self.__wake(limiter)
+
+    def __decrease(self, limiter: ModelLimiter, model_id: str, admission: Admission):
+        # Calls started before the last decrease report the congestion that caused it
+        if admission.started_at < limiter.last_decrease_at:
+            return
+
+        limiter.last_decrease_at = time.monotonic()
+        limiter.limit = max(self.min_concurrency, limiter.limit * DECREASE_FACTOR)
+        self.limit_gauge.set(int(limiter.limit), model=model_id)
+        self.logger.warning(
+            'Reduced LLM concurrency limit', model=model_id, limit=int(limiter.limit)
+        )
+
+    async def __back_off(self, model_id: str, error: Exception, attempt: int) -> bool:
+        """Wait before retrying a failed call
+
+        :param str model_id: The model the call went to
+        :param Exception error: The error the call failed with
+        :param int attempt: The number of retries already made
+        :return bool: True to retry, False to raise the error
+        """
+        if not is_retryable(error):
+            return False
+
+        if attempt >= self.max_retries:
+            if is_throttle(error):
+                self.shed.inc(model=model_id, reason=ShedReason.THROTTLED)
+                raise LLMOverloadedError(model_id, ShedReason.THROTTLED) from error
+            return False
+
+        delay = self.get_backoff(attempt)
+        self.retries.inc(model=model_id)
+        self.logger.warning(
+            f'LLM call failed, retrying in {delay:.2f}s: {error}', model=model_id, attempt=attempt
+        )
+        await asyncio.sleep(delay)
+        return True
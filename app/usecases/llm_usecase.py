@@ -1,50 +1,154 @@
+import asyncio
 import logging
 import os
-from typing import List
+import time
+from typing import AsyncIterator, List, Optional, Tuple
 
-import instructor
-from anthropic import AsyncAnthropicBedrock
-from instructor.utils import disable_pydantic_error_url
 from pydantic import BaseModel
 from structlog import get_logger
 
-from app.models.wellness_profile import WellnessProfileResponse
+from app.constants.llm_hedging import HedgeOutcome
+from app.constants.llm_routing import (
+    MODEL_PRICES,
+    EscalationReason,
+    RoutingDecision,
+    RoutingMode,
+)
+from app.constants.prompts import ExtractionPrompt
+from app.constants.wellness_profile import Confidence
+from app.models.wellness_profile import (
+    StreamedWellnessProfileResponse,
+    WellnessProfile,
+    WellnessProfileConfidence,
+    WellnessProfileResponse,
+)
+from app.repositories.extraction_cache import normalize_user_response
+from app.repositories.llm_client_registry import retry_on_invalid_output
+from app.repositories.shared_state import (
+    get_extraction_cache,
+    get_llm_cassette,
+    get_llm_client_registry,
+    get_llm_hedge_policy,
+    get_llm_rate_controller,
+    get_metrics_registry,
+)
+from app.usecases.history_compaction_usecase import (
+    HistoryCompactionUsecase,
+    estimate_tokens,
+)
+from app.usecases.turn_scheduler_usecase import turn_submitted_at
 
 
 class LLMUsecase:
     __slots__ = (
-        '__aws_region',
         '__sonnet_model_id',
         '__haiku_model_id',
         '__max_tokens',
         '__is_local',
         '__logging_level',
         '__logger',
+        '__client_registry',
+        '__is_streaming',
+        '__routing_mode',
+        '__max_low_confidence_fields',
+        '__model_prices',
+        '__history_compaction',
+        '__extraction_cache',
+        '__cassette',
+        '__rate_controller',
+        '__hedge_policy',
+        '__input_tokens',
+        '__output_tokens',
+        '__cache_read_tokens',
+        '__cache_write_tokens',
+        '__cost',
+        '__latency',
+        '__routing_decisions',
+        '__escalations',
+        '__llm_start_delay',
+        '__retries',
+        '__validation_time',
+        '__generations_in_flight',
     )
 
     def __init__(self):
-        self.__aws_region = os.environ.get('BEDROCK_REGION')
         self.__sonnet_model_id = os.getenv('SONNET_MODEL_ID')
         self.__haiku_model_id = os.getenv('HAIKU_MODEL_ID')
         self.__max_tokens = os.getenv('MAX_TOKENS') or 4096
+        self.__is_streaming = bool(os.getenv('LLM_STREAMING'))
+        self.__routing_mode = RoutingMode(os.getenv('LLM_ROUTING_MODE') or RoutingMode.SONNET)
+        self.__max_low_confidence_fields = int(os.getenv('CASCADE_MAX_LOW_CONFIDENCE_FIELDS') or 1)
+        self.__model_prices = {
+            self.__sonnet_model_id: MODEL_PRICES[RoutingMode.SONNET],
+            self.__haiku_model_id: MODEL_PRICES[RoutingMode.HAIKU],
+        }
 
         self.__is_local = os.getenv('IS_LOCAL')  # set to True if testing locally
         self.__logging_level = logging.DEBUG if self.__is_local else logging.INFO
         logging.basicConfig(level=self.__logging_level)
         self.__logger = get_logger()
+        self.__client_registry = get_llm_client_registry()
+        self.__history_compaction = HistoryCompactionUsecase()
+        self.__extraction_cache = get_extraction_cache()
+        self.__cassette = get_llm_cassette()
+        self.__rate_controller = get_llm_rate_controller()
+        self.__hedge_policy = get_llm_hedge_policy()
+
+        metrics = get_metrics_registry()
+        self.__input_tokens = metrics.counter(
+            'llm_input_tokens_total', 'Uncached input tokens sent to the LLM'
+        )
+        self.__output_tokens = metrics.counter(
+            'llm_output_tokens_total', 'Output tokens generated by the LLM'
+        )
+        self.__cache_read_tokens = metrics.counter(
+            'llm_cache_read_tokens_total', 'Input tokens served from the prompt cache'
+        )
+        self.__cache_write_tokens = metrics.counter(
+            'llm_cache_write_tokens_total', 'Input tokens written to the prompt cache'
+        )
+        self.__cost = metrics.counter('llm_cost_usd_total', 'Estimated LLM spend in US dollars')
+        self.__latency = metrics.histogram(
+            'llm_request_seconds', 'Latency of LLM requests, retries included'
+        )
+        self.__routing_decisions = metrics.counter(
+            'llm_routing_decisions_total', 'Extraction turns by the model that answered them'
+        )
+        self.__escalations = metrics.counter(
+            'llm_escalations_total', 'Cascade turns escalated from Haiku to Sonnet, by reason'
+        )
+        self.__llm_start_delay = metrics.histogram(
+            'turn_llm_start_seconds', 'Time from the turn request to its first LLM call'
+        )
+        self.__retries = metrics.histogram(
+            'llm_retries', 'Instructor retries per LLM call', buckets=(0, 1, 2, 3, 5)
+        )
+        self.__validation_time = metrics.histogram(
+            'llm_validation_seconds',
+            'Time spent parsing and validating LLM outputs per call',
+            buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+        )
+        self.__generations_in_flight = metrics.gauge(
+            'llm_generations_in_flight', 'LLM calls currently awaiting a response'
+        )
 
     async def __generate_questions_from_llm(
-        self, prompt: str, response_model: BaseModel, powerful_model: bool
+        self,
+        prompt: str,
+        response_model: BaseModel,
+        powerful_model: bool,
+        system_prompt: Optional[str] = None,
+        max_retries: int = 2,
     ):
         """
         Generate response from the LLM.
 
         :param str prompt: The prompt for the response generator.
         :param BaseModel response_model: The response model to validate the output.
+        :param Optional[str] system_prompt: Static instructions sent as a cached system prefix.
+        :param int max_retries: The number of attempts instructor makes to get a valid output.
         :return BaseModel: The validated output from the LLM.
         """
-        disable_pydantic_error_url()  # instructor not include error url in response to save on tokens
-
         model_id = self.__sonnet_model_id if powerful_model else self.__haiku_model_id
 
         self.__logger.info(
@@ -53,62 +157,445 @@ class LLMUsecase:
             max_tokens=self.__max_tokens,
         )
 
-        model = AsyncAnthropicBedrock(aws_region=self.__aws_region)
-        client = instructor.from_anthropic(model, mode=instructor.Mode.ANTHROPIC_TOOLS)
-        resp, _ = await client.chat.completions.create_with_completion(
+        self.__record_llm_start()
+        started = time.perf_counter()
+        if self.__cassette.is_replaying:
+            resp, completion = await self.__call_llm(
+                model_id, prompt, response_model, system_prompt, max_retries
+            )
+        else:
+            answered_by, resp, completion = await self.__call_with_hedge(
+                model_id, prompt, response_model, system_prompt, max_retries
+            )
+        latency = time.perf_counter() - started
+
+        if self.__cassette.is_recording:
+            self.__cassette.record(
+                answered_by, system_prompt, prompt, resp, completion, latency, model_id
+            )
+        return resp
+
+    async def __call_with_hedge(
+        self,
+        model_id: str,
+        prompt: str,
+        response_model: BaseModel,
+        system_prompt: Optional[str],
+        max_retries: int,
+    ) -> Tuple[str, BaseModel, object]:
+        """Make the LLM call, duplicating it once it outlives the hedge delay
+
+        The first call to return a valid output wins and the other one is cancelled. A call
+        that fails leaves the other one to answer, the primary's error is raised if both fail.
+
+        :param str model_id: The model of the primary call
+        :param str prompt: The prompt for the response generator
+        :param BaseModel response_model: The response model to validate the output
+        :param Optional[str] system_prompt: Static instructions sent as a cached system prefix
+        :param int max_retries: The number of attempts instructor makes to get a valid output
+        :return Tuple[str, BaseModel, object]: The model that answered, the validated output
+            and its raw completion
+        """
+        args = (prompt, response_model, system_prompt, max_retries)
+        delay = self.__hedge_policy.get_delay(model_id)
+        if delay is None:
+            return (model_id, *await self.__call_llm(model_id, *args))
+
+        started = time.perf_counter()
+        primary = asyncio.create_task(self.__call_llm(model_id, *args))
+        calls = {primary}
+        try:
+            done, _ = await asyncio.wait(calls, timeout=delay)
+            if done:
+                return (model_id, *primary.result())
+
+            if not self.__hedge_policy.try_spend():
+                self.__hedge_policy.hedges.inc(model=model_id, outcome=HedgeOutcome.OVER_BUDGET)
+                return (model_id, *await primary)
+
+            hedge_model_id = self.__hedge_policy.hedge_model_id or model_id
+            self.__logger.info('Hedging slow LLM call', model=model_id, hedge_model=hedge_model_id)
+            hedge = asyncio.create_task(self.__call_llm(hedge_model_id, *args))
+            calls.add(hedge)
+            while calls:
+                done, calls = await asyncio.wait(calls, return_when=asyncio.FIRST_COMPLETED)
+                for call in done:
+                    if call.exception() is not None:
+                        continue
+
+                    if call is hedge:
+                        pending = time.perf_counter() - started
+                        self.__hedge_policy.saved_time.observe(
+                            self.__hedge_policy.estimate_saved(model_id, pending), model=model_id
+                        )
+                    outcome = HedgeOutcome.HEDGE_WON if call is hedge else HedgeOutcome.PRIMARY_WON
+                    self.__hedge_policy.hedges.inc(model=model_id, outcome=outcome)
+                    return (hedge_model_id if call is hedge else model_id, *call.result())
+
+            return (model_id, *primary.result())
+
+        finally:
+            for call in (primary, *calls):
+                call.cancel()
+            await asyncio.gather(primary, *calls, return_exceptions=True)
+
+    async def __call_llm(
+        self,
+        model_id: str,
+        prompt: str,
+        response_model: BaseModel,
+        system_prompt: Optional[str],
+        max_retries: int,
+    ) -> Tuple[BaseModel, object]:
+        """Make a single LLM call through the rate controller, or replay it, recording its metrics
+
+        :param str model_id: The model the call goes to
+        :param str prompt: The prompt for the response generator
+        :param BaseModel response_model: The response model to validate the output
+        :param Optional[str] system_prompt: Static instructions sent as a cached system prefix
+        :param int max_retries: The number of attempts instructor makes to get a valid output
+        :return Tuple[BaseModel, object]: The validated output and its raw completion
+        """
+        self.__generations_in_flight.inc()
+        started = time.perf_counter()
+        call_stats = None
+        try:
+            if self.__cassette.is_replaying:
+                resp, completion = await self.__cassette.replay(
+                    model_id, system_prompt, prompt, response_model
+                )
+            else:
+                client = self.__client_registry.get_client()
+                with self.__client_registry.track_call() as call_stats:
+                    resp, completion = await self.__rate_controller.call(
+                        model_id,
+                        self.__estimate_call_tokens(prompt, system_prompt),
+                        lambda: client.chat.completions.create_with_completion(
+                            model=model_id,
+                            max_tokens=self.__max_tokens,
+                            messages=[
+                                {'role': 'user', 'content': prompt},
+                            ],
+                            response_model=self.__client_registry.get_response_model(
+                                response_model
+                            ),
+                            max_retries=retry_on_invalid_output(max_retries),
+                            **self.__system_kwargs(system_prompt),
+                        ),
+                    )
+        finally:
+            latency = time.perf_counter() - started
+            self.__latency.observe(latency, model=model_id)
+            self.__generations_in_flight.dec()
+            if call_stats is not None:
+                self.__retries.observe(call_stats.retries, model=model_id)
+                self.__validation_time.observe(call_stats.validation_seconds, model=model_id)
+
+        self.__hedge_policy.observe(model_id, latency)
+        self.__record_usage(model_id, completion)
+        return resp, completion
+
+    async def __stream_questions_from_llm(
+        self,
+        prompt: str,
+        response_model: BaseModel,
+        powerful_model: bool,
+        system_prompt: Optional[str] = None,
+    ) -> AsyncIterator[BaseModel]:
+        """
+        Stream partial responses from the LLM as the tool input is generated.
+
+        :param str prompt: The prompt for the response generator.
+        :param BaseModel response_model: The response model to validate the output.
+        :param Optional[str] system_prompt: Static instructions sent as a cached system prefix.
+        :return AsyncIterator[BaseModel]: Partial outputs, the last one being the complete output.
+        """
+        model_id = self.__sonnet_model_id if powerful_model else self.__haiku_model_id
+
+        self.__logger.info(
+            f'Streaming questions from LLM with prompt: {prompt}',
             model=model_id,
             max_tokens=self.__max_tokens,
-            messages=[
-                {'role': 'user', 'content': prompt},
-            ],
-            response_model=response_model,
-            max_retries=2,
         )
-        return resp
+
+        self.__record_llm_start()
+        if self.__cassette.is_replaying:
+            # Recordings hold the complete output only, replayed as a single partial
+            resp, completion = await self.__cassette.replay(
+                model_id, system_prompt, prompt, response_model
+            )
+            self.__record_usage(model_id, completion)
+            yield resp
+            return
+
+        client = self.__client_registry.get_client()
+        self.__generations_in_flight.inc()
+        started = time.perf_counter()
+        partial = None
+        try:
+            async for partial in self.__rate_controller.stream(
+                model_id,
+                self.__estimate_call_tokens(prompt, system_prompt),
+                lambda: client.chat.completions.create_partial(
+                    model=model_id,
+                    max_tokens=self.__max_tokens,
+                    messages=[
+                        {'role': 'user', 'content': prompt},
+                    ],
+                    response_model=response_model,
+                    max_retries=retry_on_invalid_output(2),
+                    **self.__system_kwargs(system_prompt),
+                ),
+            ):
+                yield partial
+        finally:
+            self.__generations_in_flight.dec()
+            self.__latency.observe(time.perf_counter() - started, model=model_id)
+
+        if self.__cassette.is_recording and partial is not None:
+            self.__cassette.record(
+                model_id, system_prompt, prompt, partial, None, time.perf_counter() - started
+            )
+
+    def __record_llm_start(self):
+        """Time the first LLM call of a turn from the moment the turn was submitted"""
+        submitted_at = turn_submitted_at.get()
+        if submitted_at is not None:
+            self.__llm_start_delay.observe(time.perf_counter() - submitted_at)
+            # Escalations and hedges of the same turn are not the start of the turn's LLM work
+            turn_submitted_at.set(None)
+
+    def __estimate_call_tokens(self, prompt: str, system_prompt: Optional[str]) -> int:
+        """Estimate the tokens a call counts against the TPM budget, Bedrock reserves max_tokens"""
+        return (
+            estimate_tokens(prompt) + estimate_tokens(system_prompt or '') + int(self.__max_tokens)
+        )
+
+    def __system_kwargs(self, system_prompt: Optional[str]) -> dict:
+        """Mark the static system prefix as cacheable so only the dynamic suffix is billed in full"""
+        if not system_prompt:
+            return {}
+
+        return {
+            'system': [
+                {'type': 'text', 'text': system_prompt, 'cache_control': {'type': 'ephemeral'}}
+            ]
+        }
+
+    def __record_usage(self, model_id: str, completion):
+        """Record the token usage of a completion, including prompt cache reads and writes
+
+        :param str model_id: The model that produced the completion
+        :param completion: The raw completion returned alongside the validated output
+        """
+        usage = getattr(completion, 'usage', None)
+        if usage is None:
+            return
+
+        input_tokens = usage.input_tokens or 0
+        output_tokens = usage.output_tokens or 0
+        cache_read_tokens = getattr(usage, 'cache_read_input_tokens', None) or 0
+        cache_write_tokens = getattr(usage, 'cache_creation_input_tokens', None) or 0
+
+        self.__input_tokens.inc(input_tokens, model=model_id)
+        self.__output_tokens.inc(output_tokens, model=model_id)
+        self.__cache_read_tokens.inc(cache_read_tokens, model=model_id)
+        self.__cache_write_tokens.inc(cache_write_tokens, model=model_id)
+
+        cost = 0.0
+        prices = self.__model_prices.get(model_id)
+        if prices is not None:
+            tokens = (input_tokens, output_tokens, cache_read_tokens, cache_write_tokens)
+            cost = sum(count * price for count, price in zip(tokens, prices)) / 1_000_000
+            self.__cost.inc(cost, model=model_id)
+
+        self.__logger.info(
+            'LLM token usage',
+            model=model_id,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cache_read_tokens=cache_read_tokens,
+            cache_write_tokens=cache_write_tokens,
+            cost_usd=round(cost, 6),
+        )
+
+    @property
+    def is_streaming(self) -> bool:
+        """Whether follow-up questions should be streamed as they are generated"""
+        return self.__is_streaming
 
     async def get_output_model_from_user_response(
-        self, user_response: str, question: str, response_history: List[str]
+        self,
+        user_response: str,
+        question: str,
+        response_history: List[dict],
+        profile: Optional[WellnessProfile] = None,
+        confidence: Optional[WellnessProfileConfidence] = None,
     ) -> WellnessProfileResponse:
-        prompt = f"""
-        ROLE: Wellness profile data extractor and conversation analyzer
-
-        INPUT DATA:
-        - Current user response: "{user_response}"
-        - Current question asked: "{question}"
-        - Complete conversation history: {response_history}
-
-        TASK 1 - COMPREHENSIVE DATA EXTRACTION:
-        Analyze the ENTIRE conversation history (including current response) to extract information for:
-        • age (integer) • gender (male/female/other) • activityLevel (sedentary/moderate/active)
-        • dietaryPreference (vegetarian/vegan/keto/paleo/omnivore/no_preference)
-        • sleepQuality (good/average/poor) • stressLevel (low/medium/high) • healthGoals (free text)
-
-        Extract information from ANY point in the conversation, not just the current response.
-        Set unmentioned/unclear fields to null.
-
-        TASK 2 - HISTORICAL COMPLETENESS EVALUATION:
-        Review the complete conversation history and assess:
-        1. Which wellness profile fields have been adequately covered across ALL previous exchanges
-        2. Which fields still need clarification or have never been addressed
-        3. Whether the user has provided sufficient detail for a complete wellness profile
-
-        TASK 3 - INTELLIGENT FOLLOW-UP DECISION:
-        Based on the complete conversation analysis:
-        1. Score each field: HIGH (clearly established), MEDIUM (partially covered), LOW (missing/unclear)
-        2. Consider conversation flow and user engagement level
-        3. If critical fields are still missing OR user responses suggest more context is needed:
-           → Generate ONE thoughtful follow-up question that addresses the most important gaps
-        4. If the wellness profile is sufficiently complete based on conversation history:
-           → Set follow-up question to null
-
-        FOLLOW-UP QUESTION GUIDELINES:
-        - Prioritize missing high-impact fields (age, health goals, activity level)
-        - Reference previous conversation context when appropriate
-        - Ask in a natural, conversational way
-        - Combine multiple missing fields into one coherent question when possible
-
-        OUTPUT: Complete extracted profile + confidence scores + strategic follow-up question (if needed)
+        prompt, compacted_history = self.__build_extraction_prompt(
+            user_response, question, response_history, profile, confidence
+        )
+        cache_key = self.__extraction_cache.make_key(
+            normalize_user_response(user_response),
+            question,
+            compacted_history,
+            self.__get_routed_model_key(),
+            ExtractionPrompt.VERSION,
+        )
+        return await self.__extraction_cache.get_or_compute(
+            cache_key, lambda: self.__route_extraction(prompt, profile)
+        )
+
+    async def __route_extraction(
+        self, prompt: str, profile: Optional[WellnessProfile]
+    ) -> WellnessProfileResponse:
+        """Run the extraction on the model, or models, selected by the routing mode
+
+        :param str prompt: The dynamic part of the extraction prompt
+        :param Optional[WellnessProfile] profile: The merged profile extracted so far
+        :return WellnessProfileResponse: The validated extraction output
         """
+        if self.__routing_mode != RoutingMode.CASCADE:
+            powerful_model = self.__routing_mode == RoutingMode.SONNET
+            self.__routing_decisions.inc(
+                decision=RoutingDecision.SONNET if powerful_model else RoutingDecision.HAIKU
+            )
+            return await self.__generate_questions_from_llm(
+                prompt=prompt,
+                response_model=WellnessProfileResponse,
+                powerful_model=powerful_model,
+                system_prompt=ExtractionPrompt.SYSTEM,
+            )
+
+        from instructor.exceptions import InstructorRetryException
+
+        # Haiku gets a single attempt, escalating to Sonnet replaces its validation retries
+        try:
+            response = await self.__generate_questions_from_llm(
+                prompt=prompt,
+                response_model=WellnessProfileResponse,
+                powerful_model=False,
+                system_prompt=ExtractionPrompt.SYSTEM,
+                max_retries=1,
+            )
+            reason = self.__get_escalation_reason(response, profile)
+
+        except InstructorRetryException as e:
+            self.__logger.warning(f'Haiku output failed validation: {e}')
+            reason = EscalationReason.VALIDATION_FAILURE
+
+        if reason is None:
+            self.__routing_decisions.inc(decision=RoutingDecision.HAIKU)
+            return response
+
+        self.__routing_decisions.inc(decision=RoutingDecision.ESCALATED)
+        self.__escalations.inc(reason=reason)
+        self.__logger.info('Escalating extraction to Sonnet', reason=reason)
         return await self.__generate_questions_from_llm(
-            prompt=prompt, response_model=WellnessProfileResponse, powerful_model=True
+            prompt=prompt,
+            response_model=WellnessProfileResponse,
+            powerful_model=True,
+            system_prompt=ExtractionPrompt.SYSTEM,
+        )
+
+    async def stream_output_model_from_user_response(
+        self,
+        user_response: str,
+        question: str,
+        response_history: List[dict],
+        profile: Optional[WellnessProfile] = None,
+        confidence: Optional[WellnessProfileConfidence] = None,
+    ) -> AsyncIterator[WellnessProfileResponse]:
+        """Stream partial extraction outputs, the last one being the complete output
+
+        :param str user_response: The current user response
+        :param str question: The current question asked
+        :param List[dict] response_history: The conversation history
+        :param Optional[WellnessProfile] profile: The merged profile extracted so far
+        :param Optional[WellnessProfileConfidence] confidence: The merged confidence so far
+        :return AsyncIterator[WellnessProfileResponse]: The partial extraction outputs
+        """
+        prompt, _ = self.__build_extraction_prompt(
+            user_response, question, response_history, profile, confidence
+        )
+        # Partial outputs are already on the wire by the time a cascade could escalate,
+        # so streamed turns only honour an explicit Haiku routing mode
+        powerful_model = self.__routing_mode != RoutingMode.HAIKU
+        self.__routing_decisions.inc(
+            decision=RoutingDecision.SONNET if powerful_model else RoutingDecision.HAIKU
+        )
+        async for partial in self.__stream_questions_from_llm(
+            prompt=prompt,
+            response_model=StreamedWellnessProfileResponse,
+            powerful_model=powerful_model,
+            system_prompt=ExtractionPrompt.SYSTEM,
+        ):
+            yield partial
+
+    def __get_routed_model_key(self) -> str:
+        """Identify the model, or cascade of models, whose outputs are interchangeable"""
+        if self.__routing_mode == RoutingMode.CASCADE:
+            return f'{RoutingMode.CASCADE}:{self.__haiku_model_id}:{self.__sonnet_model_id}'
+        if self.__routing_mode == RoutingMode.HAIKU:
+            return self.__haiku_model_id
+        return self.__sonnet_model_id
+
+    def __get_escalation_reason(
+        self, response: WellnessProfileResponse, profile: Optional[WellnessProfile]
+    ) -> Optional[EscalationReason]:
+        """Decide whether a Haiku extraction is good enough to keep
+
+        :param WellnessProfileResponse response: The Haiku extraction
+        :param Optional[WellnessProfile] profile: The merged profile extracted so far
+        :return Optional[EscalationReason]: Why the turn needs Sonnet, None to keep the output
+        """
+        extracted = response.wellnessProfile.model_dump()
+        confidence = response.confidence.model_dump()
+        known = profile.model_dump() if profile else {}
+
+        # Values Haiku extracted but is unsure about, fields it did not find are LOW as well
+        unsure_fields = [
+            field
+            for field, value in extracted.items()
+            if value is not None and confidence.get(field) == Confidence.LOW
+        ]
+        if len(unsure_fields) > self.__max_low_confidence_fields:
+            return EscalationReason.LOW_CONFIDENCE
+
+        is_incomplete = any(
+            (value is None and known.get(field) is None) or confidence.get(field) == Confidence.LOW
+            for field, value in extracted.items()
+        )
+        if is_incomplete and not response.followUpQuestion:
+            return EscalationReason.MISSING_FOLLOW_UP
+
+        return None
+
+    def __build_extraction_prompt(
+        self,
+        user_response: str,
+        question: str,
+        response_history: List[dict],
+        profile: Optional[WellnessProfile],
+        confidence: Optional[WellnessProfileConfidence],
+    ) -> Tuple[str, str]:
+        """Build the dynamic part of the extraction prompt, the instructions live in the system prefix
+
+        :return Tuple[str, str]: The prompt and the compacted history it embeds
+        """
+        compacted_history = self.__history_compaction.compact(response_history, profile, confidence)
+        self.__logger.info(
+            'Compacted conversation history',
+            history_tokens_before=estimate_tokens(str(response_history)),
+            history_tokens_after=estimate_tokens(compacted_history),
+        )
+
+        prompt = ExtractionPrompt.USER.format(
+            user_response=user_response, question=question, history=compacted_history
+        )
+        self.__logger.info(
+            'Built extraction prompt',
+            prompt_tokens=estimate_tokens(prompt),
+            cached_prefix_tokens=estimate_tokens(ExtractionPrompt.SYSTEM),
         )
+        return prompt, compacted_history
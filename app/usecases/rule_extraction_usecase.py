@@ -0,0 +1,315 @@
+import re
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from app.constants.wellness_profile import (
+    ActivityLevel,
+    Confidence,
+    DietaryPreference,
+    Gender,
+    SleepQuality,
+    StressLevel,
+)
+from app.models.wellness_profile import (
+    WellnessProfile,
+    WellnessProfileConfidence,
+    WellnessProfileResponse,
+)
+
+# Phrases mapping to each enum value besides the value itself. Negated and more specific
+# phrases are listed so they win over the shorter phrases they contain.
+SYNONYMS: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    'gender': {
+        Gender.MALE: ('man', 'guy', 'm', 'he/him'),
+        Gender.FEMALE: ('woman', 'girl', 'lady', 'f', 'she/her'),
+        Gender.OTHER: ('non-binary', 'nonbinary', 'non binary', 'they/them', 'genderfluid'),
+    },
+    'activityLevel': {
+        ActivityLevel.SEDENTARY: (
+            'not active',
+            'not very active',
+            'inactive',
+            'desk job',
+            'sit all day',
+            "don't exercise",
+            'do not exercise',
+            'never exercise',
+        ),
+        ActivityLevel.MODERATE: (
+            'moderately active',
+            'lightly active',
+            'somewhat active',
+            'fairly active',
+            'exercise sometimes',
+            'a few times a week',
+        ),
+        ActivityLevel.ACTIVE: (
+            'very active',
+            'highly active',
+            'exercise daily',
+            'work out daily',
+            'train daily',
+            'every day at the gym',
+            'athlete',
+        ),
+    },
+    'dietaryPreference': {
+        DietaryPreference.VEGETARIAN: ('veggie',),
+        DietaryPreference.VEGAN: ('plant based', 'plant-based'),
+        DietaryPreference.KETO: ('ketogenic', 'low carb', 'low-carb'),
+        DietaryPreference.PALEO: ('caveman diet',),
+        DietaryPreference.OMNIVORE: ('eat everything', 'eat anything', 'eat meat'),
+        DietaryPreference.NO_PREFERENCE: (
+            'no preference',
+            'no dietary preference',
+            'no restrictions',
+            'no dietary restrictions',
+            'no diet',
+        ),
+    },
+    'sleepQuality': {
+        SleepQuality.GOOD: ('sleep well', 'sleep great', 'good sleep', 'sleep good', 'great sleep'),
+        SleepQuality.AVERAGE: (
+            'sleep ok',
+            'sleep okay',
+            'sleep fine',
+            'average sleep',
+            'sleep average',
+            'sleep alright',
+        ),
+        SleepQuality.POOR: (
+            'sleep badly',
+            'sleep poorly',
+            'sleep bad',
+            'poor sleep',
+            'bad sleep',
+            'insomnia',
+            'trouble sleeping',
+            "can't sleep",
+            "don't sleep well",
+            'do not sleep well',
+        ),
+    },
+    'stressLevel': {
+        StressLevel.LOW: (
+            'not stressed',
+            'not very stressed',
+            'not too stressed',
+            'relaxed',
+            'no stress',
+            'stress free',
+        ),
+        StressLevel.MEDIUM: (
+            'medium stress',
+            'moderate stress',
+            'moderately stressed',
+            'some stress',
+            'a bit stressed',
+            'somewhat stressed',
+        ),
+        StressLevel.HIGH: (
+            'high stress',
+            'very stressed',
+            'highly stressed',
+            'stressed out',
+            'stressed',
+            'anxious',
+            'burnt out',
+            'burned out',
+        ),
+    },
+}
+
+# Phrase boundaries, apostrophes and hyphens count as part of a word so "i'm" never matches "m"
+WORD_START = r"(?<![\w'-])"
+WORD_END = r"(?![\w'-])"
+
+# Fields whose bare enum value is ambiguous in free text ("active", "low") and must
+# appear next to the field name to count
+QUALIFIED_FIELDS = {
+    'activityLevel': r'(?:activity(?: level)?|active)',
+    'sleepQuality': r'sleep(?: quality)?',
+    'stressLevel': r'stress(?: level)?',
+}
+
+# Words shortly before a match, in the same clause, that mean the user is not stating their
+# own current value ("used to be vegan", "my wife is vegan", "I don't eat meat"). Such
+# matches are left to the LLM, since a HIGH or MEDIUM value completes the profile.
+NEGATION_CUES = re.compile(
+    r"\b(?:not|no longer|never|used to|formerly|former|was|were|wasn't|isn't|aren't|don't|"
+    r"do not|didn't|did not|stopped|quit|gave up|thinking about|considering|trying to be|"
+    r'my (?:wife|husband|partner|friend|boyfriend|girlfriend|son|daughter|kids?|mum|mom|dad|'
+    r'mother|father|sister|brother|family))\b'
+)
+NEGATION_WINDOW = 40
+CLAUSE_BOUNDARY = re.compile(r'[.,;:!?\n]|\bbut\b|\band\b')
+
+AGE_PATTERNS: List[Tuple[Pattern, Confidence]] = [
+    (re.compile(r'\b(\d{1,3})\s*(?:years?[\s-]*old|y/?o|yrs?\b)'), Confidence.HIGH),
+    (re.compile(r'\bage(?:d)?\s*(?:is|:|of)?\s*(\d{1,3})\b'), Confidence.HIGH),
+    (
+        re.compile(r"\bi(?:'m| am)\s+(\d{1,3})\b(?!\s*(?:hours|hrs|h\b|kg|lbs|cm|%))"),
+        Confidence.HIGH,
+    ),
+    (re.compile(r'^\s*(\d{1,3})\s*(?:,|$)'), Confidence.MEDIUM),
+]
+
+SLEEP_HOURS = re.compile(r'(\d{1,2}(?:\.\d)?)\s*(?:-\s*\d{1,2}\s*)?(?:hours|hrs|h)\b')
+
+GOAL_PATTERNS: List[Tuple[Pattern, Confidence]] = [
+    (
+        re.compile(r'\b(?:main |health )?goal(?: is|:)?\s*(?:to\s+)?([^.,;!\n]{3,100})'),
+        Confidence.HIGH,
+    ),
+    (
+        re.compile(r'\b(?:want|would like|trying|hoping|aim|plan)\s+to\s+([^.,;!\n]{3,100})'),
+        Confidence.MEDIUM,
+    ),
+]
+
+
+def _phrase_pattern(phrases: List[str]) -> Pattern:
+    # Longest phrases first so the alternation prefers the most specific match
+    ordered = sorted(phrases, key=len, reverse=True)
+    return re.compile(WORD_START + '(?:' + '|'.join(re.escape(p) for p in ordered) + ')' + WORD_END)
+
+
+def _build_tables():
+    """Compile the keyword alternation of each field and the qualified value patterns
+
+    :return tuple: Per field, the keyword pattern with its phrase lookup, and the qualified
+        patterns with their value
+    """
+    keywords: Dict[str, Tuple[Pattern, Dict[str, Tuple[str, Confidence]]]] = {}
+    qualified: Dict[str, List[Tuple[Pattern, str]]] = {}
+    for field, values in SYNONYMS.items():
+        lookup: Dict[str, Tuple[str, Confidence]] = {}
+        for value, synonyms in values.items():
+            for synonym in synonyms:
+                lookup[synonym] = (value, Confidence.MEDIUM)
+
+            plain = re.escape(value.value.replace('_', ' '))
+            qualifier = QUALIFIED_FIELDS.get(field)
+            if qualifier is None:
+                lookup[value.value.replace('_', ' ')] = (value, Confidence.HIGH)
+                continue
+
+            qualified.setdefault(field, []).append(
+                (
+                    re.compile(
+                        rf'{WORD_START}(?:{plain}\s+{qualifier}|{qualifier}\s*(?:is|:)?\s*{plain}){WORD_END}'
+                    ),
+                    value,
+                )
+            )
+
+        keywords[field] = (_phrase_pattern(list(lookup)), lookup)
+    return keywords, qualified
+
+
+KEYWORD_TABLES, QUALIFIED_TABLES = _build_tables()
+
+
+class RuleExtractionUsecase:
+    """Deterministic keyword and regex extraction of the wellness profile fields"""
+
+    __slots__ = ()
+
+    def extract(self, text: str) -> WellnessProfileResponse:
+        """Extract whatever profile fields the text states plainly
+
+        :param str text: The user's message
+        :return WellnessProfileResponse: The extracted profile and confidence, no follow-up question
+        """
+        lowered = text.lower()
+        profile: Dict[str, object] = {}
+        confidence: Dict[str, Confidence] = {}
+
+        for field in SYNONYMS:
+            match = self.__match_field(field, lowered)
+            if match is not None:
+                profile[field], confidence[field] = match
+
+        age = self.__match_age(lowered)
+        if age is not None:
+            profile['age'], confidence['age'] = age
+
+        if 'sleepQuality' not in profile:
+            sleep = self.__match_sleep_hours(lowered)
+            if sleep is not None:
+                profile['sleepQuality'], confidence['sleepQuality'] = sleep
+
+        goal = self.__match_goal(text, lowered)
+        if goal is not None:
+            profile['healthGoals'], confidence['healthGoals'] = goal
+
+        return WellnessProfileResponse(
+            wellnessProfile=WellnessProfile(**profile),
+            confidence=WellnessProfileConfidence(**confidence),
+            followUpQuestion=None,
+        )
+
+    def __match_field(self, field: str, lowered: str) -> Optional[Tuple[str, Confidence]]:
+        for pattern, value in QUALIFIED_TABLES.get(field, ()):
+            match = pattern.search(lowered)
+            if match and not self.__is_negated(lowered, match.start()):
+                return value, Confidence.HIGH
+
+        pattern, lookup = KEYWORD_TABLES[field]
+        found: Dict[str, Confidence] = {}
+        for match in pattern.finditer(lowered):
+            if self.__is_negated(lowered, match.start()):
+                continue
+            value, level = lookup[match.group(0)]
+            if level == Confidence.HIGH or value not in found:
+                found[value] = level
+
+        if len(found) != 1:
+            # Nothing stated, or several contradicting values: leave it to the LLM
+            return None
+        return next(iter(found.items()))
+
+    @staticmethod
+    def __is_negated(lowered: str, start: int) -> bool:
+        """Whether the clause leading to a match negates it or is not about the user now
+
+        :param str lowered: The lowercased message
+        :param int start: The position of the match
+        :return bool: True if the match must not be trusted
+        """
+        window = lowered[max(0, start - NEGATION_WINDOW) : start]
+        boundaries = list(CLAUSE_BOUNDARY.finditer(window))
+        if boundaries:
+            window = window[boundaries[-1].end() :]
+        return NEGATION_CUES.search(window) is not None
+
+    def __match_age(self, lowered: str) -> Optional[Tuple[int, Confidence]]:
+        for pattern, level in AGE_PATTERNS:
+            match = pattern.search(lowered)
+            if match and 1 <= int(match.group(1)) <= 100:
+                return int(match.group(1)), level
+        return None
+
+    def __match_sleep_hours(self, lowered: str) -> Optional[Tuple[SleepQuality, Confidence]]:
+        if 'sleep' not in lowered:
+            return None
+
+        match = SLEEP_HOURS.search(lowered)
+        if match is None:
+            return None
+
+        hours = float(match.group(1))
+        if hours < 6:
+            return SleepQuality.POOR, Confidence.MEDIUM
+        if hours < 7:
+            return SleepQuality.AVERAGE, Confidence.MEDIUM
+        return SleepQuality.GOOD, Confidence.MEDIUM
+
+    def __match_goal(self, text: str, lowered: str) -> Optional[Tuple[str, Confidence]]:
+        for pattern, level in GOAL_PATTERNS:
+            match = pattern.search(lowered)
+            if match:
+                start, end = match.span(1)
+                goal = text[start:end].strip()
+                if goal:
+                    return goal[:100], level
+        return None
@@ -1,74 +1,282 @@
+import asyncio
 import json
-from typing import Dict, List
+import os
+import time
+import uuid
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
 
 from fastapi import WebSocket
+from structlog import get_logger
+
+from app.constants.message import MessageEvent
+from app.constants.outbound_queue import OverflowPolicy
+from app.constants.questions import WellnessProfileQuestions
+from app.constants.turn_scheduler import TurnAdmission
+from app.constants.worker_message import WorkerMessage
+from app.models.message import Message, OutgoingFrame
+from app.repositories.pubsub import (
+    create_pubsub_backend,
+    session_channel,
+    session_owner_key,
+    worker_channel,
+)
+from app.repositories.session_store import SessionStore
+from app.repositories.shared_state import get_metrics_registry
+
+# Schedules the turn an INIT_PROFILE or USER_ANSWER frame starts on this worker
+TurnHandler = Callable[[str, Message], TurnAdmission]
+
+
+class OutboundWriter:
+    """Bounded outbound queue of a single connection, drained by its own writer task"""
+
+    __slots__ = ('websocket', 'frames', 'max_size', 'wakeup', 'task', 'held')
+
+    def __init__(self, websocket: WebSocket, max_size: int):
+        self.websocket = websocket
+        # each frame is (text, persist) so transient frames can be coalesced away
+        self.frames: Deque[Tuple[str, bool]] = deque()
+        self.max_size = max_size
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        # frames delivered while the replay of a reconnect is awaited, queued after it
+        self.held: Optional[List[Tuple[str, bool]]] = None
+
+    def is_full(self) -> bool:
+        return len(self.frames) >= self.max_size
+
+    def push(self, message: str, persist: bool):
+        self.frames.append((message, persist))
+        self.wakeup.set()
+
+    def drop_oldest(self):
+        self.frames.popleft()
+
+    def drop_transient(self) -> int:
+        """Drop queued frames that are not persisted, e.g. acknowledgements and question deltas
+
+        :return int: The number of frames dropped
+        """
+        before = len(self.frames)
+        self.frames = deque(frame for frame in self.frames if frame[1])
+        return before - len(self.frames)
 
 
 class ConnectionManager:
     _instance = None
     _initialized = False
 
-    def __new__(cls, session_messages: Dict[str, List[dict]] = None):
+    def __new__(cls, session_store: SessionStore = None):
         if cls._instance is None:
             cls._instance = super(ConnectionManager, cls).__new__(cls)
         return cls._instance
 
-    def __init__(self, session_messages: Dict[str, List[dict]] = None):
+    def __init__(self, session_store: SessionStore = None):
         if not self._initialized:
-            self.session_messages = session_messages
-            self.active_connections: list[WebSocket] = []
+            self.session_store = session_store
+            self.session_connections: Dict[str, Set[WebSocket]] = {}
             self.connection_sessions: Dict[WebSocket, str] = {}
+            self.writers: Dict[WebSocket, OutboundWriter] = {}
+            # when each connection speaking the duplex protocol last sent a frame
+            self.last_seen: Dict[WebSocket, float] = {}
+            self.heartbeat_task: Optional[asyncio.Task] = None
+            self.background_tasks: Set[asyncio.Task] = set()
+            # connections of each session, counted from before they are accepted, and the
+            # session channels subscribed to, reconciled under the lock
+            self.channel_refs: Dict[str, int] = {}
+            self.subscribed: Set[str] = set()
+            self.subscription_lock = asyncio.Lock()
+            self.pubsub = create_pubsub_backend()
+            self.pubsub.set_handler(self.__deliver)
+            # the state of a session is held by the worker owning it, which runs its turns
+            self.worker_id = uuid.uuid4().hex
+            self.worker_channel = worker_channel(self.worker_id)
+            self.owner_ttl = int(session_store.idle_ttl)
+            self.turn_handler: Optional[TurnHandler] = None
+            # reconnected connections awaiting their replay from the owner, by request token
+            self.replay_requests: Dict[str, WebSocket] = {}
+            self.replay_timeout = float(os.getenv('WS_REPLAY_TIMEOUT') or 5)
+
+            self.queue_size = int(os.getenv('WS_OUTBOUND_QUEUE_SIZE') or 64)
+            self.overflow_policy = OverflowPolicy(
+                os.getenv('WS_OVERFLOW_POLICY') or OverflowPolicy.DROP_OLDEST
+            )
+            self.ping_interval = float(os.getenv('WS_PING_INTERVAL') or 20)
+            self.idle_timeout = float(os.getenv('WS_IDLE_TIMEOUT') or 60)
+            self.ping_text = OutgoingFrame.from_message(Message(event=MessageEvent.PING)).text
+
+            metrics = get_metrics_registry()
+            self.queue_depth = metrics.gauge(
+                'ws_outbound_queue_depth', 'Frames waiting in outbound WebSocket queues'
+            )
+            self.dropped_frames = metrics.counter(
+                'ws_outbound_dropped_frames_total', 'Outbound frames dropped on queue overflow'
+            )
+            self.slow_consumer_disconnects = metrics.counter(
+                'ws_slow_consumer_disconnects_total', 'Connections closed for falling behind'
+            )
+            self.connections_gauge = metrics.gauge(
+                'ws_active_connections', 'WebSocket connections held by this worker'
+            )
+            self.send_time = metrics.histogram(
+                'ws_send_seconds', 'Time to write a single frame to a WebSocket'
+            )
+            self.replays = metrics.counter(
+                'ws_replays_total', 'Reconnects resumed from the replay buffer, by outcome'
+            )
+            self.replayed_frames = metrics.counter(
+                'ws_replayed_frames_total', 'Frames replayed to reconnecting clients'
+            )
+            self.idle_disconnects = metrics.counter(
+                'ws_idle_disconnects_total', 'Connections closed for not answering heartbeats'
+            )
+            self.forwarded_turns = metrics.counter(
+                'turns_forwarded_total', 'Turns forwarded to the worker owning their session'
+            )
+            self.logger = get_logger()
             self._initialized = True
 
-    async def connect(self, websocket: WebSocket, session_id: str):
+    async def start(self):
+        """Start the pub/sub backend delivering frames published by other workers, and the
+        heartbeat of the connections"""
+        await self.pubsub.start()
+        await self.pubsub.subscribe(self.worker_channel)
+        if self.heartbeat_task is None:
+            self.heartbeat_task = asyncio.create_task(self.__heartbeat())
+
+    async def stop(self):
+        """Stop the heartbeat and the pub/sub backend"""
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            await asyncio.gather(self.heartbeat_task, return_exceptions=True)
+            self.heartbeat_task = None
+        await self.pubsub.stop()
+
+    def set_turn_handler(self, handler: TurnHandler):
+        """Set the function scheduling the turns of the sessions this worker owns
+
+        :param TurnHandler handler: The turn handler
+        """
+        self.turn_handler = handler
+
+    async def submit_turn(self, session_id: str, frame: Message) -> TurnAdmission:
+        """Run a turn on the worker owning the session, which this worker becomes if none does
+
+        A turn forwarded to another worker is reported accepted, the owner answers the
+        session's connections with SERVICE_BUSY if it refuses it.
+
+        :param str session_id: The ID of the session
+        :param Message frame: The INIT_PROFILE or USER_ANSWER frame starting the turn
+        :return TurnAdmission: Whether the turn was accepted
+        """
+        payload = WorkerMessage.TURN + json.dumps([session_id, frame.model_dump(mode='json')])
+        if await self.__send_to_owner(session_id, payload):
+            self.forwarded_turns.inc()
+            return TurnAdmission.ACCEPTED
+        return self.turn_handler(session_id, frame)
+
+    def touch(self, websocket: WebSocket):
+        """Record a frame received from a connection, which keeps it from being reaped
+
+        Only connections that sent a frame are pinged and reaped when idle, clients that
+        only receive rely on the transport's keepalive.
+
+        :param WebSocket websocket: The connection the frame was received on
+        """
+        if websocket in self.connection_sessions:
+            self.last_seen[websocket] = time.monotonic()
+
+    async def connect(self, websocket: WebSocket, session_id: str, last_seq: Optional[int] = None):
         """Connect a connection to a session
 
         :param WebSocket websocket: The connection to connect
         :param str session_id: The ID of the session to connect to
+        :param Optional[int] last_seq: The sequence number of the last frame a reconnecting
+            client received, the frames it missed are replayed first from the buffer of the
+            worker owning the session
         """
-        await websocket.accept()
-        self.active_connections.append(websocket)
+        # Subscribe before accepting so nothing the client triggers can be published unseen.
+        # The reference is taken before any await, so a last connection of the session
+        # disconnecting meanwhile, e.g. on a page reload, cannot unsubscribe the channel.
+        self.channel_refs[session_id] = self.channel_refs.get(session_id, 0) + 1
+        try:
+            await self.__sync_subscription(session_id)
+            await websocket.accept()
+
+        except BaseException:
+            self.__release_channel(session_id)
+            raise
+
         self.connection_sessions[websocket] = session_id
+        self.session_connections.setdefault(session_id, set()).add(websocket)
 
-        # Initialize message list for this session
-        if session_id not in self.session_messages:
-            self.session_messages[session_id] = []
+        writer = OutboundWriter(websocket, self.queue_size)
+        writer.task = asyncio.create_task(self.__drain(writer))
+        self.writers[websocket] = writer
+        self.connections_gauge.set(len(self.connection_sessions))
+
+        # Initialize the record for this session, kept while the connection holds it
+        self.session_store.get_or_create(session_id)
+        self.session_store.pin(session_id)
+
+        if last_seq is not None:
+            try:
+                await self.__request_replay(websocket, session_id, last_seq)
+
+            except BaseException:
+                self.disconnect(websocket)
+                raise
 
     def disconnect(self, websocket: WebSocket):
         """Disconnect a connection
 
         :param WebSocket websocket: The connection to disconnect
         """
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        if websocket in self.connection_sessions:
-            del self.connection_sessions[websocket]
+        self.last_seen.pop(websocket, None)
+        writer = self.writers.pop(websocket, None)
+        if writer is not None:
+            self.queue_depth.dec(len(writer.frames))
+            writer.frames.clear()
+            if writer.task is not None and writer.task is not asyncio.current_task():
+                writer.task.cancel()
+
+        session_id = self.connection_sessions.pop(websocket, None)
+        if session_id is None:
+            return
 
-    async def send_personal_message(self, message: str, websocket: WebSocket, persist: bool = True):
+        self.session_store.unpin(session_id)
+        connections = self.session_connections.get(session_id)
+        if connections is not None:
+            connections.discard(websocket)
+            if not connections:
+                del self.session_connections[session_id]
+        self.__release_channel(session_id)
+        self.connections_gauge.set(len(self.connection_sessions))
+
+    async def send_personal_message(
+        self, frame: OutgoingFrame, websocket: WebSocket, persist: bool = True
+    ):
         """Send a message to a specific connection
 
-        :param str message: The message to send
+        :param OutgoingFrame frame: The encoded message to send
         :param WebSocket websocket: The connection to send the message to
         :param bool persist: Whether to persist the message in the session messages
         """
-        await websocket.send_text(message)
-
-        if persist and websocket in self.connection_sessions:
-            session_id = self.connection_sessions[websocket]
-            try:
-                message_data = json.loads(message)
-                self.session_messages[session_id].append(message_data)
+        session_id = self.connection_sessions.get(websocket)
+        if persist and session_id is not None:
+            frame = self.session_store.sequence_frame(session_id, frame)
+            self.session_store.append_message(session_id, frame.payload)
 
-            except json.JSONDecodeError:
-                self.session_messages[session_id].append(message)
+        self.__enqueue(websocket, frame.text, persist)
 
-    async def broadcast(self, message: str):
+    async def broadcast(self, frame: OutgoingFrame):
         """Broadcast a message to all connections
 
-        :param str message: The message to broadcast
+        :param OutgoingFrame frame: The encoded message to broadcast
         """
-        for connection in self.active_connections:
-            await connection.send_text(message)
+        for connection in list(self.connection_sessions):
+            self.__enqueue(connection, frame.text, False)
 
     def get_session_messages(self, session_id: str) -> List[dict]:
         """Get all messages for a specific session
@@ -76,15 +284,15 @@ class ConnectionManager:
         :param str session_id: The ID of the session to get the messages for
         :return List[dict]: The list of messages for the session
         """
-        return self.session_messages.get(session_id, [])
+        record = self.session_store.get(session_id)
+        return record.messages if record else []
 
     def clear_session_messages(self, session_id: str):
         """Clear messages for a specific session
 
         :param str session_id: The ID of the session to clear the messages for
         """
-        if session_id in self.session_messages:
-            del self.session_messages[session_id]
+        self.session_store.clear_messages(session_id)
 
     def store_message(self, session_id: str, message: dict):
         """Store a message in the session messages
@@ -92,7 +300,7 @@ class ConnectionManager:
         :param str session_id: The ID of the session to store the message in
         :param dict message: The message to store
         """
-        self.session_messages[session_id].append(message)
+        self.session_store.append_message(session_id, message)
 
     def get_connections_with_session_id(self, session_id: str) -> List[WebSocket]:
         """Get all connections for a specific session
@@ -100,20 +308,309 @@ class ConnectionManager:
         :param str session_id: The ID of the session to get the connections for
         :return List[WebSocket]: The list of connections for the session
         """
-        return [
-            connection
-            for connection in self.active_connections
-            if self.connection_sessions[connection] == session_id
-        ]
+        return list(self.session_connections.get(session_id, ()))
+
+    async def has_session_connections(self, session_id: str) -> bool:
+        """Check whether any worker holds a connection for a specific session
+
+        :param str session_id: The ID of the session to check
+        :return bool: True if at least one connection exists for the session
+        """
+        if session_id in self.session_connections:
+            return True
+        return await self.pubsub.count_subscribers(session_channel(session_id)) > 0
+
+    def get_session_connection_count(self, session_id: str) -> int:
+        """Get the number of connections for a specific session
+
+        :param str session_id: The ID of the session to count the connections for
+        :return int: The number of connections for the session
+        """
+        return len(self.session_connections.get(session_id, ()))
+
+    def get_queue_depth(self, websocket: WebSocket) -> int:
+        """Get the number of frames waiting to be written to a connection
+
+        :param WebSocket websocket: The connection to inspect
+        :return int: The number of queued frames
+        """
+        writer = self.writers.get(websocket)
+        return len(writer.frames) if writer else 0
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        """All active connections across every session"""
+        return list(self.connection_sessions)
 
     async def send_message_to_all_connections_with_session_id(
-        self, session_id: str, message: str, persist: bool = True
+        self, session_id: str, frame: OutgoingFrame, persist: bool = True
     ):
         """Send a message to all connections with a specific session ID
 
+        The frame is published on the session channel so it reaches the worker owning the
+        socket, where the same encoded text is queued on each connection's writer. The
+        history keeps the frame's structured payload, so nothing is parsed back. Persisted
+        frames are numbered, buffered for replay and kept in the history even when no
+        connection receives them, so a client reconnecting later is replayed its history.
+
         :param str session_id: The ID of the session to send the message to
-        :param str message: The message to send
+        :param OutgoingFrame frame: The encoded message to send
         :param bool persist: Whether to persist the message in the session messages
         """
-        for connection in self.get_connections_with_session_id(session_id):
-            await self.send_personal_message(message, connection, persist)
+        if persist:
+            frame = self.session_store.sequence_frame(session_id, frame)
+            self.session_store.append_message(session_id, frame.payload)
+
+        await self.pubsub.publish(
+            session_channel(session_id), ('1' if persist else '0') + frame.text
+        )
+
+    async def __deliver(self, channel: str, payload: str):
+        """Queue a published frame on the local connections of its session
+
+        :param str channel: The session channel the frame was published on
+        :param str payload: The persist flag followed by the frame
+        """
+        if channel == self.worker_channel:
+            await self.__handle_worker_message(payload)
+            return
+
+        session_id = channel.partition(':')[2]
+        persist, message = payload[0] == '1', payload[1:]
+        for connection in list(self.session_connections.get(session_id, ())):
+            self.__enqueue(connection, message, persist)
+
+    async def __handle_worker_message(self, payload: str):
+        """Run a turn forwarded to this worker, or serve or deliver the replay of a reconnect
+
+        :param str payload: The kind of the message followed by its JSON arguments
+        """
+        kind, arguments = payload[0], json.loads(payload[1:])
+        if kind == WorkerMessage.TURN:
+            session_id, frame = arguments
+            admission = await self.submit_turn(session_id, Message.model_validate(frame))
+            if admission != TurnAdmission.ACCEPTED:
+                busy = Message(
+                    event=MessageEvent.SERVICE_BUSY, message=WellnessProfileQuestions.SERVICE_BUSY
+                )
+                await self.send_message_to_all_connections_with_session_id(
+                    session_id, OutgoingFrame.from_message(busy), persist=False
+                )
+
+        elif kind == WorkerMessage.REPLAY_REQUEST:
+            session_id, last_seq, worker_id, token = arguments
+            frames, is_complete = self.session_store.get_frames_since(session_id, last_seq)
+            await self.pubsub.publish(
+                worker_channel(worker_id),
+                WorkerMessage.REPLAY + json.dumps([token, last_seq, frames, is_complete]),
+            )
+
+        elif kind == WorkerMessage.REPLAY:
+            token, last_seq, frames, is_complete = arguments
+            websocket = self.replay_requests.pop(token, None)
+            if websocket is not None:
+                self.__replay(websocket, last_seq, frames, is_complete)
+
+    async def __send_to_owner(self, session_id: str, payload: str) -> bool:
+        """Send a message to the worker owning a session, claiming the session if none does
+
+        :param str session_id: The ID of the session
+        :param str payload: The worker message
+        :return bool: True if another worker received it, False if this worker owns the session
+        """
+        key = session_owner_key(session_id)
+        owner = await self.pubsub.claim(key, self.worker_id, self.owner_ttl)
+        while owner != self.worker_id:
+            if await self.pubsub.publish(worker_channel(owner), payload):
+                return True
+            # The owner is gone along with the session state it held, take the session over
+            owner = await self.pubsub.claim(key, self.worker_id, self.owner_ttl, replacing=owner)
+        return False
+
+    async def __request_replay(self, websocket: WebSocket, session_id: str, last_seq: int):
+        """Get the frames a reconnecting client missed from the worker owning the session
+
+        Frames delivered to the connection meanwhile are held, so the missed ones go first.
+
+        :param WebSocket websocket: The reconnected connection
+        :param str session_id: The ID of the session
+        :param int last_seq: The sequence number of the last frame the client received
+        """
+        self.writers[websocket].held = []
+        token = uuid.uuid4().hex
+        self.replay_requests[token] = websocket
+        payload = WorkerMessage.REPLAY_REQUEST + json.dumps(
+            [session_id, last_seq, self.worker_id, token]
+        )
+        if await self.__send_to_owner(session_id, payload):
+            self.__run_in_background(self.__expire_replay_request(token, last_seq))
+            return
+
+        del self.replay_requests[token]
+        frames, is_complete = self.session_store.get_frames_since(session_id, last_seq)
+        self.__replay(websocket, last_seq, frames, is_complete)
+
+    async def __expire_replay_request(self, token: str, last_seq: int):
+        await asyncio.sleep(self.replay_timeout)
+        websocket = self.replay_requests.pop(token, None)
+        if websocket is not None:
+            # The owner never answered, the client cannot know what it missed
+            self.__replay(websocket, last_seq, [], False)
+
+    def __replay(self, websocket: WebSocket, last_seq: int, frames: List[str], is_complete: bool):
+        """Queue the frames a reconnecting client missed ahead of the frames held meanwhile
+
+        :param WebSocket websocket: The reconnected connection
+        :param int last_seq: The sequence number of the last frame the client received
+        :param List[str] frames: The missed frames still buffered by the session owner
+        :param bool is_complete: Whether the frames are all of the missed frames
+        """
+        writer = self.writers.get(websocket)
+        if writer is None:
+            return
+
+        held, writer.held = writer.held or [], None
+        if not is_complete:
+            # Older frames left the buffer, the client has to reload the conversation
+            resync = Message(
+                event=MessageEvent.RESYNC_REQUIRED, message=WellnessProfileQuestions.RESYNC_REQUIRED
+            )
+            self.__enqueue(websocket, OutgoingFrame.from_message(resync).text, True)
+
+        for text in frames:
+            self.__enqueue(websocket, text, True)
+
+        # Persisted frames held meanwhile were replayed too if numbered before the replay
+        replayed_seq = json.loads(frames[-1])['seq'] if frames else last_seq
+        for text, persist in held:
+            if not persist or json.loads(text).get('seq', 0) > replayed_seq:
+                self.__enqueue(websocket, text, persist)
+
+        self.replays.inc(outcome='complete' if is_complete else 'resync')
+        self.replayed_frames.inc(len(frames))
+
+    def __release_channel(self, session_id: str):
+        refs = self.channel_refs.get(session_id, 0) - 1
+        if refs > 0:
+            self.channel_refs[session_id] = refs
+            return
+
+        self.channel_refs.pop(session_id, None)
+        self.__run_in_background(self.__sync_subscription(session_id))
+
+    async def __sync_subscription(self, session_id: str):
+        """Subscribe to or unsubscribe from a session channel to match its connections
+
+        Runs under a lock and re-checks the references, so interleaved connects and
+        disconnects always leave the channel subscribed while a connection holds it.
+
+        :param str session_id: The ID of the session
+        """
+        async with self.subscription_lock:
+            wanted = session_id in self.channel_refs
+            if wanted == (session_id in self.subscribed):
+                return
+
+            channel = session_channel(session_id)
+            if wanted:
+                await self.pubsub.subscribe(channel)
+                self.subscribed.add(session_id)
+            else:
+                await self.pubsub.unsubscribe(channel)
+                self.subscribed.discard(session_id)
+
+    def __run_in_background(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    def __enqueue(self, websocket: WebSocket, message: str, persist: bool):
+        writer = self.writers.get(websocket)
+        if writer is None:
+            return
+
+        if writer.held is not None:
+            writer.held.append((message, persist))
+            return
+
+        if writer.is_full():
+            policy = self.overflow_policy
+            if policy == OverflowPolicy.DISCONNECT:
+                self.__disconnect_slow_consumer(websocket)
+                return
+
+            dropped = writer.drop_transient() if policy == OverflowPolicy.COALESCE else 0
+            if not dropped:
+                writer.drop_oldest()
+                dropped = 1
+
+            self.queue_depth.dec(dropped)
+            self.dropped_frames.inc(dropped, policy=policy.value)
+
+        writer.push(message, persist)
+        self.queue_depth.inc()
+
+    def __disconnect_slow_consumer(self, websocket: WebSocket):
+        session_id = self.connection_sessions.get(websocket)
+        self.logger.warning('Disconnecting slow WebSocket consumer', session_id=session_id)
+        self.slow_consumer_disconnects.inc()
+        self.disconnect(websocket)
+
+        self.__run_in_background(self.__close(websocket, 1013))
+
+    async def __close(self, websocket: WebSocket, code: int):
+        try:
+            await asyncio.wait_for(websocket.close(code=code), timeout=5)
+
+        except Exception as e:
+            self.logger.debug(f'Error closing connection: {e}')
+
+    async def __heartbeat(self):
+        """Ping connections quiet for a ping interval and reap those idle past the timeout
+
+        A single task walks every connection rather than one timer per connection.
+        """
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            now = time.monotonic()
+            for websocket, last_seen in list(self.last_seen.items()):
+                idle = now - last_seen
+                if idle > self.idle_timeout:
+                    self.logger.info(
+                        'Reaping idle WebSocket connection',
+                        session_id=self.connection_sessions.get(websocket),
+                    )
+                    self.idle_disconnects.inc()
+                    self.disconnect(websocket)
+                    self.__run_in_background(self.__close(websocket, 1001))
+                elif idle >= self.ping_interval:
+                    self.__enqueue(websocket, self.ping_text, False)
+
+    async def __drain(self, writer: OutboundWriter):
+        """Write queued frames to the connection until it is disconnected
+
+        :param OutboundWriter writer: The writer of the connection to drain
+        """
+        websocket = writer.websocket
+        try:
+            while True:
+                if not writer.frames:
+                    writer.wakeup.clear()
+                    await writer.wakeup.wait()
+                    continue
+
+                message, _ = writer.frames.popleft()
+                self.queue_depth.dec()
+                started = time.perf_counter()
+                await websocket.send_text(message)
+                self.send_time.observe(time.perf_counter() - started)
+
+        except asyncio.CancelledError:
+            raise
+
+        except Exception as e:
+            self.logger.error(
+                f'Error writing to connection: {e}',
+                session_id=self.connection_sessions.get(websocket),
+            )
+            self.disconnect(websocket)
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import time
+from contextvars import ContextVar
+from typing import Coroutine, Optional, Set
+
+from structlog import get_logger
+
+from app.constants.turn_scheduler import TurnAdmission
+from app.repositories.shared_state import get_metrics_registry
+
+# When the running turn was submitted, so later stages can time themselves from the request
+turn_submitted_at: ContextVar[Optional[float]] = ContextVar('turn_submitted_at', default=None)
+
+
+class TurnScheduler:
+    """Runs conversation turns in the background under a global concurrency limit
+
+    Turns beyond the limit wait in a bounded queue, and are refused once it is full so a
+    traffic spike is pushed back to clients instead of turning into a Bedrock throttling storm.
+    Every turn is tracked until it finishes, so it can be cancelled and drained on shutdown,
+    which is the only time turns are cancelled. They outlive the connections of their
+    session, a client reconnecting with its last sequence number is replayed the frames the
+    turn sent meanwhile, and the session store does not evict a session generating a turn.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(TurnScheduler, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.concurrency = int(os.getenv('TURN_CONCURRENCY') or 32)
+            self.queue_size = int(os.getenv('TURN_QUEUE_SIZE') or 256)
+            self.drain_timeout = float(os.getenv('TURN_DRAIN_TIMEOUT') or 30)
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+            self.tasks: Set[asyncio.Task] = set()
+            self.admitted_tasks: Set[asyncio.Task] = set()
+            self.queued = 0
+            self.running = 0
+            self.is_accepting = True
+            self.logger = get_logger()
+
+            metrics = get_metrics_registry()
+            self.queue_wait = metrics.histogram(
+                'turn_queue_wait_seconds', 'Time turns spend waiting for a free slot'
+            )
+            self.execution_time = metrics.histogram(
+                'turn_execution_seconds', 'Time turns spend running once admitted'
+            )
+            self.queue_depth = metrics.gauge('turn_queue_depth', 'Turns waiting for a free slot')
+            self.in_flight = metrics.gauge('turns_in_flight', 'Turns currently running')
+            self.rejections = metrics.counter(
+                'turns_rejected_total', 'Turns refused by the scheduler, by reason'
+            )
+            self.outcomes = metrics.counter('turns_total', 'Finished turns, by outcome')
+            self._initialized = True
+
+    def start(self):
+        self.is_accepting = True
+
+    async def stop(self):
+        """Stop accepting turns, let the submitted ones finish, and cancel what is left after the drain timeout"""
+        self.is_accepting = False
+        if not self.tasks:
+            return
+
+        self.logger.info('Draining turns', turns=len(self.tasks), timeout=self.drain_timeout)
+        _, pending = await asyncio.wait(set(self.tasks), timeout=self.drain_timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            self.logger.warning('Cancelled turns still running after drain', turns=len(pending))
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def submit(self, session_id: str, turn: Coroutine) -> TurnAdmission:
+        """Schedule a turn, or refuse it when the scheduler is full or shutting down
+
+        :param str session_id: The ID of the session the turn belongs to
+        :param Coroutine turn: The turn to run, closed without running when refused
+        :return TurnAdmission: Whether the turn was accepted
+        """
+        if not self.is_accepting:
+            admission = TurnAdmission.SHUTTING_DOWN
+        elif self.queued + self.running >= self.concurrency + self.queue_size:
+            admission = TurnAdmission.QUEUE_FULL
+        else:
+            admission = TurnAdmission.ACCEPTED
+
+        if admission != TurnAdmission.ACCEPTED:
+            turn.close()
+            self.rejections.inc(reason=admission)
+            return admission
+
+        self.queued += 1
+        self.queue_depth.set(self.queued)
+        submitted_at = time.perf_counter()
+        # The task copies the current context, so the turn sees its own submission time
+        token = turn_submitted_at.set(submitted_at)
+        task = asyncio.create_task(self.__run(session_id, turn, submitted_at))
+        turn_submitted_at.reset(token)
+        self.tasks.add(task)
+        task.add_done_callback(lambda finished: self.__forget(turn, finished))
+        return admission
+
+    def get_stats(self) -> dict:
+        return {'queued': self.queued, 'running': self.running, 'tracked': len(self.tasks)}
+
+    async def __run(self, session_id: str, turn: Coroutine, submitted_at: float):
+        try:
+            async with self.semaphore:
+                self.admitted_tasks.add(asyncio.current_task())
+                self.queued -= 1
+                self.queue_depth.set(self.queued)
+                self.queue_wait.observe(time.perf_counter() - submitted_at)
+
+                self.running += 1
+                self.in_flight.set(self.running)
+                started = time.perf_counter()
+                try:
+                    await turn
+                    self.outcomes.inc(outcome='completed')
+                finally:
+                    self.running -= 1
+                    self.in_flight.set(self.running)
+                    self.execution_time.observe(time.perf_counter() - started)
+
+        except asyncio.CancelledError:
+            self.outcomes.inc(outcome='cancelled')
+            raise
+
+        except Exception as e:
+            self.outcomes.inc(outcome='failed')
+            self.logger.error(f'Error running turn: {e}', session_id=session_id)
+
+    def __forget(self, turn: Coroutine, task: asyncio.Task):
+        self.tasks.discard(task)
+        if task in self.admitted_tasks:
+            self.admitted_tasks.discard(task)
+        else:
+            # Cancelled before it got a slot, possibly before __run even started
+            turn.close()
+            self.queued -= 1
+            self.queue_depth.set(self.queued)
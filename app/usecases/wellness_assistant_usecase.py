@@ -1,33 +1,66 @@
 import json
+import os
+from typing import Coroutine, Optional
 
 from structlog import get_logger
 
 from app.constants.message import MessageEvent, MessageStatus
-from app.constants.profiling_stage import ProfilingStage, ProfilingStageMapping
+from app.constants.profiling_stage import ProfilingStageMapping
 from app.constants.questions import WellnessProfileQuestions
-from app.constants.wellness_profile import Confidence
-from app.models.message import Message, TransationResponse
-from app.models.wellness_profile import WellnessProfile, WellnessProfileConfidence
+from app.models.message import Message, OutgoingFrame, TransationResponse
+from app.models.wellness_profile import PROFILE_FIELDS, ProfileState, WellnessProfileResponse
+from app.repositories.session_store import SessionRecord
 from app.repositories.shared_state import (
     get_connection_manager,
-    session_assistant_replies,
-    session_has_pending_generation,
-    session_messages,
-    session_status,
-    session_wellness_confidence,
-    session_wellness_profiles,
+    get_metrics_registry,
+    get_session_store,
 )
+from app.usecases.llm_rate_controller_usecase import LLMOverloadedError
 from app.usecases.llm_usecase import LLMUsecase
+from app.usecases.rule_extraction_usecase import RuleExtractionUsecase
 
 
 class WellnessUsecase:
-    __slots__ = ('__llm_usecase', '__manager', '__logger')
-
-    def __init__(self):
-        self.__llm_usecase = LLMUsecase()
+    __slots__ = (
+        '__llm_usecase',
+        '__rule_extraction',
+        '__manager',
+        '__session_store',
+        '__logger',
+        '__rule_extraction_outcomes',
+        '__coalesced_answers',
+        '__messages_sent',
+    )
+
+    def __init__(self, llm_usecase: Optional[LLMUsecase] = None):
+        self.__llm_usecase = llm_usecase or LLMUsecase()
+        self.__rule_extraction = RuleExtractionUsecase() if os.getenv('RULE_EXTRACTION') else None
         self.__manager = get_connection_manager()
+        self.__session_store = get_session_store()
         self.__logger = get_logger()
 
+        metrics = get_metrics_registry()
+        self.__rule_extraction_outcomes = metrics.counter(
+            'rule_extraction_total', 'Turns answered by the rule-based extractor, by outcome'
+        )
+        self.__coalesced_answers = metrics.counter(
+            'coalesced_answers_total', 'Answers folded into the next generation of their session'
+        )
+        self.__messages_sent = metrics.counter(
+            'messages_sent_total', 'Messages sent to session connections, by event'
+        )
+
+    def get_turn(self, session_id: str, frame: Message) -> Coroutine:
+        """Get the turn answering an INIT_PROFILE or USER_ANSWER frame
+
+        :param str session_id: The ID of the session
+        :param Message frame: The frame starting the turn
+        :return Coroutine: The turn, to be scheduled
+        """
+        if frame.event == MessageEvent.INIT_PROFILE:
+            return self.initialize_session(session_id)
+        return self.send_message_to_assistant(session_id, frame)
+
     async def initialize_session(self, session_id: str):
         """Initialize the wellness profile session
 
@@ -35,8 +68,7 @@ class WellnessUsecase:
         :return TransationResponse: The response from the session initialization
         """
         try:
-            connections = self.__manager.get_connections_with_session_id(session_id)
-            if not connections:
+            if not await self.__manager.has_session_connections(session_id):
                 return TransationResponse(
                     status=MessageStatus.ERROR, message='No connection found for session'
                 )
@@ -45,16 +77,12 @@ class WellnessUsecase:
                 event=MessageEvent.ASSISTANT_QUESTION,
                 message=WellnessProfileQuestions.INTRODUCTION,
             )
-            await self.__manager.send_message_to_all_connections_with_session_id(
-                session_id, response.model_dump_json()
-            )
+            await self.__send_message(session_id, response)
 
-            current_stage = session_status.get(session_id, ProfilingStage.INIT)
-            next_stage = ProfilingStageMapping.get_next_stage(current_stage)
-            session_status[session_id] = next_stage
-
-            session_wellness_profiles[session_id] = WellnessProfile()
-            session_wellness_confidence[session_id] = WellnessProfileConfidence()
+            record = self.__session_store.get_or_create(session_id)
+            record.status = ProfilingStageMapping.get_next_stage(record.status)
+            record.profile_state = ProfileState()
+            self.__session_store.save_state(session_id)
 
         except Exception as e:
             self.__logger.error(f'Error initializing session: {e}')
@@ -62,9 +90,7 @@ class WellnessUsecase:
                 event=MessageEvent.USER_ANSWER,
                 message=WellnessProfileQuestions.USER_ANSWER_FAILED,
             )
-            await self.__manager.send_message_to_all_connections_with_session_id(
-                session_id, response.model_dump_json()
-            )
+            await self.__send_message(session_id, response)
 
     async def send_message_to_assistant(self, session_id: str, message: Message):
         """Send a message to the assistant
@@ -77,18 +103,22 @@ class WellnessUsecase:
                 event=MessageEvent.USER_ANSWER,
                 message=WellnessProfileQuestions.USER_ANSWER_RECEIVED,
             )
-            await self.__manager.send_message_to_all_connections_with_session_id(
-                session_id, response.model_dump_json(), persist=False
-            )
+            await self.__send_message(session_id, response, persist=False)
 
             response_to_save = Message(
                 event=MessageEvent.USER_ANSWER,
                 message=message.message,
             )
-            session_messages[session_id].append(response_to_save.model_dump())
+            self.__session_store.append_message(session_id, response_to_save.model_dump())
+
+            record = self.__session_store.get_or_create(session_id)
+            record.pending_answers.append(message.message)
+            if record.is_generating:
+                # The running turn picks this answer up once its generation completes
+                self.__coalesced_answers.inc()
+                return
 
-            # Process the user message and handle profile completion
-            await self.__process_user_message_and_update_profile(session_id, message.message)
+            await self.__run_session_turns(session_id, record)
 
         except Exception as e:
             self.__logger.error(f'Error sending message to user: {e}')
@@ -96,9 +126,48 @@ class WellnessUsecase:
                 event=MessageEvent.USER_ANSWER,
                 message=WellnessProfileQuestions.USER_ANSWER_FAILED,
             )
-            await self.__manager.send_message_to_all_connections_with_session_id(
-                session_id, response.model_dump_json()
-            )
+            await self.__send_message(session_id, response)
+
+    async def __run_session_turns(self, session_id: str, record: SessionRecord):
+        """Process queued answers in order, one generation at a time per session.
+
+        Answers that arrive while a generation runs are queued on the session record and
+        processed together by the next generation. The session is always released, even
+        when a turn fails.
+
+        :param str session_id: The ID of the session
+        :param SessionRecord record: The session record holding the queued answers
+        """
+        record.is_generating = True
+        try:
+            while record.pending_answers:
+                answers, record.pending_answers = record.pending_answers, []
+                try:
+                    await self.__process_user_message_and_update_profile(
+                        session_id, '\n'.join(answers)
+                    )
+                    self.__session_store.save_state(session_id)
+
+                except LLMOverloadedError as e:
+                    # Tell the client to come back later rather than letting the turn time out
+                    self.__logger.warning(f'Turn shed: {e}', session_id=session_id)
+                    response = Message(
+                        event=MessageEvent.SERVICE_BUSY,
+                        message=WellnessProfileQuestions.SERVICE_BUSY,
+                    )
+                    await self.__send_message(session_id, response)
+
+                except Exception as e:
+                    self.__logger.error(f'Error processing user answers: {e}')
+                    response = Message(
+                        event=MessageEvent.USER_ANSWER,
+                        message=WellnessProfileQuestions.USER_ANSWER_FAILED,
+                    )
+                    await self.__send_message(session_id, response)
+
+        finally:
+            record.is_generating = False
+            record.pending_answers.clear()
 
     async def __process_user_message_and_update_profile(self, session_id: str, user_message: str):
         """Process user message, update wellness profile, and send appropriate response.
@@ -106,165 +175,178 @@ class WellnessUsecase:
         :param str session_id: The ID of the session
         :param str user_message: The user's message to process
         """
+        record = self.__session_store.get_or_create(session_id)
+
         max_assistant_replies = 5
-        if session_assistant_replies.get(session_id, 0) >= max_assistant_replies:
+        if record.assistant_replies >= max_assistant_replies:
             response = Message(
                 event=MessageEvent.MAX_REPLIES_REACHED,
                 message='You have hit the max number of replies. Please contact support if you need to continue the conversation.',
             )
-            await self.__manager.send_message_to_all_connections_with_session_id(
-                session_id, response.model_dump_json()
-            )
+            await self.__send_message(session_id, response)
             return
 
-        if session_has_pending_generation.get(session_id, False):
-            response = Message(
-                event=MessageEvent.PENDING_GENERATION,
-                message='You have pending generation. Please wait for the response.',
-            )
-            await self.__manager.send_message_to_all_connections_with_session_id(
-                session_id, response.model_dump_json()
-            )
-            return
-
-        # Get LLM response
-        session_has_pending_generation[session_id] = True
-        llm_response = await self.__llm_usecase.get_output_model_from_user_response(
-            user_message,
-            WellnessProfileQuestions.INTRODUCTION,
-            response_history=session_messages[session_id],
-        )
-        session_has_pending_generation[session_id] = False
-
-        # Get or initialize existing session data
-        existing_profile = session_wellness_profiles.get(session_id, WellnessProfile())
-        existing_confidence = session_wellness_confidence.get(
-            session_id, WellnessProfileConfidence()
-        )
+        state = record.profile_state or ProfileState()
 
-        # Merge new data with existing data
-        merged_profile = self.__merge_wellness_profile(
-            existing_profile, llm_response.wellnessProfile
-        )
-        merged_confidence = self.__merge_wellness_confidence(
-            existing_confidence, llm_response.confidence
-        )
+        # Skip the LLM when the rules alone complete the profile, otherwise get LLM response
+        llm_response = self.__extract_with_rules(session_id, user_message, state)
+        if llm_response is None:
+            if self.__llm_usecase.is_streaming:
+                llm_response = await self.__stream_llm_response(
+                    session_id, user_message, record, state
+                )
+            else:
+                llm_response = await self.__llm_usecase.get_output_model_from_user_response(
+                    user_message,
+                    WellnessProfileQuestions.INTRODUCTION,
+                    response_history=record.messages,
+                    profile=state.to_profile(),
+                    confidence=state.to_confidence(),
+                )
 
-        # Update session state
-        session_wellness_profiles[session_id] = merged_profile
-        session_wellness_confidence[session_id] = merged_confidence
+        # Merge new data into the session state in place
+        changed_fields = state.merge(llm_response.wellnessProfile, llm_response.confidence)
+        record.profile_state = state
+        if changed_fields:
+            # Progress for clients rendering the profile live, not part of the conversation
+            response = Message(
+                event=MessageEvent.PROFILE_DELTA,
+                message=json.dumps(state.get_delta(changed_fields)),
+            )
+            await self.__send_message(session_id, response, persist=False)
 
-        if self.__is_profile_complete(merged_profile, merged_confidence):
+        if state.is_complete():
             # Profile is complete - send completion message
             response = Message(
                 event=MessageEvent.PROFILE_COMPLETE,
-                message=json.dumps(merged_profile.model_dump()),
-            )
-            await self.__manager.send_message_to_all_connections_with_session_id(
-                session_id, response.model_dump_json()
+                message=json.dumps(state.as_dict()),
             )
+            await self.__send_message(session_id, response)
 
-            self.__logger.info(
-                'Profile complete', session_id=session_id, profile=merged_profile.model_dump()
-            )
+            self.__logger.info('Profile complete', session_id=session_id, profile=state.as_dict())
 
-        elif self.__has_pending_clarifications(merged_confidence) and llm_response.followUpQuestion:
+        elif state.has_pending_clarifications() and llm_response.followUpQuestion:
             # There are pending clarifications - send follow-up question
             response = Message(
                 event=MessageEvent.ASSISTANT_QUESTION, message=llm_response.followUpQuestion
             )
-            await self.__manager.send_message_to_all_connections_with_session_id(
-                session_id, response.model_dump_json()
-            )
+            await self.__send_message(session_id, response)
 
-            session_assistant_replies[session_id] = session_assistant_replies.get(session_id, 0) + 1
+            record.assistant_replies += 1
 
         else:
             self.__logger.warning(
                 'No follow-up question provided but profile incomplete',
                 session_id=session_id,
-                profile=merged_profile.model_dump(),
-                confidence=merged_confidence.model_dump(),
+                profile=state.as_dict(),
+                confidence=state.get_delta(PROFILE_FIELDS)['confidence'],
             )
             response = Message(
                 event=MessageEvent.ASSISTANT_QUESTION,
                 message='Thank you for the information. Could you please provide any missing details about your wellness profile?',
             )
-            await self.__manager.send_message_to_all_connections_with_session_id(
-                session_id, response.model_dump_json()
-            )
+            await self.__send_message(session_id, response)
 
-    def __merge_wellness_profile(
-        self, existing: WellnessProfile, new: WellnessProfile
-    ) -> WellnessProfile:
-        """Merge two wellness profiles, with new values taking priority over existing ones.
+    def __extract_with_rules(
+        self, session_id: str, user_message: str, state: ProfileState
+    ) -> Optional[WellnessProfileResponse]:
+        """Run the rule-based extractor and keep its result only if it completes the profile.
 
-        :param WellnessProfile existing: The existing wellness profile
-        :param WellnessProfile new: The new wellness profile
-        :return WellnessProfile: The merged wellness profile
+        :param str session_id: The ID of the session
+        :param str user_message: The user's message to process
+        :param ProfileState state: The merged profile of the session
+        :return Optional[WellnessProfileResponse]: The completed profile, None if the LLM is needed
         """
-        merged_data = existing.model_dump()
-        new_data = new.model_dump()
-
-        # Update with new non-null values
-        for key, value in new_data.items():
-            if value is not None:
-                merged_data[key] = value
+        if self.__rule_extraction is None:
+            return None
+
+        extracted = self.__rule_extraction.extract(user_message)
+
+        # Only the fields the rules found override the merged state, unlike the LLM output
+        # the rules' default LOW confidence for the other fields means "not stated"
+        candidate = state.copy()
+        candidate.merge(extracted.wellnessProfile, extracted.confidence, found_only=True)
+        if not candidate.is_complete():
+            self.__rule_extraction_outcomes.inc(outcome='miss')
+            return None
+
+        self.__rule_extraction_outcomes.inc(outcome='hit')
+        self.__logger.info('Profile completed by rule-based extraction', session_id=session_id)
+        return WellnessProfileResponse.model_construct(
+            wellnessProfile=candidate.to_profile(),
+            confidence=candidate.to_confidence(),
+            followUpQuestion=None,
+        )
 
-        return WellnessProfile(**merged_data)
+    async def __stream_llm_response(
+        self, session_id: str, user_message: str, record: SessionRecord, state: ProfileState
+    ) -> WellnessProfileResponse:
+        """Stream the LLM response, forwarding follow-up question deltas to the session.
 
-    def __merge_wellness_confidence(
-        self, existing: WellnessProfileConfidence, new: WellnessProfileConfidence
-    ) -> WellnessProfileConfidence:
-        """Merge two confidence profiles, with new values taking priority over existing ones.
+        Deltas are held back until the streamed confidences show the turn asks a follow-up
+        question, a turn completing the profile never sends a question it does not finalize.
 
-        :param WellnessProfileConfidence existing: The existing confidence profile
-        :param WellnessProfileConfidence new: The new confidence profile
-        :return WellnessProfileConfidence: The merged confidence profile
+        :param str session_id: The ID of the session
+        :param str user_message: The user's message to process
+        :param SessionRecord record: The session record holding the history
+        :param ProfileState state: The merged profile of the session
+        :return WellnessProfileResponse: The complete, validated LLM response
         """
-        merged_data = existing.model_dump()
-        new_data = new.model_dump()
-
-        # Update with new non-null values
-        for key, value in new_data.items():
-            if value is not None:
-                merged_data[key] = value
+        partial = None
+        sent_question = ''
+        asks_question = None
+        async for partial in self.__llm_usecase.stream_output_model_from_user_response(
+            user_message,
+            WellnessProfileQuestions.INTRODUCTION,
+            response_history=record.messages,
+            profile=state.to_profile(),
+            confidence=state.to_confidence(),
+        ):
+            question = partial.followUpQuestion or ''
+            if asks_question is None and question:
+                asks_question = self.__asks_question(partial, state)
+            if (
+                asks_question
+                and len(question) > len(sent_question)
+                and question.startswith(sent_question)
+            ):
+                response = Message(
+                    event=MessageEvent.ASSISTANT_QUESTION_DELTA,
+                    message=question[len(sent_question) :],
+                )
+                await self.__send_message(session_id, response, persist=False)
+                sent_question = question
 
-        return WellnessProfileConfidence(**merged_data)
+        return WellnessProfileResponse.model_validate(
+            partial.model_dump(exclude_none=True) if partial else {}
+        )
 
-    def __has_pending_clarifications(self, confidence: WellnessProfileConfidence) -> bool:
-        """Check if there are any fields with low or medium confidence that need clarification.
+    @staticmethod
+    def __asks_question(partial: WellnessProfileResponse, state: ProfileState) -> Optional[bool]:
+        """Whether a streamed turn ends in a follow-up question rather than a complete profile
 
-        :param WellnessProfileConfidence confidence: The confidence profile to check
-        :return bool: True if there are any fields with low or medium confidence that need clarification, False otherwise
+        :param WellnessProfileResponse partial: The partial LLM response
+        :param ProfileState state: The merged profile of the session
+        :return Optional[bool]: None while the confidences are still streaming
         """
-        confidence_data = confidence.model_dump()
-
-        for _, conf_level in confidence_data.items():
-            if conf_level == Confidence.LOW:
-                return True
+        confidence = partial.confidence
+        if confidence is None or any(
+            getattr(confidence, field) is None for field in PROFILE_FIELDS
+        ):
+            return None
 
-        return False
+        candidate = state.copy()
+        candidate.merge(partial.wellnessProfile, confidence)
+        return not candidate.is_complete() and candidate.has_pending_clarifications()
 
-    def __is_profile_complete(
-        self, profile: WellnessProfile, confidence: WellnessProfileConfidence
-    ) -> bool:
-        """Check if the wellness profile is complete (all fields filled with high confidence).
+    async def __send_message(self, session_id: str, response: Message, persist: bool = True):
+        """Send a message to every connection of a session, counting it by event.
 
-        :param WellnessProfile profile: The wellness profile to check
-        :param WellnessProfileConfidence confidence: The confidence profile to check
-        :return bool: True if the wellness profile is complete, False otherwise
+        :param str session_id: The ID of the session
+        :param Message response: The message to send
+        :param bool persist: Whether to persist the message in the session messages
         """
-        profile_data = profile.model_dump()
-        confidence_data = confidence.model_dump()
-
-        # Check if all fields are filled and have high confidence
-        for field, value in profile_data.items():
-            if value is None:
-                return False
-
-            conf_level = confidence_data.get(field)
-            if conf_level not in (Confidence.HIGH, Confidence.MEDIUM):
-                return False
-
-        return True
+        self.__messages_sent.inc(event=response.event)
+        await self.__manager.send_message_to_all_connections_with_session_id(
+            session_id, OutgoingFrame.from_message(response), persist=persist
+        )
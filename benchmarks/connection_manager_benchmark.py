@@ -0,0 +1,124 @@
+"""ConnectionManager connect / lookup / disconnect cost at increasing socket counts.
+
+Before timing, frames are sent to a session with no connection and a client then resumes
+it from the start, which must be replayed the session's history.
+
+Run from the repository root:
+
+    python -m benchmarks.connection_manager_benchmark --sizes 10000 50000 100000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from app.constants.message import MessageEvent
+from app.models.message import Message, OutgoingFrame
+from app.repositories.session_store import SessionStore
+from app.usecases.session_manager_usecase import ConnectionManager
+
+TABS_PER_SESSION = 2
+
+
+class FakeWebSocket:
+    __slots__ = ()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        pass
+
+
+class RecordingWebSocket(FakeWebSocket):
+    __slots__ = ('received',)
+
+    def __init__(self):
+        self.received = []
+
+    async def send_text(self, message: str):
+        self.received.append(message)
+
+
+def fresh_manager() -> ConnectionManager:
+    ConnectionManager._instance = None
+    SessionStore._instance = None
+    return ConnectionManager(SessionStore())
+
+
+def linear_lookup(connections: list, connection_sessions: dict, session_id: str) -> list:
+    """The previous lookup: a scan over every active connection"""
+    return [c for c in connections if connection_sessions[c] == session_id]
+
+
+async def verify_offline_replay():
+    manager = fresh_manager()
+    await manager.start()
+    try:
+        for index in range(3):
+            frame = Message(event=MessageEvent.ASSISTANT_QUESTION, message=f'question {index}')
+            await manager.send_message_to_all_connections_with_session_id(
+                'offline', OutgoingFrame.from_message(frame)
+            )
+
+        websocket = RecordingWebSocket()
+        await manager.connect(websocket, 'offline', last_seq=0)
+        while manager.get_queue_depth(websocket):
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        manager.disconnect(websocket)
+    finally:
+        await manager.stop()
+
+    replayed = [json.loads(text)['message'] for text in websocket.received]
+    history = [message['message'] for message in manager.get_session_messages('offline')]
+    assert replayed == history and len(history) == 3, f'replayed {replayed}, history {history}'
+
+
+async def run(size: int, lookups: int):
+    manager = fresh_manager()
+    sockets = [FakeWebSocket() for _ in range(size)]
+    session_ids = [f'session-{i // TABS_PER_SESSION}' for i in range(size)]
+
+    started = time.perf_counter()
+    for websocket, session_id in zip(sockets, session_ids):
+        await manager.connect(websocket, session_id)
+    connect_us = (time.perf_counter() - started) / size * 1e6
+
+    targets = [session_ids[(i * 7919) % size] for i in range(lookups)]
+
+    started = time.perf_counter()
+    for session_id in targets:
+        manager.get_connections_with_session_id(session_id)
+    lookup_us = (time.perf_counter() - started) / lookups * 1e6
+
+    linear_lookups = max(1, lookups // 100)
+    active = manager.active_connections
+    started = time.perf_counter()
+    for session_id in targets[:linear_lookups]:
+        linear_lookup(active, manager.connection_sessions, session_id)
+    linear_us = (time.perf_counter() - started) / linear_lookups * 1e6
+
+    started = time.perf_counter()
+    for websocket in sockets:
+        manager.disconnect(websocket)
+    disconnect_us = (time.perf_counter() - started) / size * 1e6
+
+    print(
+        f'{size:>7} sockets  connect {connect_us:6.2f} us  lookup {lookup_us:6.2f} us'
+        f'  (linear scan {linear_us:10.2f} us)  disconnect {disconnect_us:6.2f} us'
+    )
+
+
+async def main(args):
+    await verify_offline_replay()
+    for size in args.sizes:
+        await run(size, args.lookups)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 50_000, 100_000])
+    parser.add_argument('--lookups', type=int, default=10_000)
+    asyncio.run(main(parser.parse_args()))
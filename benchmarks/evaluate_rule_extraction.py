@@ -0,0 +1,145 @@
+"""Offline evaluation of the rule-based extractor over recorded intake transcripts.
+
+Replays the user answers of every transcript through ``RuleExtractionUsecase``, merging the
+fields found turn after turn with no LLM in between, and reports how often the rules alone would complete the profile
+(and so skip the LLM) and how accurate the extracted fields are when an expected profile is
+recorded alongside the transcript. Fields listed in ``EXPECTED_MISSES`` must be left to the
+LLM, the run fails when the rules extract any of them.
+
+Transcripts are JSON lines with the session ``messages`` as stored by the connection manager
+and an optional ``expected`` profile. Run from the repository root:
+
+    python -m benchmarks.evaluate_rule_extraction benchmarks/data/intake_transcripts.jsonl
+"""
+
+import argparse
+import json
+from collections import Counter
+
+from app.constants.message import MessageEvent
+from app.constants.questions import WellnessProfileQuestions
+from app.constants.wellness_profile import Confidence
+from app.models.wellness_profile import WellnessProfile
+from app.usecases.rule_extraction_usecase import RuleExtractionUsecase
+
+FIELDS = list(WellnessProfile.model_fields)
+ACCEPTED = (Confidence.HIGH, Confidence.MEDIUM)
+
+# Fields the rules must not extract, by session: they are mentioned without being stated
+EXPECTED_MISSES = {
+    # "I used to be vegan but now I eat some fish"
+    't-06': ('dietaryPreference',),
+}
+
+
+def user_answers(messages: list) -> list:
+    return [
+        message['message']
+        for message in messages
+        if isinstance(message, dict)
+        and message.get('event') == MessageEvent.USER_ANSWER
+        and message.get('message') != WellnessProfileQuestions.USER_ANSWER_RECEIVED
+    ]
+
+
+def evaluate(transcripts: list, verbose: bool = False) -> dict:
+    extractor = RuleExtractionUsecase()
+    turns = hits = completed_sessions = 0
+    extracted = Counter()
+    correct = Counter()
+    expected_fields = Counter()
+    regressions = []
+
+    for transcript in transcripts:
+        profile: dict = {}
+        confidence: dict = {}
+        completed = False
+        for answer in user_answers(transcript['messages']):
+            turns += 1
+            result = extractor.extract(answer)
+            result_confidence = result.confidence.model_dump()
+            for field, value in result.wellnessProfile.model_dump(exclude_none=True).items():
+                profile[field] = value
+                confidence[field] = result_confidence[field]
+
+            if not completed and all(
+                profile.get(field) is not None and confidence.get(field) in ACCEPTED
+                for field in FIELDS
+            ):
+                hits += 1
+                completed = True
+
+        completed_sessions += completed
+        extracted.update(list(profile))
+        for field in EXPECTED_MISSES.get(transcript.get('session_id'), ()):
+            if field in profile:
+                regressions.append(f'{transcript["session_id"]} {field}={profile[field]}')
+
+        expected = transcript.get('expected') or {}
+        for field, value in expected.items():
+            if value is None:
+                continue
+            expected_fields[field] += 1
+            if str(profile.get(field, '')).lower() == str(value).lower():
+                correct[field] += 1
+
+        if verbose:
+            print(f'{transcript.get("session_id", "?"):>10}  complete={completed}  {profile}')
+
+    return {
+        'sessions': len(transcripts),
+        'turns': turns,
+        'turns_skipping_llm': hits,
+        'turn_hit_rate': hits / turns if turns else 0.0,
+        'session_completion_rate': completed_sessions / len(transcripts) if transcripts else 0.0,
+        'fields': {
+            field: {
+                'extracted': extracted[field],
+                'expected': expected_fields[field],
+                'accuracy': correct[field] / expected_fields[field]
+                if expected_fields[field]
+                else None,
+            }
+            for field in FIELDS
+        },
+        'expected_miss_regressions': regressions,
+    }
+
+
+def print_report(report: dict):
+    print(
+        f'{report["sessions"]} sessions, {report["turns"]} turns  '
+        f'turn hit rate {report["turn_hit_rate"]:.1%}  '
+        f'sessions completed by rules {report["session_completion_rate"]:.1%}'
+    )
+    for field, stats in report['fields'].items():
+        accuracy = 'n/a' if stats['accuracy'] is None else f'{stats["accuracy"]:.1%}'
+        print(
+            f'{field:>18}  extracted {stats["extracted"]:4d}  '
+            f'expected {stats["expected"]:4d}  accuracy {accuracy}'
+        )
+
+
+def main(args):
+    with open(args.transcripts) as file:
+        transcripts = [json.loads(line) for line in file if line.strip()]
+
+    report = evaluate(transcripts, verbose=args.verbose)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    if report['expected_miss_regressions']:
+        raise SystemExit(
+            'Extracted fields the rules must leave to the LLM: '
+            + ', '.join(report['expected_miss_regressions'])
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('transcripts', help='JSON lines file of recorded transcripts')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    parser.add_argument('--verbose', action='store_true', help='Print every extracted profile')
+    main(parser.parse_args())
@@ -0,0 +1,119 @@
+"""Microbenchmark of the outgoing frame pipeline, in frames per second per core.
+
+Times encoding a ``Message`` the previous way, ``model_dump_json`` followed by ``json.loads`` to
+persist it, against encoding it once as an ``OutgoingFrame``, with pydantic's serializer and
+with orjson when it is installed. Then pushes frames through ``ConnectionManager`` to every
+connection of a session. CPU time is measured, so the figures are per core.
+
+Run from the repository root:
+
+    python -m benchmarks.frame_throughput --frames 100000 --connections 3
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from app.constants.message import MessageEvent
+from app.constants.questions import WellnessProfileQuestions
+from app.models import message as message_module
+from app.models.message import Message, OutgoingFrame
+from benchmarks.replay_conversations import CountingWebSocket
+
+SESSION_ID = 'frame-throughput'
+# Keep the benchmark session's history, and so the store's eviction work, bounded
+HISTORY_RESET_INTERVAL = 1000
+
+
+def frames_per_cpu_second(frames: int, run) -> float:
+    started = time.process_time()
+    run(frames)
+    elapsed = time.process_time() - started
+    return frames / elapsed if elapsed else 0.0
+
+
+def encode_previous(message: Message, frames: int):
+    for _ in range(frames):
+        json.loads(message.model_dump_json())
+
+
+def encode_once(message: Message, frames: int):
+    for _ in range(frames):
+        OutgoingFrame.from_message(message)
+
+
+def encode_once_pydantic(message: Message, frames: int):
+    orjson, message_module.orjson = message_module.orjson, None
+    try:
+        encode_once(message, frames)
+    finally:
+        message_module.orjson = orjson
+
+
+async def run_pipeline(message: Message, frames: int, connections: int) -> float:
+    from app.repositories.shared_state import get_connection_manager, get_session_store
+
+    manager = get_connection_manager()
+    store = get_session_store()
+    await manager.start()
+    sockets = [CountingWebSocket() for _ in range(connections)]
+    for websocket in sockets:
+        await manager.connect(websocket, SESSION_ID)
+
+    started = time.process_time()
+    for index in range(frames):
+        await manager.send_message_to_all_connections_with_session_id(
+            SESSION_ID, OutgoingFrame.from_message(message)
+        )
+        # Let every writer task send the frame before the next one is queued
+        await asyncio.sleep(0)
+        if index % HISTORY_RESET_INTERVAL == 0:
+            store.clear_messages(SESSION_ID)
+    elapsed = time.process_time() - started
+
+    for websocket in sockets:
+        manager.disconnect(websocket)
+    await manager.stop()
+    return frames / elapsed if elapsed else 0.0
+
+
+def main(args) -> dict:
+    message = Message(
+        event=MessageEvent.ASSISTANT_QUESTION, message=WellnessProfileQuestions.INTRODUCTION
+    )
+    report = {
+        'frames': args.frames,
+        'connections': args.connections,
+        'orjson': message_module.orjson is not None,
+        'encode_frames_per_second': {
+            'model_dump_json_and_loads': frames_per_cpu_second(
+                args.frames, lambda n: encode_previous(message, n)
+            ),
+            'outgoing_frame_pydantic': frames_per_cpu_second(
+                args.frames, lambda n: encode_once_pydantic(message, n)
+            ),
+        },
+        'pipeline_frames_per_second': asyncio.run(
+            run_pipeline(message, args.frames, args.connections)
+        ),
+    }
+    if message_module.orjson is not None:
+        report['encode_frames_per_second']['outgoing_frame_orjson'] = frames_per_cpu_second(
+            args.frames, lambda n: encode_once(message, n)
+        )
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=100_000)
+    parser.add_argument('--connections', type=int, default=3, help='Connections of the session')
+    parser.add_argument('--output', help='Also write the JSON report to this file')
+    arguments = parser.parse_args()
+
+    report = main(arguments)
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    print(json.dumps(report, indent=2))
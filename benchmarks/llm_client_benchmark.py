@@ -0,0 +1,103 @@
+"""Per-call Bedrock client construction versus the shared LLMClientRegistry.
+
+Run from the repository root:
+
+    python -m benchmarks.llm_client_benchmark --calls 100 --concurrency 10
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import instructor
+from anthropic import AsyncAnthropicBedrock
+
+from benchmarks.stub_bedrock import (
+    StubBedrockConfig,
+    start_stub_bedrock,
+    stop_stub_bedrock,
+    use_stub_credentials,
+)
+
+MESSAGES = [{'role': 'user', 'content': '34, male, vegan, sleep badly, want to lose weight'}]
+
+
+async def per_call_client(model_id: str, response_model):
+    """The previous behaviour: a new client and instructor wrapper on every turn"""
+    model = AsyncAnthropicBedrock(aws_region='us-east-1')
+    client = instructor.from_anthropic(model, mode=instructor.Mode.ANTHROPIC_TOOLS)
+    await client.chat.completions.create_with_completion(
+        model=model_id,
+        max_tokens=1024,
+        messages=MESSAGES,
+        response_model=response_model,
+        max_retries=2,
+    )
+
+
+async def shared_client(model_id: str, response_model):
+    from app.repositories.shared_state import get_llm_client_registry
+
+    registry = get_llm_client_registry()
+    await registry.get_client().chat.completions.create_with_completion(
+        model=model_id,
+        max_tokens=1024,
+        messages=MESSAGES,
+        response_model=registry.get_response_model(response_model),
+        max_retries=2,
+    )
+
+
+async def measure(call, calls: int, concurrency: int, model_id: str, response_model) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def timed():
+        async with semaphore:
+            started = time.perf_counter()
+            await call(model_id, response_model)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed() for _ in range(calls)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'calls_per_second': calls / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+async def main(args):
+    server, task, base_url = await start_stub_bedrock(StubBedrockConfig(latency=args.latency))
+    use_stub_credentials(base_url)
+
+    from app.models.wellness_profile import WellnessProfileResponse
+    from app.repositories.shared_state import get_llm_client_registry
+
+    registry = get_llm_client_registry()
+    await registry.startup(response_models=(WellnessProfileResponse,))
+
+    try:
+        for name, call in (('per_call_client', per_call_client), ('shared_client', shared_client)):
+            result = await measure(
+                call, args.calls, args.concurrency, 'stub.sonnet', WellnessProfileResponse
+            )
+            print(
+                f'{name:<16} {result["calls_per_second"]:>8.1f} calls/s'
+                f'  p50 {result["p50_ms"]:>7.2f} ms  p95 {result["p95_ms"]:>7.2f} ms'
+            )
+    finally:
+        await registry.shutdown()
+        await stop_stub_bedrock(server, task)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.0, help='Stub latency in seconds')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,368 @@
+"""Load test of the full profiling flow against the stub Bedrock backend.
+
+Serves the app in this process and drives N simulated clients through the real flow: open the
+session WebSocket, POST ``/profile/initialize``, then POST ``/profile/userAnswer`` several times,
+timing each turn from the POST until the assistant's reply frame arrives.
+
+The clients and the stub run on their own event loop in a separate thread, so the event-loop lag
+sampled on the app's loop reflects the app alone. RSS is process-wide, the per-session figure is
+the growth over the baseline divided by the number of sessions.
+
+Run from the repository root:
+
+    python -m benchmarks.load_test --sessions 200 --turns 3 --latency 0.5 --jitter 0.2
+    python -m benchmarks.load_test --sessions 500 --error-rate 0.05 --output load.json
+    python -m benchmarks.load_test --sessions 500 --capacity 20 --latency 1.0
+    python -m benchmarks.load_test --sessions 500 --duplex
+    python -m benchmarks.load_test --sessions 200 --streaming
+    python -m benchmarks.load_test --sessions 200 --streaming --complete
+
+Streamed runs also count the question deltas received and the turns whose deltas do not add
+up to the question the turn ends with, e.g. deltas of a turn completing the profile.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import threading
+import time
+from typing import Optional
+
+import httpx
+import uvicorn
+import websockets
+
+from app.constants.message import MessageEvent
+from app.constants.questions import WellnessProfileQuestions
+from benchmarks.stub_bedrock import (
+    CANNED_TOOL_INPUT,
+    StubBedrockConfig,
+    free_port,
+    start_stub_bedrock,
+    stop_stub_bedrock,
+    use_stub_credentials,
+)
+
+REPLY_EVENTS = {
+    MessageEvent.ASSISTANT_QUESTION,
+    MessageEvent.PROFILE_COMPLETE,
+    MessageEvent.MAX_REPLIES_REACHED,
+}
+ANSWER = '34, male, vegan, sleep badly, want to lose weight'
+# A tool call completing the profile, for runs where every turn ends in PROFILE_COMPLETE
+COMPLETE_TOOL_INPUT = {
+    **CANNED_TOOL_INPUT,
+    'wellnessProfile': {
+        **CANNED_TOOL_INPUT['wellnessProfile'],
+        'activityLevel': 'active',
+        'stressLevel': 'low',
+    },
+    'confidence': dict.fromkeys(CANNED_TOOL_INPUT['confidence'], 'high'),
+}
+LAG_INTERVAL = 0.01
+
+
+def get_rss_bytes() -> int:
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # No procfs, fall back to the peak RSS which is in KiB on Linux and bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def summarize(values: list) -> dict:
+    return {
+        'count': len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values, default=0.0),
+    }
+
+
+class LoopMonitor:
+    """Samples event-loop lag and RSS on the loop it is started on"""
+
+    def __init__(self):
+        self.lags = []
+        self.peak_rss = 0
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.__run())
+
+    async def stop(self):
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+    async def __run(self):
+        while True:
+            expected = time.perf_counter() + LAG_INTERVAL
+            await asyncio.sleep(LAG_INTERVAL)
+            self.lags.append(max(0.0, time.perf_counter() - expected))
+            self.peak_rss = max(self.peak_rss, get_rss_bytes())
+
+
+class SessionResult:
+    __slots__ = (
+        'init_latency',
+        'turn_latencies',
+        'failed_turns',
+        'rejected_turns',
+        'shed_turns',
+        'frames',
+        'question_deltas',
+        'unfinalized_turns',
+    )
+
+    def __init__(self):
+        self.init_latency = None
+        self.turn_latencies = []
+        self.failed_turns = 0
+        self.rejected_turns = 0
+        self.shed_turns = 0
+        self.frames = 0
+        self.question_deltas = 0
+        self.unfinalized_turns = 0
+
+
+async def wait_for_reply(websocket, result: SessionResult, timeout: float) -> Optional[str]:
+    """Read frames until the reply to the current turn, None if the turn failed"""
+    deadline = time.perf_counter() + timeout
+    question = ''
+    while True:
+        frame = json.loads(await asyncio.wait_for(websocket.recv(), deadline - time.perf_counter()))
+        result.frames += 1
+        if frame['event'] == MessageEvent.ASSISTANT_QUESTION_DELTA:
+            result.question_deltas += 1
+            question += frame['message']
+            continue
+        if frame['event'] in REPLY_EVENTS or frame['event'] == MessageEvent.SERVICE_BUSY:
+            finalized = frame['event'] == MessageEvent.ASSISTANT_QUESTION
+            if question and (not finalized or frame['message'] != question):
+                result.unfinalized_turns += 1
+            return frame['event']
+        if frame['message'] == WellnessProfileQuestions.USER_ANSWER_FAILED:
+            return None
+
+
+async def run_session(base_url: str, session_id: str, args, delay: float) -> SessionResult:
+    await asyncio.sleep(delay)
+    result = SessionResult()
+    ws_url = base_url.replace('http', 'ws') + f'/ws/wellnessProfile/{session_id}'
+    async with (
+        websockets.connect(ws_url, max_queue=None) as websocket,
+        httpx.AsyncClient(base_url=base_url, timeout=args.timeout) as http,
+    ):
+        started = time.perf_counter()
+        if args.duplex:
+            await websocket.send(json.dumps({'event': MessageEvent.INIT_PROFILE}))
+        else:
+            await http.post(f'/profile/initialize/{session_id}')
+        if await wait_for_reply(websocket, result, args.timeout):
+            result.init_latency = time.perf_counter() - started
+
+        for _ in range(args.turns):
+            started = time.perf_counter()
+            if args.duplex:
+                # Refusals come back on the socket as SERVICE_BUSY, counted as shed
+                await websocket.send(
+                    json.dumps({'event': MessageEvent.USER_ANSWER, 'message': ANSWER})
+                )
+            elif (
+                await http.post(f'/profile/userAnswer/{session_id}', json={'message': ANSWER})
+            ).status_code != 200:
+                result.rejected_turns += 1
+                continue
+
+            try:
+                event = await wait_for_reply(websocket, result, args.timeout)
+                if event == MessageEvent.SERVICE_BUSY:
+                    result.shed_turns += 1
+                elif event:
+                    result.turn_latencies.append(time.perf_counter() - started)
+                else:
+                    result.failed_turns += 1
+            except asyncio.TimeoutError:
+                result.failed_turns += 1
+
+    return result
+
+
+async def run_clients(base_url: str, args) -> list:
+    ramp = args.ramp / args.sessions
+    return await asyncio.gather(
+        *(run_session(base_url, f'load-{i}', args, i * ramp) for i in range(args.sessions)),
+        return_exceptions=True,
+    )
+
+
+async def main(args) -> dict:
+    # Clients and stub get their own loop so they do not show up in the app's loop lag
+    client_loop = asyncio.new_event_loop()
+    threading.Thread(target=client_loop.run_forever, daemon=True).start()
+
+    def on_client_loop(coroutine):
+        return asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, client_loop))
+
+    config = StubBedrockConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        capacity=args.capacity,
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+        tool_input=COMPLETE_TOOL_INPUT if args.complete else None,
+    )
+    stub_server, stub_task, stub_url = await on_client_loop(start_stub_bedrock(config))
+    use_stub_credentials(stub_url)
+    if not args.extraction_cache:
+        # Every client sends the same answers, the cache would answer nearly all turns
+        os.environ['EXTRACTION_CACHE_SIZE'] = '0'
+    if args.streaming:
+        os.environ['LLM_STREAMING'] = '1'
+
+    from app.main import app
+
+    port = free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning', ws_max_queue=1024)
+    )
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    baseline_rss = get_rss_bytes()
+    monitor = LoopMonitor()
+    monitor.start()
+
+    started = time.perf_counter()
+    try:
+        outcomes = await on_client_loop(run_clients(f'http://127.0.0.1:{port}', args))
+    finally:
+        elapsed = time.perf_counter() - started
+        await monitor.stop()
+        server.should_exit = True
+        await server_task
+        await on_client_loop(stop_stub_bedrock(stub_server, stub_task))
+        client_loop.call_soon_threadsafe(client_loop.stop)
+
+    results = [outcome for outcome in outcomes if isinstance(outcome, SessionResult)]
+    turn_latencies = [latency for result in results for latency in result.turn_latencies]
+    init_latencies = [result.init_latency for result in results if result.init_latency]
+    frames = sum(result.frames for result in results)
+
+    return {
+        'config': vars(args),
+        'elapsed_seconds': elapsed,
+        'sessions': {
+            'started': args.sessions,
+            'completed': len(results),
+            'errored': len(outcomes) - len(results),
+        },
+        'turns': {
+            'succeeded': len(turn_latencies),
+            'failed': sum(result.failed_turns for result in results),
+            'rejected': sum(result.rejected_turns for result in results),
+            'shed': sum(result.shed_turns for result in results),
+            'per_second': len(turn_latencies) / elapsed,
+        },
+        'turn_latency_seconds': summarize(turn_latencies),
+        'init_latency_seconds': summarize(init_latencies),
+        'frames': {'received': frames, 'per_second': frames / elapsed},
+        'question_deltas': {
+            'received': sum(result.question_deltas for result in results),
+            'unfinalized_turns': sum(result.unfinalized_turns for result in results),
+        },
+        'event_loop_lag_seconds': summarize(monitor.lags),
+        'rss_bytes': {
+            'baseline': baseline_rss,
+            'peak': monitor.peak_rss,
+            'per_session': max(0, monitor.peak_rss - baseline_rss) / args.sessions,
+        },
+        'bedrock_calls': stub_server.config.app.state.calls,
+    }
+
+
+def print_report(report: dict):
+    turns = report['turns']
+    latency = report['turn_latency_seconds']
+    lag = report['event_loop_lag_seconds']
+    print(
+        f'{report["sessions"]["started"]} sessions in {report["elapsed_seconds"]:.2f} s, '
+        f'{report["bedrock_calls"]} Bedrock calls'
+    )
+    print(
+        f'turns      {turns["succeeded"]} ok  {turns["failed"]} failed  '
+        f'{turns["rejected"]} rejected  {turns["shed"]} shed  {turns["per_second"]:.1f}/s'
+    )
+    print(
+        f'latency    p50 {latency["p50"] * 1000:.0f} ms  p95 {latency["p95"] * 1000:.0f} ms  '
+        f'p99 {latency["p99"] * 1000:.0f} ms'
+    )
+    print(f'frames     {report["frames"]["per_second"]:.1f}/s')
+    deltas = report['question_deltas']
+    if deltas['received']:
+        print(
+            f'deltas     {deltas["received"]} received  '
+            f'{deltas["unfinalized_turns"]} turns not finalized'
+        )
+    print(
+        f'loop lag   p50 {lag["p50"] * 1000:.1f} ms  p99 {lag["p99"] * 1000:.1f} ms  '
+        f'max {lag["max"] * 1000:.1f} ms'
+    )
+    print(f'RSS        {report["rss_bytes"]["per_session"] / 1024:.1f} KiB per session')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--turns', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.5, help='Stub latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.1, help='Stub latency jitter in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument(
+        '--capacity', type=int, default=0, help='Throttle calls beyond this many in flight'
+    )
+    parser.add_argument(
+        '--slow-rate', type=float, default=0.0, help='Fraction of calls taking --slow-latency'
+    )
+    parser.add_argument('--slow-latency', type=float, default=5.0, help='Slow call latency')
+    parser.add_argument('--ramp', type=float, default=1.0, help='Seconds to start all sessions')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument(
+        '--extraction-cache', action='store_true', help='Keep the extraction result cache on'
+    )
+    parser.add_argument(
+        '--duplex', action='store_true', help='Send answers on the WebSocket instead of POSTs'
+    )
+    parser.add_argument(
+        '--streaming', action='store_true', help='Stream LLM outputs (LLM_STREAMING=1)'
+    )
+    parser.add_argument(
+        '--complete', action='store_true', help='Stub extracts a complete profile every turn'
+    )
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    parser.add_argument('--output', help='Also write the JSON report to this file')
+    arguments = parser.parse_args()
+
+    report = asyncio.run(main(arguments))
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    if arguments.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
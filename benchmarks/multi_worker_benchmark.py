@@ -0,0 +1,200 @@
+"""End-to-end turn throughput with several app workers sharing the Redis pub/sub backend.
+
+Each worker is its own server. A session's POSTs go to each worker in turn, and its socket
+to other workers than the first POST, also when resumed after an answer sent while
+disconnected, so turns and replays have to reach the worker holding the session's state.
+The run fails if a session's frames show it lost its state: replies lost, persisted frames
+not numbered 1, 2, 3... or the profile extracted again from scratch.
+
+Run from the repository root:
+
+    python -m benchmarks.multi_worker_benchmark --workers 1 2 4 --clients 50 --turns 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import zlib
+
+import httpx
+import websockets
+
+from benchmarks.stub_bedrock import StubBedrockConfig, free_port, start_stub_bedrock
+from benchmarks.stub_redis import StubRedis
+
+TERMINAL_EVENTS = {'ASSISTANT_QUESTION', 'PROFILE_COMPLETE', 'MAX_REPLIES_REACHED'}
+
+
+async def wait_for_event(websocket, timeout: float, frames: list) -> str:
+    while True:
+        frame = json.loads(await asyncio.wait_for(websocket.recv(), timeout))
+        last_seq = max((seen['seq'] for seen in frames if 'seq' in seen), default=0)
+        if frame.get('seq', last_seq + 1) <= last_seq:
+            # Delivered again around a reconnect
+            continue
+        frames.append(frame)
+        if frame['event'] in TERMINAL_EVENTS:
+            return frame['event']
+
+
+def get_continuity_errors(frames: list) -> list:
+    errors = []
+    seqs = [frame['seq'] for frame in frames if 'seq' in frame]
+    if seqs != list(range(1, len(seqs) + 1)):
+        errors.append(f'frames numbered {seqs}')
+    # The stub always extracts the same profile, so only the first turn changes it
+    deltas = sum(frame['event'] == 'PROFILE_DELTA' for frame in frames)
+    if deltas > 1:
+        errors.append(f'profile extracted from scratch {deltas} times')
+    return errors
+
+
+async def run_client(
+    base_urls: list, session_id: str, turns: int, timeout: float, resume_delay: float
+) -> dict:
+    first = zlib.crc32(session_id.encode())
+    ws_path = f'/ws/wellnessProfile/{session_id}'
+    answer = {'message': '34, male, vegan, sleep badly, want to lose weight'}
+    delivered = lost = 0
+    frames = []
+    posts = 0
+
+    async def post(http: httpx.AsyncClient, path: str, **kwargs):
+        # Every request lands on the worker after the previous one's
+        nonlocal posts
+        posts += 1
+        await http.post(base_urls[(first + posts) % len(base_urls)] + path, **kwargs)
+
+    async with httpx.AsyncClient() as http:
+        socket_url = base_urls[first % len(base_urls)].replace('http', 'ws') + ws_path
+        async with websockets.connect(socket_url) as websocket:
+            await post(http, f'/profile/initialize/{session_id}')
+            await wait_for_event(websocket, timeout, frames)
+
+            for _ in range(turns):
+                await post(http, f'/profile/userAnswer/{session_id}', json=answer)
+                try:
+                    await wait_for_event(websocket, timeout, frames)
+                    delivered += 1
+
+                except asyncio.TimeoutError:
+                    lost += 1
+
+        # The reply to an answer sent while disconnected is replayed on resuming elsewhere
+        # than on the session's owner, the worker of the first request
+        await post(http, f'/profile/userAnswer/{session_id}', json=answer)
+        await asyncio.sleep(resume_delay)
+        last_seq = max((frame['seq'] for frame in frames if 'seq' in frame), default=0)
+        resume_url = base_urls[(first + 2) % len(base_urls)].replace('http', 'ws') + ws_path
+        async with websockets.connect(f'{resume_url}?last_seq={last_seq}') as websocket:
+            try:
+                await wait_for_event(websocket, timeout, frames)
+                delivered += 1
+
+            except asyncio.TimeoutError:
+                lost += 1
+
+    errors = get_continuity_errors(frames)
+    if lost:
+        errors.append(f'{lost} replies lost')
+    return {'delivered': delivered, 'lost': lost, 'errors': errors}
+
+
+async def wait_until_ready(base_url: str):
+    async with httpx.AsyncClient(base_url=base_url) as http:
+        for _ in range(200):
+            try:
+                if (await http.get('/health')).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError('App did not become ready')
+
+
+async def run(workers: int, args, bedrock_url: str, redis_url: str) -> int:
+    ports = [free_port() for _ in range(workers)]
+    env = dict(
+        os.environ,
+        PUBSUB_BACKEND='redis',
+        REDIS_URL=redis_url,
+        ANTHROPIC_BEDROCK_BASE_URL=bedrock_url,
+        AWS_ACCESS_KEY_ID='stub',
+        AWS_SECRET_ACCESS_KEY='stub',
+        BEDROCK_REGION='us-east-1',
+        SONNET_MODEL_ID='stub.sonnet',
+        HAIKU_MODEL_ID='stub.haiku',
+    )
+    processes = [
+        subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'app.main:app', '--port', str(port)]
+            + ['--log-level', 'warning'],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        for port in ports
+    ]
+    base_urls = [f'http://127.0.0.1:{port}' for port in ports]
+    try:
+        await asyncio.gather(*(wait_until_ready(base_url) for base_url in base_urls))
+
+        session_ids = [f'bench-{workers}-{i}' for i in range(args.clients)]
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(
+                run_client(base_urls, session_id, args.turns, args.timeout, args.latency * 2)
+                for session_id in session_ids
+            )
+        )
+        elapsed = time.perf_counter() - started
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    delivered = sum(result['delivered'] for result in results)
+    lost = sum(result['lost'] for result in results)
+    print(
+        f'{workers} worker(s)  {delivered / elapsed:8.1f} turns/s'
+        f'  delivered {delivered}  lost {lost}  elapsed {elapsed:.2f} s'
+    )
+    failures = 0
+    for session_id, result in zip(session_ids, results):
+        for error in result['errors']:
+            print(f'  {session_id}: {error}')
+            failures += 1
+    return failures
+
+
+async def main(args):
+    bedrock, bedrock_task, bedrock_url = await start_stub_bedrock(
+        StubBedrockConfig(latency=args.latency)
+    )
+    stub_redis = StubRedis()
+    redis_url = await stub_redis.start()
+
+    failures = 0
+    try:
+        for workers in args.workers:
+            failures += await run(workers, args, bedrock_url, redis_url)
+    finally:
+        await stub_redis.stop()
+        bedrock.should_exit = True
+        await bedrock_task
+    if failures:
+        raise SystemExit(f'{failures} session(s) lost their state across turns')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--turns', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.2, help='Stub latency in seconds')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,133 @@
+"""Replay recorded conversations through WellnessUsecase with the LLM served from a cassette.
+
+Record a cassette by running the app with ``LLM_CASSETTE_MODE=record`` (and optionally
+``LLM_CASSETTE_PATH``), then replay the same conversations offline, without network access or
+tokens, to profile the CPU, memory and serialization cost of the app itself. Builds can be
+compared on identical traffic; prompts a build changes fall back to the recorded order.
+
+Conversations use the transcript format of ``evaluate_rule_extraction``. Run from the
+repository root:
+
+    python -m benchmarks.replay_conversations benchmarks/data/intake_transcripts.jsonl \\
+        --cassette llm_cassette.jsonl --latency-scale 0 --repeat 100
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import tracemalloc
+
+from benchmarks.evaluate_rule_extraction import user_answers
+
+
+class CountingWebSocket:
+    """Stands in for a client socket and counts what the app sends it"""
+
+    __slots__ = ('frames', 'bytes')
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        self.frames += 1
+        self.bytes += len(message)
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def replay_conversation(
+    usecase, manager, session_id: str, answers: list
+) -> CountingWebSocket:
+    from app.models.message import UserAnswerInput
+
+    websocket = CountingWebSocket()
+    await manager.connect(websocket, session_id)
+    await usecase.initialize_session(session_id)
+    for answer in answers:
+        await usecase.send_message_to_assistant(session_id, UserAnswerInput(message=answer))
+
+    # Let the writer task flush the queued frames before the socket goes away
+    while manager.get_queue_depth(websocket):
+        await asyncio.sleep(0)
+    manager.disconnect(websocket)
+    return websocket
+
+
+async def main(args) -> dict:
+    os.environ['LLM_CASSETTE_MODE'] = 'replay'
+    os.environ['LLM_CASSETTE_PATH'] = args.cassette
+    os.environ['LLM_CASSETTE_LATENCY_SCALE'] = str(args.latency_scale)
+    # Replays must reach the cassette, not be answered by the result cache
+    os.environ['EXTRACTION_CACHE_SIZE'] = '0'
+
+    from app.repositories.shared_state import get_connection_manager, get_metrics_registry
+    from app.usecases.wellness_assistant_usecase import WellnessUsecase
+
+    with open(args.transcripts) as file:
+        conversations = [
+            user_answers(json.loads(line)['messages']) for line in file if line.strip()
+        ]
+
+    manager = get_connection_manager()
+    await manager.start()
+    usecase = WellnessUsecase()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run(index: int, answers: list) -> CountingWebSocket:
+        async with semaphore:
+            return await replay_conversation(usecase, manager, f'replay-{index}', answers)
+
+    if args.trace_memory:
+        tracemalloc.start()
+    started, cpu_started = time.perf_counter(), time.process_time()
+    sockets = await asyncio.gather(
+        *(run(index, answers) for index, answers in enumerate(conversations * args.repeat))
+    )
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    peak_memory = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+    await manager.stop()
+
+    turns = sum(len(answers) for answers in conversations) * args.repeat
+    replays = get_metrics_registry().counter('llm_cassette_replays_total', '')
+    return {
+        'conversations': len(sockets),
+        'turns': turns,
+        'elapsed_seconds': elapsed,
+        'cpu_seconds': cpu,
+        'cpu_ms_per_turn': cpu / turns * 1000 if turns else 0.0,
+        'turns_per_second': turns / elapsed if elapsed else 0.0,
+        'frames': sum(websocket.frames for websocket in sockets),
+        'frame_bytes': sum(websocket.bytes for websocket in sockets),
+        'llm_replays': {
+            'exact': replays.get(match='exact'),
+            'sequential': replays.get(match='sequential'),
+        },
+        'peak_traced_bytes': peak_memory,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('transcripts', help='JSON lines file of recorded conversations')
+    parser.add_argument('--cassette', default='llm_cassette.jsonl')
+    parser.add_argument(
+        '--latency-scale', type=float, default=0.0, help='1 reproduces the recorded latency'
+    )
+    parser.add_argument('--repeat', type=int, default=1, help='Replay the conversations N times')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--trace-memory', action='store_true', help='Report the tracemalloc peak')
+    parser.add_argument('--output', help='Also write the JSON report to this file')
+    arguments = parser.parse_args()
+
+    report = asyncio.run(main(arguments))
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,209 @@
+"""Crash recovery benchmark: time to rebuild the session store from a snapshot and journal tail.
+
+Writes a snapshot of ``--sessions`` profiling sessions and a journal of ``--journal-ops``
+mutations made after it, in the format the session journal writes, then recovers them in a
+new interpreter as the app does on startup. Also reports the latency of first accessing a
+recovered session, which is when it is parsed, and the memory held once recovered.
+
+Before timing, sessions in edge-case states are saved through the store, the process exits
+without flushing them on shutdown, and a new process checks they are recovered as saved.
+
+Run from the repository root:
+
+    python -m benchmarks.session_recovery_benchmark --sessions 1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from app.constants.message import MessageEvent, MessageStatus
+from app.constants.profiling_stage import ProfilingStage
+from app.constants.questions import WellnessProfileQuestions
+from app.constants.session_journal import JournalOp
+from app.constants.wellness_profile import Confidence
+from app.models.wellness_profile import PROFILE_FIELDS
+from app.repositories.session_journal import (
+    JOURNAL_FILE,
+    SNAPSHOT_FILE,
+    encode,
+    encode_snapshot_line,
+)
+
+RECOVER_SCRIPT = """
+import json, random, resource, statistics, sys, time
+started = time.perf_counter()
+from app.repositories.session_store import SessionStore
+from app.repositories.shared_state import get_session_store
+imported = time.perf_counter()
+store = get_session_store()
+stats = store.recover()
+recovered = time.perf_counter()
+
+session_ids = random.Random(0).sample(range(int(sys.argv[1])), int(sys.argv[2]))
+latencies = []
+for index in session_ids:
+    access_started = time.perf_counter()
+    store.get(f'session-{index}')
+    latencies.append(time.perf_counter() - access_started)
+latencies.sort()
+
+print(json.dumps({
+    'import_seconds': imported - started,
+    'recover_seconds': recovered - imported,
+    'sessions': stats['sessions'],
+    'replayed': stats['replayed'],
+    'first_access_p50_ms': statistics.median(latencies) * 1000,
+    'first_access_p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+# Run twice over one directory: the first run's sessions are recovered from the snapshot it
+# compacted to, the second run's from the journal only
+ROUND_TRIP_SCRIPT = """
+import asyncio, sys
+from app.constants.profiling_stage import ProfilingStage
+from app.models.wellness_profile import ProfileState
+from app.repositories.shared_state import get_session_journal, get_session_store
+
+SESSIONS = {
+    # initialized past COMPLETED, see ProfilingStageMapping.get_next_stage
+    'stage-none': (None, 5),
+    'id-with\\tseparators\\n\\\\t': (ProfilingStage.PROFILING, 2),
+}
+
+async def save(run):
+    store, journal = get_session_store(), get_session_journal()
+    store.recover()
+    await journal.start(store)
+    for session_id, (status, replies) in SESSIONS.items():
+        session_id = f'{run}-{session_id}'
+        store.append_message(session_id, {'event': 'USER_ANSWER', 'message': session_id})
+        record = store.get(session_id)
+        record.status, record.assistant_replies = status, replies
+        record.profile_state = ProfileState()
+        store.save_state(session_id)
+    if run == 'snapshot':
+        await journal.snapshot(store)
+    await journal.flush()
+
+def check():
+    store = get_session_store()
+    store.recover()
+    for run in ('snapshot', 'journal'):
+        for session_id, (status, replies) in SESSIONS.items():
+            session_id = f'{run}-{session_id}'
+            record = store.get(session_id)
+            assert record is not None, f'{session_id!r} not recovered'
+            saved = (record.status, record.assistant_replies, record.messages[0]['message'])
+            assert saved == (status, replies, session_id), f'{session_id!r} recovered as {saved}'
+
+if sys.argv[1] == 'check':
+    check()
+else:
+    asyncio.run(save(sys.argv[1]))
+"""
+
+
+def verify_round_trip():
+    with tempfile.TemporaryDirectory() as directory:
+        for step in ('snapshot', 'journal', 'check'):
+            subprocess.run(
+                [sys.executable, '-c', ROUND_TRIP_SCRIPT, step],
+                capture_output=True,
+                text=True,
+                check=True,
+                env={**os.environ, 'SESSION_JOURNAL_DIR': directory},
+            )
+
+
+def session_state(rng: random.Random) -> list:
+    messages = [
+        {
+            'event': MessageEvent.ASSISTANT_QUESTION,
+            'status': MessageStatus.SUCCESS,
+            'message': WellnessProfileQuestions.INTRODUCTION,
+        },
+        {
+            'event': MessageEvent.USER_ANSWER,
+            'status': MessageStatus.SUCCESS,
+            'message': 'I am 34, I run three times a week and I sleep about seven hours',
+        },
+        {
+            'event': MessageEvent.ASSISTANT_QUESTION,
+            'status': MessageStatus.SUCCESS,
+            'message': 'Thanks! What are your main wellness goals right now?',
+        },
+    ]
+    values = [None] * len(PROFILE_FIELDS)
+    values[rng.randrange(len(values))] = 'moderate'
+    confidences = [Confidence.HIGH if value else Confidence.LOW for value in values]
+    return [ProfilingStage.PROFILING, values, confidences, 1, len(messages), messages]
+
+
+def write_fixture(directory: str, sessions: int, journal_ops: int) -> dict:
+    rng = random.Random(0)
+    last_active = time.time()
+    started = time.perf_counter()
+    snapshot_path = os.path.join(directory, SNAPSHOT_FILE.format(1))
+    with open(snapshot_path, 'wb') as file:
+        file.writelines(
+            encode_snapshot_line(f'session-{index}', last_active, session_state(rng))
+            for index in range(sessions)
+        )
+
+    with open(os.path.join(directory, JOURNAL_FILE.format(1)), 'wb') as file:
+        for _ in range(journal_ops):
+            session_id = f'session-{rng.randrange(sessions)}'
+            message = {'event': MessageEvent.USER_ANSWER, 'message': 'I also swim on Sundays'}
+            file.write(encode([JournalOp.APPEND_MESSAGE, session_id, 3, message]) + b'\n')
+
+    return {
+        'write_snapshot_seconds': time.perf_counter() - started,
+        'snapshot_mb': os.path.getsize(snapshot_path) / 1024**2,
+    }
+
+
+def main(args) -> dict:
+    verify_round_trip()
+    with tempfile.TemporaryDirectory() as directory:
+        report = write_fixture(directory, args.sessions, args.journal_ops)
+        output = subprocess.run(
+            [sys.executable, '-c', RECOVER_SCRIPT, str(args.sessions), str(args.accesses)],
+            capture_output=True,
+            text=True,
+            check=True,
+            env={
+                **os.environ,
+                'SESSION_JOURNAL_DIR': directory,
+                'SESSION_STORE_MAX_BYTES': str(args.max_bytes),
+            },
+        ).stdout
+    return {
+        'sessions': args.sessions,
+        'journal_ops': args.journal_ops,
+        **report,
+        **json.loads(output.strip().splitlines()[-1]),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=1_000_000)
+    parser.add_argument('--journal-ops', type=int, default=10_000)
+    parser.add_argument('--accesses', type=int, default=10_000, help='Sessions accessed after')
+    parser.add_argument('--max-bytes', type=int, default=256 * 1024**2, help='Store ceiling')
+    parser.add_argument('--output', help='Also write the JSON report to this file')
+    arguments = parser.parse_args()
+
+    report = main(arguments)
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    print(json.dumps(report, indent=2))
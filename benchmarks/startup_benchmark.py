@@ -0,0 +1,90 @@
+"""Cold-start benchmark: app import time and time until a fresh server answers ``/health``.
+
+Each run starts a new interpreter, so nothing is cached between runs but the OS page cache.
+The import run also lists the LLM stack modules loaded by importing the app, which should be
+none since they are imported in the background once the app serves.
+
+Run from the repository root:
+
+    python -m benchmarks.startup_benchmark --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.stub_bedrock import free_port
+
+IMPORT_SCRIPT = """
+import sys, time, json
+started = time.perf_counter()
+import app.main
+from app.repositories.llm_client_registry import LLM_STACK_MODULES
+print(json.dumps({
+    'seconds': time.perf_counter() - started,
+    'llm_modules': [module for module in LLM_STACK_MODULES if module in sys.modules],
+}))
+"""
+
+
+def measure_import() -> dict:
+    output = subprocess.run(
+        [sys.executable, '-c', IMPORT_SCRIPT], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_ready(timeout: float) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app.main:app', '--port', str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env={**os.environ, 'BEDROCK_REGION': os.getenv('BEDROCK_REGION') or 'us-east-1'},
+    )
+    try:
+        with httpx.Client(base_url=f'http://127.0.0.1:{port}', timeout=1) as client:
+            while time.perf_counter() - started < timeout:
+                try:
+                    if client.get('/health').status_code == 200:
+                        return time.perf_counter() - started
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.01)
+        raise TimeoutError(f'/health not ready after {timeout} s')
+
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(args) -> dict:
+    imports = [measure_import() for _ in range(args.runs)]
+    ready = [measure_ready(args.timeout) for _ in range(args.runs)]
+    return {
+        'runs': args.runs,
+        'import_seconds': statistics.median(run['seconds'] for run in imports),
+        'llm_modules_imported_by_app': imports[-1]['llm_modules'],
+        'health_ready_seconds': statistics.median(ready),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=30.0, help='Seconds to wait for /health')
+    parser.add_argument('--output', help='Also write the JSON report to this file')
+    arguments = parser.parse_args()
+
+    report = main(arguments)
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,278 @@
+"""Local stand-in for the Bedrock runtime invoke endpoint used by the benchmarks.
+
+Answers every ``/model/{model_id}/invoke`` call with a canned ``WellnessProfileResponse``
+tool call after a configurable latency, with an optional slow tail of ``slow_rate`` calls taking
+``slow_latency``, and can inject errors and throttling, either at random or, like a real quota,
+once more than ``capacity`` calls are in flight.
+
+``/model/{model_id}/invoke-with-response-stream`` streams the same tool call as Anthropic
+message events, its input JSON split into ``stream_chunk_size`` character deltas, each event
+framed as an AWS event stream message like Bedrock does. Half of the latency passes before
+the first event and the rest is spread over the deltas.
+"""
+
+import asyncio
+import base64
+import binascii
+import json
+import os
+import random
+import socket
+import struct
+import uuid
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CANNED_TOOL_INPUT = {
+    'wellnessProfile': {
+        'age': 34,
+        'gender': 'male',
+        'activityLevel': None,
+        'dietaryPreference': 'vegan',
+        'sleepQuality': 'poor',
+        'stressLevel': None,
+        'healthGoals': 'lose weight',
+    },
+    'confidence': {
+        'age': 'high',
+        'gender': 'high',
+        'activityLevel': 'low',
+        'dietaryPreference': 'high',
+        'sleepQuality': 'medium',
+        'stressLevel': 'low',
+        'healthGoals': 'high',
+    },
+    'followUpQuestion': 'How active are you during a typical week, and how stressed do you feel?',
+}
+
+
+@dataclass
+class StubBedrockConfig:
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    capacity: int = 0
+    slow_rate: float = 0.0
+    slow_latency: float = 0.0
+    tool_input: dict = None
+    stream_chunk_size: int = 16
+
+
+def use_stub_credentials(base_url: str):
+    """Point the Bedrock client at the stub and give it credentials it can sign with
+
+    :param str base_url: The base URL the stub is served on
+    """
+    os.environ['ANTHROPIC_BEDROCK_BASE_URL'] = base_url
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'stub')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'stub')
+    os.environ.setdefault('BEDROCK_REGION', 'us-east-1')
+    os.environ.setdefault('SONNET_MODEL_ID', 'stub.sonnet')
+    os.environ.setdefault('HAIKU_MODEL_ID', 'stub.haiku')
+
+
+def throttled() -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={'message': 'Too many requests, please wait before trying again.'},
+        headers={'x-amzn-ErrorType': 'ThrottlingException'},
+    )
+
+
+def encode_event_stream_message(event: dict) -> bytes:
+    """Frame an Anthropic stream event as a Bedrock ``chunk`` AWS event stream message
+
+    :param dict event: The Anthropic message stream event
+    :return bytes: The message, prelude and CRCs included
+    """
+    headers = b''
+    for name, value in (
+        (':event-type', 'chunk'),
+        (':content-type', 'application/json'),
+        (':message-type', 'event'),
+    ):
+        # String headers: name length, name, type 7, value length, value
+        headers += struct.pack('>B', len(name)) + name.encode()
+        headers += struct.pack('>BH', 7, len(value)) + value.encode()
+
+    payload = json.dumps({'bytes': base64.b64encode(json.dumps(event).encode()).decode()}).encode()
+    prelude = struct.pack('>II', 12 + len(headers) + len(payload) + 4, len(headers))
+    message = prelude + struct.pack('>I', binascii.crc32(prelude)) + headers + payload
+    return message + struct.pack('>I', binascii.crc32(message))
+
+
+def create_stub_bedrock_app(config: StubBedrockConfig) -> FastAPI:
+    stub = FastAPI()
+    stub.state.calls = 0
+    stub.state.in_flight = 0
+    stub.state.cached_prefixes = set()
+
+    async def admit(delay_share: float = 1.0) -> Optional[JSONResponse]:
+        """Wait out the call's share of the latency, then maybe fail it
+
+        :return Optional[JSONResponse]: The error to answer with, None to answer normally
+        """
+        stub.state.calls += 1
+        if config.capacity and stub.state.in_flight >= config.capacity:
+            return throttled()
+
+        stub.state.in_flight += 1
+        try:
+            delay = config.latency + random.uniform(-config.jitter, config.jitter)
+            if random.random() < config.slow_rate:
+                delay = config.slow_latency
+            if delay > 0:
+                await asyncio.sleep(delay * delay_share)
+        finally:
+            stub.state.in_flight -= 1
+
+        roll = random.random()
+        if roll < config.throttle_rate:
+            return throttled()
+        if roll < config.throttle_rate + config.error_rate:
+            return JSONResponse(status_code=500, content={'message': 'Internal server error'})
+        return None
+
+    def get_usage(body: bytes, payload: dict, tools: list) -> dict:
+        # Mimic prompt caching: the first request writes the cached prefix, later ones read it
+        usage = {'input_tokens': len(body) // 4, 'output_tokens': 120}
+        system = payload.get('system')
+        if isinstance(system, list) and any('cache_control' in block for block in system):
+            prefix = json.dumps([tools, system])
+            kind = 'read' if prefix in stub.state.cached_prefixes else 'creation'
+            stub.state.cached_prefixes.add(prefix)
+            usage[f'cache_{kind}_input_tokens'] = len(prefix) // 4
+            usage['input_tokens'] -= len(prefix) // 4
+        return usage
+
+    @stub.post('/model/{model_id}/invoke')
+    async def invoke(model_id: str, request: Request):
+        body = await request.body()
+        error = await admit()
+        if error is not None:
+            return error
+
+        tool_input = config.tool_input or CANNED_TOOL_INPUT
+        payload = json.loads(body)
+        tools = payload.get('tools') or [{'name': 'WellnessProfileResponse'}]
+        usage = get_usage(body, payload, tools)
+
+        return {
+            'id': f'msg_{uuid.uuid4().hex}',
+            'type': 'message',
+            'role': 'assistant',
+            'model': model_id,
+            'content': [
+                {
+                    'type': 'tool_use',
+                    'id': f'toolu_{uuid.uuid4().hex}',
+                    'name': tools[0]['name'],
+                    'input': tool_input,
+                }
+            ],
+            'stop_reason': 'tool_use',
+            'stop_sequence': None,
+            'usage': usage,
+        }
+
+    @stub.post('/model/{model_id}/invoke-with-response-stream')
+    async def invoke_with_response_stream(model_id: str, request: Request):
+        body = await request.body()
+        error = await admit(delay_share=0.5)
+        if error is not None:
+            return error
+
+        tool_input = json.dumps(config.tool_input or CANNED_TOOL_INPUT)
+        payload = json.loads(body)
+        tools = payload.get('tools') or [{'name': 'WellnessProfileResponse'}]
+        usage = get_usage(body, payload, tools)
+        size = max(1, config.stream_chunk_size)
+        chunks = [tool_input[start : start + size] for start in range(0, len(tool_input), size)]
+        chunk_delay = max(0.0, config.latency) * 0.5 / len(chunks)
+
+        async def events() -> AsyncIterator[bytes]:
+            yield encode_event_stream_message(
+                {
+                    'type': 'message_start',
+                    'message': {
+                        'id': f'msg_{uuid.uuid4().hex}',
+                        'type': 'message',
+                        'role': 'assistant',
+                        'model': model_id,
+                        'content': [],
+                        'stop_reason': None,
+                        'stop_sequence': None,
+                        'usage': {**usage, 'output_tokens': 1},
+                    },
+                }
+            )
+            yield encode_event_stream_message(
+                {
+                    'type': 'content_block_start',
+                    'index': 0,
+                    'content_block': {
+                        'type': 'tool_use',
+                        'id': f'toolu_{uuid.uuid4().hex}',
+                        'name': tools[0]['name'],
+                        'input': {},
+                    },
+                }
+            )
+            for chunk in chunks:
+                if chunk_delay:
+                    await asyncio.sleep(chunk_delay)
+                yield encode_event_stream_message(
+                    {
+                        'type': 'content_block_delta',
+                        'index': 0,
+                        'delta': {'type': 'input_json_delta', 'partial_json': chunk},
+                    }
+                )
+            yield encode_event_stream_message({'type': 'content_block_stop', 'index': 0})
+            yield encode_event_stream_message(
+                {
+                    'type': 'message_delta',
+                    'delta': {'stop_reason': 'tool_use', 'stop_sequence': None},
+                    'usage': {'output_tokens': usage['output_tokens']},
+                }
+            )
+            yield encode_event_stream_message({'type': 'message_stop'})
+
+        return StreamingResponse(events(), media_type='application/vnd.amazon.eventstream')
+
+    return stub
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def start_stub_bedrock(config: StubBedrockConfig, port: int = None):
+    """Serve the stub on the running event loop
+
+    :param StubBedrockConfig config: The latency and failure profile of the stub
+    :param int port: The port to listen on, a free one is picked when omitted
+    :return tuple: The uvicorn server, its serving task and the base URL
+    """
+    port = port or free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(
+            create_stub_bedrock_app(config), host='127.0.0.1', port=port, log_level='warning'
+        )
+    )
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server, task, f'http://127.0.0.1:{port}'
+
+
+async def stop_stub_bedrock(server: uvicorn.Server, task: asyncio.Task):
+    server.should_exit = True
+    await task
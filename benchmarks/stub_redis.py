@@ -0,0 +1,113 @@
+"""Local stand-in for the Redis pub/sub commands used by RedisPubSub.
+
+Implements SUBSCRIBE, UNSUBSCRIBE, PUBLISH and PUBSUB NUMSUB over RESP2, EVAL of the session
+owner claim script, and answers +OK to anything else, which is enough for redis-py's asyncio
+client.
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Set, Tuple
+
+from app.repositories.pubsub import CLAIM_SCRIPT
+
+
+def encode(value) -> bytes:
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, list):
+        return b'*%d\r\n' % len(value) + b''.join(encode(item) for item in value)
+    data = value if isinstance(value, bytes) else str(value).encode()
+    return b'$%d\r\n%s\r\n' % (len(data), data)
+
+
+class StubRedis:
+    def __init__(self):
+        self.subscribers: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+        # claimed keys, with the monotonic time they expire at
+        self.keys: Dict[bytes, Tuple[bytes, float]] = {}
+        self.server: asyncio.base_events.Server | None = None
+
+    async def start(self, port: int = 0) -> str:
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', port)
+        port = self.server.sockets[0].getsockname()[1]
+        return f'redis://127.0.0.1:{port}/0'
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        channels: Set[bytes] = set()
+        try:
+            while True:
+                command = await self.read_command(reader)
+                if command is None:
+                    break
+                writer.write(self.execute(command, channels, writer))
+                await writer.drain()
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+        finally:
+            for channel in channels:
+                self.subscribers.get(channel, set()).discard(writer)
+            writer.close()
+
+    async def read_command(self, reader: asyncio.StreamReader) -> List[bytes] | None:
+        line = await reader.readline()
+        if not line:
+            return None
+
+        args = []
+        for _ in range(int(line[1:])):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    def execute(self, command: List[bytes], channels: Set[bytes], writer) -> bytes:
+        name = command[0].upper()
+
+        if name == b'PUBLISH':
+            receivers = self.subscribers.get(command[1], set())
+            frame = encode([b'message', command[1], command[2]])
+            for subscriber in receivers:
+                subscriber.write(frame)
+            return encode(len(receivers))
+
+        if name == b'SUBSCRIBE':
+            replies = b''
+            for channel in command[1:]:
+                channels.add(channel)
+                self.subscribers.setdefault(channel, set()).add(writer)
+                replies += encode([b'subscribe', channel, len(channels)])
+            return replies
+
+        if name == b'UNSUBSCRIBE':
+            replies = b''
+            for channel in command[1:] or list(channels):
+                channels.discard(channel)
+                self.subscribers.get(channel, set()).discard(writer)
+                replies += encode([b'unsubscribe', channel, len(channels)])
+            return replies
+
+        if name == b'PUBSUB' and command[1].upper() == b'NUMSUB':
+            reply = []
+            for channel in command[2:]:
+                reply += [channel, len(self.subscribers.get(channel, ()))]
+            return encode(reply)
+
+        if name == b'EVAL' and command[1].decode() == CLAIM_SCRIPT:
+            key, owner, replacing, ttl = command[3:7]
+            current, expires_at = self.keys.get(key, (None, 0.0))
+            if current is None or expires_at <= time.monotonic() or current == replacing:
+                current = owner
+            if current == owner:
+                self.keys[key] = (owner, time.monotonic() + int(ttl))
+            return encode(current)
+
+        if name == b'PING':
+            return b'+PONG\r\n'
+
+        return b'+OK\r\n'